@@ -0,0 +1,323 @@
+"""
+Стан механізмів контролера (heater, fan, status) -> таблиця actuator_event.
+
+Контролер шле стан у кожному повідомленні телеметрії (кожні ~5 с), а змінюється
+він рідко. Тому зберігаються лише переходи (run-length encoding): рядок =
+(пристрій, механізм, стан, started_at, last_seen). Поточний рядок лише
+подовжується (last_seen), і не частіше ніж раз на ACTUATOR_HEARTBEAT_SECONDS.
+Розрив зв'язку довший за ACTUATOR_GAP_SECONDS починає новий рядок, тож час
+без даних не рахується як робота реле.
+
+actuator_report() - час увімкнення, цикли, короткі цикли, найдовша безперервна
+робота та оцінка енергії по вольєрах за вікно.
+
+    python actuator_events.py --days 7
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from models import ActuatorEvent
+
+RELAYS = ("heater", "fan")
+ACTUATORS = RELAYS + ("status",)
+ACTUATOR_HEARTBEAT_SECONDS = 180   # Як SAVE_INTERVAL_SECONDS у mqtt_worker
+ACTUATOR_GAP_SECONDS = 600         # Як MAX_GAP_SECONDS у climate_analytics
+SHORT_CYCLE_SECONDS = 300          # Увімкнення коротше - коротке циклування реле
+POWER_W = {
+    "heater": float(os.getenv("HEATER_POWER_W", "250")),
+    "fan": float(os.getenv("FAN_POWER_W", "40")),
+}
+
+_ON = {"1", "on", "true"}
+
+
+def normalize_state(actuator, value):
+    """1 / True / 'on' -> 'on', 0 / False / 'off' -> 'off'; status - як є. None - не передано"""
+    if value is None:
+        return None
+    if actuator in RELAYS:
+        return "on" if str(value).strip().lower() in _ON else "off"
+    return str(value)[:20]
+
+
+def read_states(data: dict):
+    """{механізм: стан} з payload телеметрії (лише передані поля)"""
+    states = {}
+    for actuator in ACTUATORS:
+        state = normalize_state(actuator, data.get(actuator))
+        if state is not None:
+            states[actuator] = state
+    return states
+
+
+def payload_time(data: dict):
+    """timestamp із payload (час контролера) -> наївний UTC datetime"""
+    sent_at = data.get("timestamp")
+    if not isinstance(sent_at, (int, float)):
+        sent_at = time.time()
+    return datetime.fromtimestamp(sent_at, timezone.utc).replace(tzinfo=None)
+
+
+class _Run:
+    __slots__ = ("event_id", "state", "last_seen", "written")
+
+    def __init__(self, event_id, state, last_seen, written):
+        self.event_id = event_id
+        self.state = state
+        self.last_seen = last_seen  # Останній показ (у пам'яті)
+        self.written = written      # last_seen, записаний у БД
+
+
+class ActuatorTracker:
+    """
+    Поточні серії станів по (device_id, механізм). due() - дешева перевірка в
+    пам'яті на кожне повідомлення; record() пише в БД лише переходи та heartbeat.
+    """
+
+    def __init__(self, heartbeat=ACTUATOR_HEARTBEAT_SECONDS, gap=ACTUATOR_GAP_SECONDS):
+        self.heartbeat = timedelta(seconds=heartbeat)
+        self.gap = timedelta(seconds=gap)
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._runs.clear()
+
+    def due(self, device_id, states: dict, ts: datetime) -> bool:
+        """Чи потрібен запис у БД. Інакше лише оновлює last_seen у пам'яті"""
+        with self._lock:
+            runs = [(self._runs.get((device_id, a)), s) for a, s in states.items()]
+            if any(run is None or run.state != state or ts - run.last_seen > self.gap
+                   or ts - run.written >= self.heartbeat for run, state in runs):
+                return True
+            for run, _ in runs:
+                run.last_seen = max(run.last_seen, ts)
+            return False
+
+    def _load(self, db, device_id, actuator):
+        row = db.query(ActuatorEvent).filter(
+            ActuatorEvent.device_id == device_id, ActuatorEvent.actuator == actuator
+        ).order_by(ActuatorEvent.started_at.desc()).first()
+        return _Run(row.event_id, row.state, row.last_seen, row.last_seen) if row else None
+
+    def record(self, db, device_id, enclosure_id, states: dict, ts: datetime):
+        """
+        Записує переходи і подовжує поточні серії. Commit - на стороні викликача.
+        Під self._lock - лише рішення в пам'яті, запити - після нього: інакше всі
+        інжест-потоки чекають на один запит, а в run_sync async-маршруту I/O віддає
+        керування event loop і наступна корутина блокується на замку назавжди.
+        Повертає [(механізм, старий стан, новий стан)] - лише справжні переходи.
+        """
+        missing = [a for a in states if (device_id, a) not in self._runs]
+        loaded = {a: self._load(db, device_id, a) for a in missing}
+
+        extends = []   # (event_id, last_seen)
+        created = []   # (_Run, ActuatorEvent)
+        transitions = []
+        with self._lock:
+            for actuator, run in loaded.items():
+                self._runs.setdefault((device_id, actuator), run)
+            for actuator, state in states.items():
+                key = (device_id, actuator)
+                run = self._runs[key]
+                if run is not None and ts < run.last_seen:
+                    continue  # Запізніле повідомлення - історію не переписуємо
+                continuous = run is not None and ts - run.last_seen <= self.gap
+
+                if continuous and run.state == state:
+                    run.last_seen = ts
+                    if ts - run.written >= self.heartbeat:
+                        self._plan_extend(extends, run, ts)
+                    continue
+
+                if continuous:
+                    # Попередній стан тривав до моменту переходу
+                    self._plan_extend(extends, run, ts)
+                    transitions.append((actuator, run.state, state))
+                elif run is not None and run.last_seen > run.written:
+                    self._plan_extend(extends, run, run.last_seen)
+                row = ActuatorEvent(device_id=device_id, enclosure_id=enclosure_id, actuator=actuator,
+                                    state=state, started_at=ts, last_seen=ts)
+                self._runs[key] = new_run = _Run(None, state, ts, ts)
+                created.append((new_run, row))
+
+        for event_id, last_seen in extends:
+            self._extend(db, event_id, last_seen)
+        if created:
+            db.add_all([row for _, row in created])
+            db.flush()
+            for run, row in created:
+                run.event_id = row.event_id
+        return transitions
+
+    @staticmethod
+    def _plan_extend(extends, run, ts):
+        # event_id ще None - рядок вставляє паралельний record(); heartbeat допише пізніше
+        if run.event_id is not None:
+            extends.append((run.event_id, ts))
+            run.written = ts
+
+    def flush(self, db):
+        """Дописує last_seen серій, що лишились лише в пам'яті (зупинка воркера). Commit - викликача"""
+        extends = []
+        with self._lock:
+            for run in self._runs.values():
+                if run is not None and run.last_seen > run.written:
+                    self._plan_extend(extends, run, run.last_seen)
+        for event_id, last_seen in extends:
+            self._extend(db, event_id, last_seen)
+        return len(extends)
+
+    def snapshot(self):
+        """[[device_id, механізм, event_id, стан, last_seen, written]] (час - ISO)"""
+        with self._lock:
+            return [[device_id, actuator, run.event_id, run.state,
+                     run.last_seen.isoformat(), run.written.isoformat()]
+                    for (device_id, actuator), run in self._runs.items()
+                    if run is not None and run.event_id is not None]
+
+    def restore(self, rows):
+        with self._lock:
+            for device_id, actuator, event_id, state, last_seen, written in rows:
+                self._runs[(device_id, actuator)] = _Run(event_id, state, datetime.fromisoformat(last_seen),
+                                                         datetime.fromisoformat(written))
+
+    @staticmethod
+    def _extend(db, event_id, ts):
+        db.query(ActuatorEvent).filter(ActuatorEvent.event_id == event_id)\
+          .update({ActuatorEvent.last_seen: ts}, synchronize_session=False)
+
+
+actuator_tracker = ActuatorTracker()
+
+
+# --- АНАЛІТИКА ---
+
+def _empty_relay():
+    return {"on_seconds": 0.0, "observed_seconds": 0.0, "cycles": 0, "short_cycles": 0,
+            "on_runs": 0, "longest_on_seconds": 0.0}
+
+
+def _relay_summary(acc, actuator):
+    on, observed = acc["on_seconds"], acc["observed_seconds"]
+    return {
+        "on_minutes": round(on / 60.0, 1),
+        "observed_minutes": round(observed / 60.0, 1),
+        "duty_pct": round(100.0 * on / observed, 1) if observed else None,
+        "cycles": acc["cycles"],
+        "cycles_per_hour": round(acc["cycles"] * 3600.0 / observed, 2) if observed else None,
+        "short_cycles": acc["short_cycles"],
+        "mean_on_minutes": round(on / 60.0 / acc["on_runs"], 1) if acc["on_runs"] else None,
+        "longest_on_minutes": round(acc["longest_on_seconds"] / 60.0, 1),
+        "energy_kwh": round(on * POWER_W[actuator] / 3.6e6, 3),
+    }
+
+
+def _overlap(row, start, end):
+    return max(0.0, (min(row.last_seen, end) - max(row.started_at, start)).total_seconds())
+
+
+def actuator_stats(db, enclosure_ids=None, start=None, end=None):
+    """{enclosure_id: {"heater": {...}, "fan": {...}, "status_minutes": {...}}} за [start, end)"""
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(hours=24)
+    query = db.query(ActuatorEvent).filter(
+        ActuatorEvent.started_at < end, ActuatorEvent.last_seen >= start,
+        ActuatorEvent.enclosure_id.isnot(None)
+    )
+    if enclosure_ids:
+        query = query.filter(ActuatorEvent.enclosure_id.in_(list(enclosure_ids)))
+    rows = query.order_by(ActuatorEvent.device_id, ActuatorEvent.actuator, ActuatorEvent.started_at).all()
+
+    result = {}
+    prev = None
+    for i, row in enumerate(rows):
+        item = result.setdefault(row.enclosure_id, {
+            "heater": _empty_relay(), "fan": _empty_relay(), "status_minutes": {}
+        })
+        same_series = prev is not None and (prev.device_id, prev.actuator) == (row.device_id, row.actuator)
+        seconds = _overlap(row, start, end)
+
+        if row.actuator == "status":
+            minutes = item["status_minutes"]
+            minutes[row.state] = minutes.get(row.state, 0.0) + seconds / 60.0
+        elif row.actuator in RELAYS:
+            acc = item[row.actuator]
+            acc["observed_seconds"] += seconds
+            if row.state == "on":
+                acc["on_seconds"] += seconds
+                acc["on_runs"] += 1
+                duration = (row.last_seen - row.started_at).total_seconds()
+                acc["longest_on_seconds"] = max(acc["longest_on_seconds"], duration)
+                # Цикл = увімкнення в межах вікна (не продовження після розриву зв'язку)
+                if row.started_at >= start and not (same_series and prev.state == "on"):
+                    acc["cycles"] += 1
+                nxt = rows[i + 1] if i + 1 < len(rows) else None
+                closed = (nxt is not None and (nxt.device_id, nxt.actuator) == (row.device_id, row.actuator)
+                          and nxt.started_at == row.last_seen)
+                if closed and duration < SHORT_CYCLE_SECONDS:
+                    acc["short_cycles"] += 1
+        prev = row
+
+    return {
+        enclosure_id: {
+            "enclosure_id": enclosure_id,
+            "heater": _relay_summary(item["heater"], "heater"),
+            "fan": _relay_summary(item["fan"], "fan"),
+            "status_minutes": {k: round(v, 1) for k, v in sorted(item["status_minutes"].items())},
+        }
+        for enclosure_id, item in result.items()
+    }
+
+
+def actuator_report(db, enclosure_ids=None, start=None, end=None):
+    """Звіт по механізмах вольєрів за [start, end) (за замовчуванням - останні 24 год)"""
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(hours=24)
+    stats = actuator_stats(db, enclosure_ids, start, end)
+    return {
+        "start": start,
+        "end": end,
+        "short_cycle_seconds": SHORT_CYCLE_SECONDS,
+        "power_w": POWER_W,
+        "enclosures": [stats[e] for e in sorted(stats)],
+    }
+
+
+def transitions(db, enclosure_id, start, end, limit=500):
+    """Сирі серії станів вольєра за вікно (для графіка)"""
+    rows = db.query(ActuatorEvent).filter(
+        ActuatorEvent.enclosure_id == enclosure_id,
+        ActuatorEvent.started_at < end, ActuatorEvent.last_seen >= start
+    ).order_by(ActuatorEvent.started_at).limit(limit).all()
+    return [{"actuator": r.actuator, "state": r.state, "started_at": r.started_at, "last_seen": r.last_seen}
+            for r in rows]
+
+
+def main(argv=None):
+    from dependencies import SessionLocal
+
+    parser = argparse.ArgumentParser(description="ZooSmartCare actuator report")
+    parser.add_argument("--days", type=float, default=1.0)
+    parser.add_argument("--enclosure", type=int, action="append", default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        end = datetime.utcnow()
+        report = actuator_report(db, args.enclosure, end - timedelta(days=args.days), end)
+    finally:
+        db.close()
+    for item in report["enclosures"]:
+        heater, fan = item["heater"], item["fan"]
+        print(f"   #{item['enclosure_id']}: heater {heater['duty_pct']}% ({heater['cycles']} cycles, "
+              f"{heater['short_cycles']} short, {heater['energy_kwh']} kWh), "
+              f"fan {fan['duty_pct']}% ({fan['cycles']} cycles)")
+
+
+if __name__ == "__main__":
+    main()
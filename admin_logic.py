@@ -16,13 +16,16 @@ from dependencies import (
 )
 from models import (
     User, Enclosure, Animal, IoTDevice, 
-    MaintenanceLog, Alert
+    MaintenanceLog, Alert, AlertRoute
 )
+import climate_resolver
+from alert_dispatch import dispatcher, SINKS
 from schemas import (
     UserCreate, UserResponse, UserUpdate, Token, 
     EnclosureCreate, EnclosureResponse, EnclosureUpdate,
     AnimalCreate, AnimalResponse,
-    IoTDeviceCreate, IoTDeviceResponse, IoTDeviceUpdate
+    IoTDeviceCreate, IoTDeviceResponse, IoTDeviceUpdate,
+    AlertRouteCreate, AlertRouteResponse
 )
 
 router = APIRouter(prefix="/api/admin", tags=["Administration & Assets"])
@@ -341,6 +344,8 @@ def create_animal_card(
     new_animal = Animal(**animal.dict())
     db.add(new_animal)
     db.commit()
+    climate_resolver.recompute(db, [new_animal.enclosure_id])
+    db.commit()
     db.refresh(new_animal)
     log_admin_action(db, user.user_id, animal.enclosure_id, "Animal Created", f"Created {animal.nickname}")
     return new_animal
@@ -358,8 +363,11 @@ def archive_animal_card(
     
     log_admin_action(db, user.user_id, animal.enclosure_id, "Animal Deleted", f"Deleted ID {animal_id}")
     
+    enclosure_id = animal.enclosure_id
     db.delete(animal) # Повне видалення. Для архівування треба було б змінити статус, але це не вимагалося.
     db.commit()
+    climate_resolver.recompute(db, [enclosure_id])
+    db.commit()
     
     return {"detail": "Animal card deleted successfully"}
 
@@ -412,4 +420,57 @@ def system_health_check(
         "status": "System Operational",
         "offline_devices_detected": len(offline_devices),
         "db_connection": "OK"
-    }
\ No newline at end of file
+    }
+
+# ==============================================================================
+# Є. РОЗСИЛКА АЛЕРТІВ
+# ==============================================================================
+
+@router.get("/alert-routes/", response_model=List[AlertRouteResponse])
+def list_alert_routes(
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_role(["admin"]))
+):
+    """Маршрути розсилки (порожньо = типові маршрути за ролями)"""
+    return db.query(AlertRoute).all()
+
+@router.post("/alert-routes/", response_model=AlertRouteResponse)
+def create_alert_route(
+    route: AlertRouteCreate,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_role(["admin"]))
+):
+    """Новий маршрут: користувач або роль, вольєр або всі, канал"""
+    if route.sink not in SINKS:
+        raise HTTPException(status_code=400, detail=f"Unknown sink. Available: {', '.join(SINKS)}")
+    if route.user_id is None and not route.role and not route.target:
+        raise HTTPException(status_code=400, detail="Route needs user_id, role or target")
+
+    new_route = AlertRoute(**route.dict())
+    db.add(new_route)
+    db.commit()
+    db.refresh(new_route)
+    dispatcher.router.invalidate()
+    return new_route
+
+@router.delete("/alert-routes/{route_id}")
+def delete_alert_route(
+    route_id: int,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_role(["admin"]))
+):
+    route = db.query(AlertRoute).filter(AlertRoute.route_id == route_id).first()
+    if not route:
+        raise HTTPException(status_code=404, detail="Route not found")
+    db.delete(route)
+    db.commit()
+    dispatcher.router.invalidate()
+    return {"detail": "Alert route deleted successfully"}
+
+@router.get("/alert-routes/deliveries")
+def recent_alert_deliveries(
+    limit: int = Query(50, le=200),
+    admin: User = Depends(require_role(["admin", "technician"]))
+):
+    """Останні доставки цього процесу з наскрізною латентністю"""
+    return list(dispatcher.recent)[-limit:][::-1]
@@ -0,0 +1,460 @@
+"""
+Розсилка алертів персоналу (ціль README: критичний алерт < 5 с).
+
+Джерела:
+  * серверні алерти - переходи alert_state (open / escalate / incident, а також
+    resolve для критичних - зі звичайним пріоритетом) ставляться в чергу ПІСЛЯ
+    commit сесії, в якій виникли
+  * алерти контролерів з топіка zoo/alerts - через ту ж машину станів
+    (mqtt_worker), або напряму submit_device_alert для пристроїв без вольєра
+
+Маршрутизація: таблиця alert_route (користувач або роль, вольєр або всі,
+тільки критичні чи всі). Якщо маршрутів немає - DEFAULT_ROUTES за ролями.
+
+Доставка: asyncio-черга з пріоритетом (критичні першими) у фоновому потоці,
+підключувані канали (SINKS: webhook, push - локальна заглушка push/SMS),
+повтори з експоненційною паузою та ліміт одночасних доставок на канал.
+Для кожної доставки міряється наскрізна латентність: від виявлення
+(час контролера для zoo/alerts) до підтвердження каналом.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from dependencies import SessionLocal
+from models import AlertRoute, User
+from metrics import Counter, Gauge, Histogram
+from alert_state import on_transition
+
+DELIVERY_SLO_SECONDS = 5.0
+ROUTES_TTL_SECONDS = 60
+QUEUE_SIZE = 10_000
+RETRY_BASE_SECONDS = 0.5
+RECENT_DELIVERIES = 200
+
+# (роль, тільки критичні) - якщо в alert_route немає жодного активного маршруту
+DEFAULT_ROUTES = (("admin", True), ("zoologist", True), ("technician", False))
+
+# Які переходи alert_state розсилати (resolve - лише для критичних)
+DISPATCH_TRANSITIONS = ("open", "escalate", "incident")
+
+# Позначка переходу в тексті повідомлення (open - без позначки)
+TRANSITION_LABELS = {"escalate": "ESCALATED", "incident": "INCIDENT", "resolve": "RESOLVED"}
+
+DELIVERIES_TOTAL = Counter(
+    "alert_deliveries_total", "Alert deliveries by sink and outcome", ("sink", "outcome")
+)
+DELIVERY_LATENCY = Histogram(
+    "alert_delivery_latency_seconds", "Detection -> delivered, per sink and source", ("sink", "source"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+)
+QUEUE_WAIT = Histogram("alert_queue_wait_seconds", "Submitted -> picked by dispatcher")
+QUEUE_DEPTH = Gauge("alert_queue_depth", "Alerts waiting for routing")
+
+
+class AlertNotice:
+    """Одне повідомлення для розсилки"""
+    __slots__ = ("alert_id", "enclosure_id", "alert_type", "message", "critical", "was_critical",
+                 "transition", "source", "detected_at", "queued_at")
+
+    def __init__(self, alert_type, message, critical, enclosure_id=None, alert_id=None,
+                 transition="open", source="server", detected_at=None, was_critical=None):
+        self.alert_id = alert_id
+        self.enclosure_id = enclosure_id
+        self.alert_type = alert_type
+        self.message = message
+        self.critical = critical  # Пріоритет доставки (resolve - завжди звичайний)
+        self.was_critical = critical if was_critical is None else was_critical  # Для маршрутів
+        self.transition = transition
+        self.source = source
+        self.detected_at = detected_at or time.time()
+        self.queued_at = None
+
+    def to_dict(self):
+        return {
+            "alert_id": self.alert_id,
+            "enclosure_id": self.enclosure_id,
+            "alert_type": self.alert_type,
+            "message": self.message,
+            "critical": self.critical,
+            "was_critical": self.was_critical,
+            "transition": self.transition,
+            "source": self.source,
+            "detected_at": self.detected_at,
+        }
+
+    def headline(self):
+        """'CRITICAL Critical High Temp' / 'info RESOLVED Critical High Temp'"""
+        level = "CRITICAL" if self.critical else "info"
+        label = TRANSITION_LABELS.get(self.transition)
+        return f"{level} {label} {self.alert_type}" if label else f"{level} {self.alert_type}"
+
+
+# --- КАНАЛИ ---
+
+class Sink:
+    """Базовий канал: deliver() кидає виняток, якщо доставка не вдалась"""
+    concurrency = 4
+    max_attempts = 3
+
+    def __init__(self, name, concurrency=None, max_attempts=None):
+        self.name = name
+        self.concurrency = concurrency or self.concurrency
+        self.max_attempts = max_attempts or self.max_attempts
+        self.semaphore = None  # Створюється в циклі диспетчера
+
+    async def deliver(self, notice, target):
+        raise NotImplementedError
+
+
+class WebhookSink(Sink):
+    """POST JSON на target (або ALERT_WEBHOOK_URL)"""
+    concurrency = 8
+
+    def __init__(self, name="webhook", timeout=3.0, **kwargs):
+        super().__init__(name, **kwargs)
+        self.timeout = timeout
+        self.default_url = os.getenv("ALERT_WEBHOOK_URL")
+
+    def _post(self, url, body):
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.status >= 300:
+                raise RuntimeError(f"HTTP {response.status}")
+
+    async def deliver(self, notice, target):
+        url = target if target and target.startswith("http") else self.default_url
+        if not url:
+            raise ValueError("No webhook URL")
+        body = json.dumps(notice.to_dict(), ensure_ascii=False).encode("utf-8")
+        await asyncio.to_thread(self._post, url, body)
+
+
+class LocalPushSink(Sink):
+    """Заглушка push/SMS: рядок у консоль + JSON-рядок у ALERT_PUSH_LOG (якщо задано)"""
+    concurrency = 16
+
+    def __init__(self, name="push", **kwargs):
+        super().__init__(name, **kwargs)
+        self.path = os.getenv("ALERT_PUSH_LOG")
+        self._lock = threading.Lock()
+
+    def _write(self, line):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def deliver(self, notice, target):
+        print(f"📲 [PUSH -> {target}] {notice.headline()}: {notice.message}")
+        if self.path:
+            record = dict(notice.to_dict(), target=target, delivered_at=time.time())
+            await asyncio.to_thread(self._write, json.dumps(record, ensure_ascii=False))
+
+
+SINKS = {}
+
+
+def register_sink(sink):
+    """Додає/замінює канал (name -> Sink)"""
+    SINKS[sink.name] = sink
+    return sink
+
+
+register_sink(WebhookSink())
+register_sink(LocalPushSink())
+
+
+# --- МАРШРУТИЗАЦІЯ ---
+
+class Route:
+    __slots__ = ("enclosure_id", "critical_only", "sink", "recipients")
+
+    def __init__(self, enclosure_id, critical_only, sink, recipients):
+        self.enclosure_id = enclosure_id
+        self.critical_only = critical_only
+        self.sink = sink
+        self.recipients = recipients  # [target]
+
+    def matches(self, notice):
+        # Відновлення критичного - тим, хто отримав сам алерт
+        if self.critical_only and not notice.was_critical:
+            return False
+        return self.enclosure_id is None or self.enclosure_id == notice.enclosure_id
+
+
+class Router:
+    """Скомпільовані маршрути (живуть ROUTES_TTL_SECONDS або до invalidate())"""
+
+    def __init__(self, session_factory=SessionLocal, ttl=ROUTES_TTL_SECONDS):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self._routes = []
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    @property
+    def stale(self):
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def compile(self):
+        db = self.session_factory()
+        try:
+            contacts_by_role = {}
+            contacts_by_user = {}
+            for user_id, role, contact in db.query(User.user_id, User.role, User.contact_info).all():
+                target = contact or f"user:{user_id}"
+                contacts_by_role.setdefault(role, []).append(target)
+                contacts_by_user[user_id] = target
+
+            rows = db.query(AlertRoute).filter(AlertRoute.is_active.isnot(False)).all()
+            routes = []
+            for row in rows:
+                if row.user_id is not None:
+                    recipients = [row.target or contacts_by_user.get(row.user_id)]
+                elif row.role:
+                    recipients = [row.target] if row.target else contacts_by_role.get(row.role, [])
+                else:
+                    recipients = [row.target]
+                recipients = [r for r in recipients if r]
+                if recipients:
+                    routes.append(Route(row.enclosure_id, bool(row.critical_only), row.sink, recipients))
+
+            if not rows:
+                routes = [Route(None, critical_only, "push", contacts_by_role.get(role, []))
+                          for role, critical_only in DEFAULT_ROUTES if contacts_by_role.get(role)]
+        finally:
+            db.close()
+
+        self._routes = routes
+        self._loaded_at = time.monotonic()
+        return routes
+
+    def resolve(self, notice):
+        """[(sink, target)] без дублікатів"""
+        seen = set()
+        deliveries = []
+        for route in self._routes:
+            if not route.matches(notice):
+                continue
+            for target in route.recipients:
+                key = (route.sink, target)
+                if key not in seen:
+                    seen.add(key)
+                    deliveries.append(key)
+        return deliveries
+
+
+# --- ДИСПЕТЧЕР ---
+
+class Dispatcher:
+    """Фоновий asyncio-цикл: черга -> маршрути -> канали з повторами"""
+
+    def __init__(self, router=None, sinks=None, workers=4):
+        self.router = router or Router()
+        self.sinks = sinks if sinks is not None else SINKS
+        self.workers = workers
+        self.recent = deque(maxlen=RECENT_DELIVERIES)
+        self._loop = None
+        self._queue = None
+        self._thread = None
+        self._seq = itertools.count()
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run, name="alert-dispatch", daemon=True)
+            self._thread.start()
+        self._started.wait(5.0)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.PriorityQueue(maxsize=QUEUE_SIZE)
+        for sink in self.sinks.values():
+            sink.semaphore = asyncio.Semaphore(sink.concurrency)
+        for _ in range(self.workers):
+            self._loop.create_task(self._consume())
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            # stop(): скасовуємо споживачів і незавершені доставки, потім закриваємо цикл
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.run_until_complete(self._loop.shutdown_default_executor())
+            self._loop.close()
+
+    def submit(self, notice):
+        """Потокобезпечно ставить алерт у чергу (запускає диспетчер за потреби)"""
+        if not self.running:
+            self.start()
+        notice.queued_at = time.time()
+        item = (0 if notice.critical else 1, next(self._seq), notice)
+        self._loop.call_soon_threadsafe(self._enqueue, item)
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+            QUEUE_DEPTH.set(self._queue.qsize())
+        except asyncio.QueueFull:
+            DELIVERIES_TOTAL.inc(sink="queue", outcome="dropped")
+            print(f"⚠️ [DISPATCH] Queue full, dropped: {item[2].alert_type}")
+
+    async def _consume(self):
+        while True:
+            _, _, notice = await self._queue.get()
+            QUEUE_DEPTH.set(self._queue.qsize())
+            QUEUE_WAIT.observe(time.time() - notice.queued_at)
+            try:
+                if self.router.stale:
+                    await asyncio.to_thread(self.router.compile)
+                deliveries = self.router.resolve(notice)
+                if not deliveries:
+                    DELIVERIES_TOTAL.inc(sink="none", outcome="unrouted")
+                for sink_name, target in deliveries:
+                    task = asyncio.ensure_future(self._deliver(notice, sink_name, target))
+                    self._pending.add(task)
+                    task.add_done_callback(self._pending.discard)
+            except Exception as e:
+                print(f"⚠️ [DISPATCH] Routing Error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, notice, sink_name, target):
+        sink = self.sinks.get(sink_name)
+        if sink is None:
+            DELIVERIES_TOTAL.inc(sink=sink_name, outcome="unknown_sink")
+            return
+
+        for attempt in range(1, sink.max_attempts + 1):
+            try:
+                async with sink.semaphore:
+                    await sink.deliver(notice, target)
+            except Exception as e:
+                if attempt == sink.max_attempts:
+                    DELIVERIES_TOTAL.inc(sink=sink_name, outcome="failed")
+                    self._record(notice, sink_name, target, attempt, "failed")
+                    print(f"❌ [DISPATCH] {sink_name} -> {target} failed after {attempt} attempts: {e}")
+                    return
+                DELIVERIES_TOTAL.inc(sink=sink_name, outcome="retry")
+                await asyncio.sleep(RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            else:
+                latency = self._record(notice, sink_name, target, attempt, "delivered")
+                DELIVERIES_TOTAL.inc(sink=sink_name, outcome="delivered")
+                DELIVERY_LATENCY.observe(latency, sink=sink_name, source=notice.source)
+                if notice.critical and latency > DELIVERY_SLO_SECONDS:
+                    print(f"🐢 [DISPATCH] {notice.alert_type} delivered in {latency:.1f}s "
+                          f"(SLO {DELIVERY_SLO_SECONDS}s) via {sink_name}")
+                return
+
+    def _record(self, notice, sink_name, target, attempts, outcome):
+        latency = max(0.0, time.time() - notice.detected_at)
+        self.recent.append({
+            "alert_id": notice.alert_id,
+            "alert_type": notice.alert_type,
+            "enclosure_id": notice.enclosure_id,
+            "source": notice.source,
+            "sink": sink_name,
+            "target": target,
+            "attempts": attempts,
+            "outcome": outcome,
+            "latency_seconds": round(latency, 4),
+        })
+        return latency
+
+    def drain(self, timeout=10.0):
+        """Чекає, поки черга і доставки в процесі порожні. True - встигли"""
+        if not self.running:
+            return True
+
+        async def _wait():
+            await self._queue.join()
+            while self._pending:
+                await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+        future = asyncio.run_coroutine_threadsafe(_wait(), self._loop)
+        try:
+            future.result(timeout)
+            return True
+        except Exception:
+            return False
+
+    def stop(self, timeout=10.0):
+        if not self.running:
+            return
+        self.drain(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+dispatcher = Dispatcher()
+
+
+# --- ДЖЕРЕЛА ---
+
+_PENDING_KEY = "alert_notices"
+
+
+@on_transition
+def _stage_transition(db, transition, alert):
+    """Перехід alert_state -> очікує commit сесії"""
+    if transition not in DISPATCH_TRANSITIONS and not (transition == "resolve" and alert["was_critical"]):
+        return
+    db.info.setdefault(_PENDING_KEY, []).append(AlertNotice(
+        alert["alert_type"], alert["message"], alert["critical"],
+        enclosure_id=alert["enclosure_id"], alert_id=alert["alert_id"], transition=transition,
+        source=alert.get("source", "server"), detected_at=alert.get("detected_at"),
+        was_critical=alert["was_critical"]
+    ))
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_committed(session):
+    notices = session.info.pop(_PENDING_KEY, None)
+    for notice in notices or ():
+        dispatcher.submit(notice)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def device_alert_type(level):
+    """'CRITICAL' -> 'Device Critical' (Alert.alert_type)"""
+    return f"Device {str(level).title()}"
+
+
+def submit_device_alert(data: dict, enclosure_id=None):
+    """Алерт контролера з zoo/alerts: {"aviary_id", "level", "msg", "timestamp"} - без запису в БД"""
+    level = str(data.get("level", "WARNING")).upper()
+    sent_at = data.get("timestamp")
+    notice = AlertNotice(
+        device_alert_type(level), str(data.get("msg", "")), level == "CRITICAL",
+        enclosure_id=enclosure_id, source="device",
+        detected_at=sent_at if isinstance(sent_at, (int, float)) else None
+    )
+    dispatcher.submit(notice)
+    return notice
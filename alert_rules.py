@@ -0,0 +1,179 @@
+"""
+Єдиний рушій правил алертів для REST (receive_telemetry) та MQTT (mqtt_worker).
+
+Ефективні норми вольєрів (climate_resolver: сезон + всі види) компілюються
+в таблицю правил {enclosure_id: EnclosureRules}. Оцінка показу - один прохід по температурі,
+вологості та освітленості без запитів до БД.
+
+Типи алертів (Alert.alert_type):
+    "High Temp" / "Low Temp" / "Low Humidity" / "Low Light" / "High Light"
+    з префіксом "Critical " при відхиленні більше ніж на *_CRITICAL_MARGIN.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from alert_state import alert_state
+from climate_resolver import (
+    current_season, parse_lighting_schedule, load_all_effective, on_recompute
+)
+
+TEMP_CRITICAL_MARGIN = 5.0      # °C понад норму -> Critical
+HUMIDITY_CRITICAL_MARGIN = 15.0  # % нижче норми -> Critical
+LIGHT_ON_MIN_LUX = 50.0          # Мінімум освітленості в години lighting_schedule
+LIGHT_OFF_MAX_LUX = 20.0         # Максимум освітленості поза ними (нічний режим)
+RULES_TTL_SECONDS = 60           # Як часто перечитувати профілі з БД
+
+
+class Violation:
+    __slots__ = ("alert_type", "critical", "message", "source", "detected_at")
+
+    def __init__(self, alert_type, critical, message, source="server", detected_at=None):
+        self.alert_type = alert_type
+        self.critical = critical
+        self.message = message
+        self.source = source            # server / device (zoo/alerts)
+        self.detected_at = detected_at  # epoch; None - момент переходу
+
+    def __repr__(self):
+        return f"Violation({self.alert_type!r})"
+
+
+class EnclosureRules:
+    """Скомпільовані межі одного вольєра"""
+    __slots__ = ("enclosure_id", "profile_id", "t_min", "t_max", "h_min", "light_window")
+
+    def __init__(self, enclosure_id, profile_id=None, t_min=None, t_max=None, h_min=None, light_window=None):
+        self.enclosure_id = enclosure_id
+        self.profile_id = profile_id
+        self.t_min = t_min
+        self.t_max = t_max
+        self.h_min = h_min
+        self.light_window = light_window
+
+    @classmethod
+    def from_profile(cls, enclosure_id, profile):
+        """profile - ClimateProfile або EnclosureClimate (однакові назви полів)"""
+        return cls(
+            enclosure_id, getattr(profile, "profile_id", None),
+            profile.min_temperature, profile.max_temperature, profile.min_humidity,
+            parse_lighting_schedule(profile.lighting_schedule),
+        )
+
+    def evaluate(self, temperature=None, humidity=None, light=None, now=None):
+        """Один прохід по всіх каналах -> [Violation, ...]; now - місцевий час показу"""
+        found = []
+
+        if temperature is not None:
+            if self.t_max is not None and temperature > self.t_max:
+                diff = round(temperature - self.t_max, 1)
+                critical = diff > TEMP_CRITICAL_MARGIN
+                found.append(Violation(
+                    "Critical High Temp" if critical else "High Temp", critical,
+                    f"Температура {temperature}°C вище норми на {diff}°C (Max: {self.t_max}°C)"))
+            elif self.t_min is not None and temperature < self.t_min:
+                diff = round(self.t_min - temperature, 1)
+                critical = diff > TEMP_CRITICAL_MARGIN
+                found.append(Violation(
+                    "Critical Low Temp" if critical else "Low Temp", critical,
+                    f"Температура {temperature}°C нижче норми на {diff}°C (Min: {self.t_min}°C)"))
+
+        if humidity is not None and self.h_min is not None and humidity < self.h_min:
+            diff = round(self.h_min - humidity, 1)
+            critical = diff > HUMIDITY_CRITICAL_MARGIN
+            found.append(Violation(
+                "Critical Low Humidity" if critical else "Low Humidity", critical,
+                f"Вологість {humidity}% нижче норми на {diff}% (Min: {self.h_min}%)"))
+
+        if light is not None and self.light_window is not None:
+            now = now or datetime.now()
+            minute = now.hour * 60 + now.minute
+            start, end = self.light_window
+            is_day = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if is_day and light < LIGHT_ON_MIN_LUX:
+                found.append(Violation("Low Light", False,
+                                       f"Освітленість {light} лк у світловий період (Min: {LIGHT_ON_MIN_LUX} лк)"))
+            elif not is_day and light > LIGHT_OFF_MAX_LUX:
+                found.append(Violation("High Light", False,
+                                       f"Освітленість {light} лк у нічний період (Max: {LIGHT_OFF_MAX_LUX} лк)"))
+
+        return found
+
+
+class RuleTable:
+    """
+    Індексована таблиця правил {enclosure_id: EnclosureRules}.
+    Компілюється одним запитом для всіх вольєрів і живе RULES_TTL_SECONDS
+    (або до invalidate() після перерахунку норм у climate_resolver).
+    """
+    def __init__(self, ttl=RULES_TTL_SECONDS):
+        self.ttl = ttl
+        self._rules = {}
+        self._loaded_at = 0.0
+        self._season = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def compile(self, db, now=None):
+        """Перекомпілювати таблицю з матеріалізованих норм (один SELECT)"""
+        season = current_season(now)
+        rules = {
+            row.enclosure_id: EnclosureRules.from_profile(row.enclosure_id, row)
+            for row in load_all_effective(db, now)
+            if row.min_temperature is not None or row.max_temperature is not None
+            or row.min_humidity is not None or row.lighting_schedule
+        }
+
+        with self._lock:
+            self._rules = rules
+            self._season = season
+            self._loaded_at = time.monotonic()
+        return rules
+
+    def get(self, db, enclosure_id):
+        if time.monotonic() - self._loaded_at > self.ttl or self._season != current_season():
+            self.compile(db)
+        return self._rules.get(enclosure_id)
+
+    def __len__(self):
+        return len(self._rules)
+
+
+# Спільний екземпляр процесу (API або воркер)
+rule_table = RuleTable()
+# Перерахунок норм у цьому процесі -> одразу перекомпілювати правила
+on_recompute(rule_table.invalidate)
+
+
+def local_time(ts):
+    """Наївний UTC (SensorReading.timestamp) -> місцевий час (lighting_schedule - у ньому)"""
+    return ts.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def evaluate_reading(db, enclosure_id, temperature=None, humidity=None, light=None, now=None):
+    """
+    Правила вольєра -> порушення для одного показу.
+    now - час показу (наївний UTC, як SensorReading.timestamp): запізнілий або повторно
+    доставлений показ оцінюється за світловим вікном тієї години, коли його знято.
+    """
+    rules = rule_table.get(db, enclosure_id)
+    if rules is None:
+        return []  # Немає норм - немає алертів
+    return rules.evaluate(temperature, humidity, light, local_time(now) if now else None)
+
+
+def measured_channels(temperature=None, humidity=None, light=None):
+    """Канали, присутні в показі (чисті канали закривають алерти в alert_state)"""
+    return tuple(name for name, value in (("temperature", temperature), ("humidity", humidity), ("light", light))
+                 if value is not None)
+
+
+def record_violations(db, enclosure_id, violations, channels=(), now=None):
+    """
+    Передає результат оцінки показу в машину станів (alert_state): новий відбиток
+    (вольєр + тип) -> Alert, повтор -> лічильник у пам'яті, чисті channels ->
+    автозакриття. Повертає список створених Alert. Commit - на стороні викликача.
+    """
+    return alert_state.observe(db, enclosure_id, violations, channels, now)
@@ -0,0 +1,571 @@
+"""
+Машина станів алертів: дедуплікація, групування та придушення "штормів".
+
+Кожне порушення має відбиток (enclosure_id, сімейство типу), де сімейство -
+alert_type без префікса "Critical " (High Temp і Critical High Temp - один алерт,
+перехід між ними - ескалація). Стан живе в пам'яті процесу, в БД пишуться
+тільки переходи:
+
+    open      - перше порушення -> новий Alert (status New)
+    repeat    - повтор -> лише лічильник у пам'яті (без запитів)
+    escalate  - звичайний -> Critical -> UPDATE alert_type/message
+    resolve   - RESOLVE_AFTER_CLEAN чистих показів того ж каналу
+                (для аномалій - QUIET_RESOLVE_SECONDS без повторів) -> Resolved
+
+Шторм: якщо за STORM_WINDOW_SECONDS відкрились алерти у STORM_MIN_ENCLOSURES
+різних вольєрах (стрибок живлення, збій брокера), створюється один загальний
+інцидент (Alert з enclosure_id=None). Нові алерти під час шторму не пишуться
+окремо, а зараховуються до інциденту; він закривається, коли відновились усі
+його учасники.
+
+Раз на SWEEP_INTERVAL_SECONDS стан звіряється з БД: алерти, закриті вручну
+(resolve_alert), забуваються, і наступне порушення відкриє новий.
+Переходи публікуються підписникам on_transition (розсилка - alert_dispatch).
+
+Рішення приймаються під lock лише в пам'яті; запити й записи - після нього, в
+сесії викликача. Якщо її транзакція не закомітиться (rollback, close), журнал
+у session.info повертає пам'ять до стану БД.
+"""
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Alert
+
+CRITICAL_PREFIX = "Critical "
+INCIDENT_TYPE = "Zoo-wide Incident"
+
+RESOLVE_AFTER_CLEAN = 2          # Чистих показів поспіль для автозакриття
+QUIET_RESOLVE_SECONDS = 600      # Аномалії без каналу: закриття після 10 хв тиші
+STORM_WINDOW_SECONDS = 60        # Вікно для виявлення шторму
+STORM_MIN_ENCLOSURES = 5         # Стільки різних вольєрів за вікно = шторм
+SWEEP_INTERVAL_SECONDS = 60      # Як часто звіряти стан з БД
+
+# Підписники на переходи (напр. розсилка alert_dispatch)
+_listeners = []
+
+
+def on_transition(callback):
+    """
+    Реєструє callback(db, transition, alert: dict) для open/escalate/incident/resolve.
+    resolve - звичайний пріоритет (critical=False); was_critical - чи був критичним закритий алерт.
+    """
+    _listeners.append(callback)
+    return callback
+
+
+def _emit(db, transition, alert_id, enclosure_id, alert_type, message, critical, violation=None,
+          was_critical=None):
+    if not _listeners:
+        return
+    alert = {
+        "alert_id": alert_id,
+        "enclosure_id": enclosure_id,
+        "alert_type": alert_type,
+        "message": message,
+        "critical": critical,
+        "was_critical": critical if was_critical is None else was_critical,
+        "source": getattr(violation, "source", "server"),
+        "detected_at": getattr(violation, "detected_at", None),
+    }
+    for callback in _listeners:
+        callback(db, transition, alert)
+
+
+def alert_family(alert_type):
+    """'Critical High Temp' -> 'High Temp'"""
+    if alert_type and alert_type.startswith(CRITICAL_PREFIX):
+        return alert_type[len(CRITICAL_PREFIX):]
+    return alert_type
+
+
+def channel_of(alert_type):
+    """Канал, чисті покази якого закривають алерт (None - тільки за тишею)"""
+    if not alert_type or alert_type.startswith("Anomaly"):
+        return None
+    if "Temp" in alert_type:
+        return "temperature"
+    if "Humidity" in alert_type:
+        return "humidity"
+    if "Light" in alert_type:
+        return "light"
+    return None
+
+
+class AlertState:
+    """Один активний відбиток (вольєр + сімейство)"""
+    __slots__ = ("enclosure_id", "family", "alert_type", "channel", "critical", "message",
+                 "alert_id", "incident", "first_seen", "last_seen", "occurrences", "clean_streak")
+
+    def __init__(self, enclosure_id, violation, now):
+        self.enclosure_id = enclosure_id
+        self.family = alert_family(violation.alert_type)
+        self.alert_type = violation.alert_type
+        self.channel = channel_of(violation.alert_type)
+        self.critical = violation.critical
+        self.message = violation.message
+        self.alert_id = None
+        self.incident = None
+        self.first_seen = now
+        self.last_seen = now
+        self.occurrences = 1
+        self.clean_streak = 0
+
+    def __repr__(self):
+        return f"AlertState({self.enclosure_id}, {self.family!r}, x{self.occurrences})"
+
+
+class Incident:
+    """Загальний інцидент, що поглинає алерти шторму"""
+    __slots__ = ("alert_id", "opened_at", "last_opening", "members", "total")
+
+    def __init__(self, alert_id, now):
+        self.alert_id = alert_id
+        self.opened_at = now
+        self.last_opening = now
+        self.members = set()
+        self.total = 0
+
+
+class _Pending:
+    """Записи в БД, заплановані під lock і виконані після нього (_apply)"""
+    __slots__ = ("opened", "incident", "updates", "emits", "journal")
+
+    def __init__(self):
+        self.opened = []      # (AlertState, Alert) - нові рядки
+        self.incident = None  # (Incident, Alert, учасники, кількість вольєрів)
+        self.updates = []     # (alert_id, {поле: значення})
+        self.emits = []       # Аргументи _emit; alert_id береться з об'єкта після flush
+        self.journal = []     # Переходи для відкату, якщо транзакція не закомітиться
+
+
+# Журнал переходів сесії: commit - забути, кінець транзакції без commit - відкотити пам'ять
+_JOURNAL_KEY = "alert_state_journal"
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    if not session.in_nested_transaction():
+        session.info.pop(_JOURNAL_KEY, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _undo_uncommitted(session, transaction):
+    # rollback() і close() без commit (after_rollback на close не приходить)
+    if transaction.parent is not None:
+        return
+    for machine, journal in reversed(session.info.pop(_JOURNAL_KEY, None) or ()):
+        machine._undo(journal)
+
+
+class AlertStateMachine:
+    def __init__(self, storm_min_enclosures=STORM_MIN_ENCLOSURES, storm_window=STORM_WINDOW_SECONDS):
+        self.storm_min_enclosures = storm_min_enclosures
+        self.storm_window = storm_window
+        self._states = {}          # {enclosure_id: {family: AlertState}}
+        self._openings = deque()   # (час, AlertState) відкриттів у вікні шторму
+        self._incident = None
+        self._last_sweep = None
+        self._lock = threading.RLock()
+
+    def reset(self):
+        """Забути весь стан (БД не змінюється)"""
+        with self._lock:
+            self._states.clear()
+            self._openings.clear()
+            self._incident = None
+            self._last_sweep = None
+
+    def active(self):
+        """[AlertState] усіх активних відбитків"""
+        with self._lock:
+            return [s for by_family in self._states.values() for s in by_family.values()]
+
+    def __len__(self):
+        return sum(len(by_family) for by_family in self._states.values())
+
+    # --- Основний вхід ---
+
+    def observe(self, db, enclosure_id, violations, channels=(), now=None):
+        """
+        Обробляє результат оцінки одного показу вольєра.
+        channels - канали, виміряні в цьому показі (для автозакриття).
+        Повертає список НОВИХ Alert (для логів/відповіді). Commit - на стороні викликача.
+        """
+        now = now or datetime.utcnow()
+        pending = _Pending()
+        with self._lock:
+            by_family = self._states.get(enclosure_id, {})
+            fresh = {alert_family(v.alert_type) for v in violations} - set(by_family)
+        # Запити - поза lock: інші потоки (інжест, аномалії) не чекають на БД
+        existing = self._load_existing(db, enclosure_id, fresh) if fresh else {}
+
+        with self._lock:
+            by_family = self._states.setdefault(enclosure_id, {})
+            seen = set()
+
+            for violation in violations:
+                family = alert_family(violation.alert_type)
+                seen.add(family)
+                state = by_family.get(family)
+                if state is None:
+                    self._open(pending, enclosure_id, violation, existing.get(family), now)
+                    continue
+                state.occurrences += 1
+                state.last_seen = now
+                state.clean_streak = 0
+                if violation.critical and not state.critical:
+                    self._escalate(pending, state, violation)
+
+            if channels:
+                for family, state in list(by_family.items()):
+                    if family in seen or state.channel not in channels:
+                        continue
+                    state.clean_streak += 1
+                    if state.clean_streak >= RESOLVE_AFTER_CLEAN:
+                        self._resolve(pending, state, now)
+
+            if not self._states.get(enclosure_id):
+                self._states.pop(enclosure_id, None)
+            sweep_due = self._last_sweep is None or \
+                (now - self._last_sweep).total_seconds() >= SWEEP_INTERVAL_SECONDS
+            if sweep_due:
+                self._last_sweep = now
+
+        created = self._apply(db, pending)
+        if sweep_due:
+            self.sweep(db, now)
+        return created
+
+    @staticmethod
+    def _load_existing(db, enclosure_id, families):
+        """Алерти, вже відкриті іншим процесом (API/воркер) або попереднім запуском: {family: Alert}"""
+        types = [t for family in families for t in (family, CRITICAL_PREFIX + family)]
+        found = {}
+        for alert in db.query(Alert).filter(
+            Alert.enclosure_id == enclosure_id, Alert.status == "New", Alert.alert_type.in_(types)
+        ).order_by(Alert.alert_id.desc()).all():
+            found.setdefault(alert_family(alert.alert_type), alert)
+        return found
+
+    def _apply(self, db, pending):
+        """Записи, заплановані під lock, - в сесію викликача (без lock)"""
+        if pending.journal:
+            # До flush: впаде flush або commit - rollback відкотить і стан у пам'яті
+            db.info.setdefault(_JOURNAL_KEY, []).append((self, pending.journal))
+
+        created = [alert for _, alert in pending.opened]
+        if pending.incident is not None:
+            created.append(pending.incident[1])
+        if created:
+            db.add_all(created)
+            db.flush()
+
+        linked = []
+        with self._lock:
+            for state, alert in pending.opened:
+                state.alert_id = alert.alert_id
+                # Поки йшов flush, інший потік ескалював або закрив цей відбиток без alert_id
+                if state.critical and not (alert.alert_type or "").startswith(CRITICAL_PREFIX):
+                    self._write_escalation(pending, state)
+                if self._states.get(state.enclosure_id, {}).get(state.family) is not state \
+                        and state.incident is None:
+                    pending.updates.append((state.alert_id, {"status": "Resolved", "resolved_at": state.last_seen}))
+            if pending.incident is not None:
+                incident, alert, members, _ = pending.incident
+                incident.alert_id = alert.alert_id
+                linked = [s.alert_id for s in members if s.alert_id is not None]
+
+        for alert_id, values in pending.updates:
+            db.query(Alert).filter(Alert.alert_id == alert_id).update(values, synchronize_session=False)
+        if linked:
+            db.query(Alert).filter(Alert.alert_id.in_(linked))\
+                .update({"incident_id": pending.incident[1].alert_id}, synchronize_session=False)
+        for transition, item, enclosure_id, alert_type, message, critical, violation, was_critical in pending.emits:
+            if item.alert_id is not None:
+                _emit(db, transition, item.alert_id, enclosure_id, alert_type, message, critical, violation,
+                      was_critical)
+        if pending.incident is not None:
+            print(f"🌩️ [ALERT STORM] {pending.incident[3]} enclosures in {self.storm_window}s "
+                  f"-> incident #{pending.incident[1].alert_id}")
+        return created
+
+    # --- Переходи (під lock; записи - в pending) ---
+
+    def _register(self, state):
+        self._states.setdefault(state.enclosure_id, {})[state.family] = state
+
+    def _open(self, pending, enclosure_id, violation, existing, now):
+        state = AlertState(enclosure_id, violation, now)
+
+        if existing is not None:
+            state.alert_id = existing.alert_id
+            state.occurrences = (existing.occurrences or 1) + 1
+            state.first_seen = existing.timestamp or now
+            state.critical = (existing.alert_type or "").startswith(CRITICAL_PREFIX)
+            state.alert_type = existing.alert_type
+            self._register(state)
+            if violation.critical and not state.critical:
+                self._escalate(pending, state, violation)
+            return
+
+        self._register(state)
+        pending.journal.append(("open", state))
+        self._openings.append((now, state))
+        window_start = now - timedelta(seconds=self.storm_window)
+        while self._openings and self._openings[0][0] < window_start:
+            self._openings.popleft()
+
+        incident = self._incident
+        if incident is not None and (now - incident.last_opening).total_seconds() <= self.storm_window:
+            # Шторм триває: не пишемо окремо, зараховуємо до інциденту
+            incident.last_opening = now
+            self._attach(incident, state)
+            return
+
+        pending.opened.append((state, Alert(
+            enclosure_id=enclosure_id,
+            alert_type=violation.alert_type,
+            message=violation.message,
+            status="New",
+            timestamp=now,
+            last_seen=now,
+            occurrences=1
+        )))
+        pending.emits.append(("open", state, enclosure_id, state.alert_type, state.message, state.critical,
+                              violation, None))
+
+        enclosures = {s.enclosure_id for _, s in self._openings}
+        if len(enclosures) >= self.storm_min_enclosures:
+            self._open_incident(pending, now, enclosures)
+
+    def _open_incident(self, pending, now, enclosures):
+        members = [s for _, s in self._openings if s.incident is None]
+        families = sorted({s.family for s in members})
+        alert = Alert(
+            enclosure_id=None,
+            alert_type=INCIDENT_TYPE,
+            message=f"Одночасні алерти у {len(enclosures)} вольєрах за {self.storm_window} с: "
+                    f"{', '.join(families)}",
+            status="New",
+            timestamp=now,
+            last_seen=now,
+            occurrences=len(members)
+        )
+        # alert_id - після flush у _apply; до того учасники шторму чіпляються до нього так само
+        incident = Incident(None, now)
+        for state in members:
+            self._attach(incident, state)
+        self._incident = incident
+        pending.incident = (incident, alert, members, len(enclosures))
+        pending.journal.append(("incident", incident))
+        pending.emits.append(("incident", incident, None, INCIDENT_TYPE, alert.message, True, None, None))
+
+    def _attach(self, incident, state):
+        state.incident = incident
+        incident.members.add(state)
+        incident.total += 1
+
+    def _escalate(self, pending, state, violation):
+        state.critical = True
+        state.alert_type = violation.alert_type
+        state.message = violation.message
+        self._write_escalation(pending, state, violation)
+
+    @staticmethod
+    def _write_escalation(pending, state, violation=None):
+        if state.alert_id is None:
+            return  # Рядок ще не записаний - _apply допише ескалацію після flush
+        pending.updates.append((state.alert_id, {
+            "alert_type": state.alert_type,
+            "message": state.message,
+            "occurrences": state.occurrences,
+            "last_seen": state.last_seen,
+        }))
+        pending.journal.append(("escalate", state))
+        pending.emits.append(("escalate", state, state.enclosure_id, state.alert_type, state.message, True,
+                              violation, None))
+
+    def _forget(self, state):
+        by_family = self._states.get(state.enclosure_id)
+        if by_family is not None and by_family.get(state.family) is state:
+            del by_family[state.family]
+            if not by_family:
+                del self._states[state.enclosure_id]
+
+    def _resolve(self, pending, state, now):
+        self._forget(state)
+        if state.alert_id is not None:
+            pending.updates.append((state.alert_id, {
+                "status": "Resolved",
+                "occurrences": state.occurrences,
+                "last_seen": state.last_seen,
+                "resolved_at": now,
+            }))
+            pending.journal.append(("resolve", state))
+            pending.emits.append(("resolve", state, state.enclosure_id, state.alert_type,
+                                  f"Відновлено після {state.occurrences} повторів: {state.message}", False,
+                                  None, state.critical))
+
+        incident = state.incident
+        if incident is not None:
+            incident.members.discard(state)
+            if not incident.members:
+                self._resolve_incident(pending, incident, now)
+
+    def _resolve_incident(self, pending, incident, now):
+        current = self._incident is incident
+        if current:
+            self._incident = None
+        pending.journal.append(("resolve_incident", incident, current))
+        if incident.alert_id is None:
+            return  # Ще не записаний (flush в іншому потоці) - закривати в БД нічого
+        pending.updates.append((incident.alert_id, {
+            "status": "Resolved",
+            "occurrences": incident.total,
+            "last_seen": now,
+            "resolved_at": now,
+        }))
+        pending.emits.append(("resolve", incident, None, INCIDENT_TYPE,
+                              f"Інцидент завершено ({incident.total} алертів)", False, None, True))
+        print(f"✅ [ALERT STORM] Incident #{incident.alert_id} resolved ({incident.total} alerts)")
+
+    # --- Відкат (rollback / close без commit сесії, де були переходи) ---
+
+    def _undo(self, journal):
+        """
+        Повертає пам'ять до стану БД. Незаписані відкриття й ескалації забуваються -
+        наступне порушення перечитає Alert з БД (_load_existing); закриття повертаються.
+        """
+        with self._lock:
+            for kind, item, *extra in reversed(journal):
+                if kind == "open":
+                    self._forget(item)
+                    self._openings = deque((t, s) for t, s in self._openings if s is not item)
+                    if item.incident is not None:
+                        item.incident.members.discard(item)
+                        item.incident.total -= 1
+                        item.incident = None
+                elif kind == "escalate":
+                    self._forget(item)
+                    if item.incident is not None:
+                        item.incident.members.discard(item)
+                        item.incident = None
+                elif kind == "incident":
+                    if self._incident is item:
+                        self._incident = None
+                    for member in list(item.members):
+                        member.incident = None
+                        if member.alert_id is None:
+                            self._forget(member)
+                    item.members.clear()
+                elif kind == "resolve":
+                    by_family = self._states.setdefault(item.enclosure_id, {})
+                    if item.family not in by_family:
+                        item.clean_streak = 0
+                        by_family[item.family] = item
+                        if item.incident is not None:
+                            item.incident.members.add(item)
+                elif kind == "resolve_incident" and extra[0] and self._incident is None:
+                    self._incident = item
+
+    # --- Фонове обслуговування ---
+
+    def sweep(self, db, now=None):
+        """Закриття тихих аномалій + звірка з БД (ручне закриття)"""
+        now = now or datetime.utcnow()
+        pending = _Pending()
+        with self._lock:
+            for state in self.active():
+                if state.channel is None and (now - state.last_seen).total_seconds() > QUIET_RESOLVE_SECONDS:
+                    self._resolve(pending, state, now)
+
+            tracked = {s.alert_id: s for s in self.active() if s.alert_id is not None}
+            if self._incident is not None and self._incident.alert_id is not None:
+                tracked[self._incident.alert_id] = self._incident
+
+        closed = set()
+        if tracked:
+            closed = {alert_id for (alert_id,) in db.query(Alert.alert_id).filter(
+                Alert.alert_id.in_(list(tracked)), Alert.status != "New"
+            ).all()}
+
+        with self._lock:
+            for alert_id in closed:
+                item = tracked[alert_id]
+                if isinstance(item, Incident):
+                    # Інцидент закрито вручну: незаписані учасники відкриються заново
+                    for member in list(item.members):
+                        if member.alert_id is None:
+                            self._forget(member)
+                        member.incident = None
+                    if self._incident is item:
+                        self._incident = None
+                else:
+                    self._forget(item)
+                    incident = item.incident
+                    if incident is not None:
+                        incident.members.discard(item)
+                        item.incident = None
+                        # Останній учасник закрито вручну - інцидент теж завершено (як у _resolve)
+                        if not incident.members and incident.alert_id not in closed:
+                            self._resolve_incident(pending, incident, now)
+        self._apply(db, pending)
+
+    # --- Файл стану (рестарт воркера без повторного відкриття / втрати лічильників) ---
+
+    def snapshot(self):
+        """Стан у JSON-сумісному вигляді (час - ISO, посилання на інцидент - його alert_id)"""
+        with self._lock:
+            states = self.active()
+            index = {id(state): i for i, state in enumerate(states)}
+            incidents = {s.incident.alert_id: s.incident for s in states if s.incident is not None}
+            if self._incident is not None:
+                incidents[self._incident.alert_id] = self._incident
+            return {
+                "states": [dict({slot: getattr(s, slot) for slot in AlertState.__slots__},
+                                first_seen=s.first_seen.isoformat(), last_seen=s.last_seen.isoformat(),
+                                incident=s.incident.alert_id if s.incident is not None else None)
+                           for s in states],
+                "incidents": [{"alert_id": i.alert_id, "opened_at": i.opened_at.isoformat(),
+                               "last_opening": i.last_opening.isoformat(), "total": i.total}
+                              for i in incidents.values()],
+                "incident": self._incident.alert_id if self._incident is not None else None,
+                "openings": [[t.isoformat(), index[id(s)]] for t, s in self._openings if id(s) in index],
+            }
+
+    def restore(self, data):
+        """
+        Відновлює snapshot(). Звірка з БД (алерти, закриті, поки процес не працював) -
+        на найближчому observe(). Повертає кількість відновлених відбитків.
+        """
+        with self._lock:
+            self.reset()
+            incidents = {}
+            for item in data.get("incidents", []):
+                incident = Incident(item["alert_id"], datetime.fromisoformat(item["opened_at"]))
+                incident.last_opening = datetime.fromisoformat(item["last_opening"])
+                incident.total = item["total"]
+                incidents[incident.alert_id] = incident
+            states = []
+            for item in data.get("states", []):
+                state = AlertState.__new__(AlertState)
+                for slot in AlertState.__slots__:
+                    setattr(state, slot, item.get(slot))
+                state.first_seen = datetime.fromisoformat(item["first_seen"])
+                state.last_seen = datetime.fromisoformat(item["last_seen"])
+                state.incident = incidents.get(item.get("incident"))
+                if state.incident is not None:
+                    state.incident.members.add(state)
+                self._register(state)
+                states.append(state)
+            self._openings.extend((datetime.fromisoformat(t), states[i]) for t, i in data.get("openings", []))
+            self._incident = incidents.get(data.get("incident"))
+            return len(states)
+
+
+# Спільний екземпляр процесу (API або воркер)
+alert_state = AlertStateMachine()
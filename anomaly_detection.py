@@ -0,0 +1,469 @@
+"""
+Потоковий детектор аномалій телеметрії (доповнює статичні пороги ClimateProfile).
+
+На кожен вимір (пристрій, канал) тримається O(1) стан у __slots__-об'єкті:
+  * EWMA та експоненційно зважена дисперсія -> відхилення (z-score)
+  * швидкість зміни (°C/хв, %/хв)
+  * скільки часу показ не змінюється -> "завислий" датчик
+  * скільки часу дисперсія майже нульова -> flatline
+
+Покази приходять нерівномірно (report-by-exception: delta одразу, інакше
+heartbeat раз на 2 хв). Між показами сигнал у межах deadband від останнього
+надісланого, тому пропущені такти EWMA "дотягує" до last_value (як якби
+контролер слав його кожні sample_seconds), а вікна stuck/flatline - у секундах.
+
+Кожен вимір обробляється інкрементально (update), без історії.
+Для реплею історії є векторизована версія (VectorDetector): той самий
+алгоритм, але крок часу виконується для всіх пристроїв одразу в NumPy.
+
+    python anomaly_detection.py --devices 10000 --samples 2000
+    python anomaly_detection.py --csv history.csv      # вивантаження з telemetry_export
+"""
+import argparse
+import csv
+import enum
+import math
+import time
+from collections import defaultdict
+
+
+class AnomalyType(str, enum.Enum):
+    deviation = "Deviation"
+    rate_of_change = "Rate Of Change"
+    stuck_sensor = "Stuck Sensor"
+    flatline = "Flatline"
+
+
+ANOMALY_TYPES = list(AnomalyType)
+
+
+class DetectorConfig:
+    """Параметри детектора для одного каналу"""
+    __slots__ = ("alpha", "sample_seconds", "z_threshold", "min_std", "max_rate_per_min",
+                 "stuck_seconds", "stuck_samples", "flat_variance", "flat_seconds", "warmup")
+
+    def __init__(self, alpha=0.05, sample_seconds=5.0, z_threshold=4.0, min_std=0.5, max_rate_per_min=15.0,
+                 stuck_seconds=300.0, stuck_samples=3, flat_variance=1e-4, flat_seconds=600.0, warmup=20):
+        self.alpha = alpha                        # Вага нового виміру в EWMA
+        self.sample_seconds = sample_seconds      # Такт, під який задано alpha (publish контролера)
+        self.z_threshold = z_threshold            # |z| вище -> відхилення
+        # Нижня межа std для z-score: не менше за похибку датчика (DHT22 - ±0.5°C).
+        # Інакше на спокійному каналі цикл нагрівача (+1-1.5°C) дає |z| > 4
+        self.min_std = min_std
+        self.max_rate_per_min = max_rate_per_min  # Фізично неможлива швидкість (нагрівач - до ~10°C/хв)
+        self.stuck_seconds = stuck_seconds        # Показ не змінюється 5 хв...
+        self.stuck_samples = stuck_samples        # ...і повторився хоча б стільки разів (heartbeat - раз на 2 хв)
+        self.flat_variance = flat_variance        # Дисперсія нижче - "мертвий" сигнал
+        self.flat_seconds = flat_seconds
+        self.warmup = warmup                      # Скільки вимірів тільки навчаємося
+
+
+DEFAULT_CONFIGS = {
+    "temperature": DetectorConfig(),
+    "humidity": DetectorConfig(min_std=3.0, max_rate_per_min=20.0, flat_variance=1e-3),
+}
+
+
+class AnomalyAlert:
+    """Типізований алерт детектора"""
+    __slots__ = ("device_id", "channel", "anomaly_type", "value", "score", "timestamp")
+
+    def __init__(self, device_id, channel, anomaly_type, value, score, timestamp):
+        self.device_id = device_id
+        self.channel = channel
+        self.anomaly_type = anomaly_type
+        self.value = value
+        self.score = score
+        self.timestamp = timestamp
+
+    @property
+    def alert_type(self):
+        """Рядок для Alert.alert_type"""
+        return f"Anomaly: {self.anomaly_type.value}"
+
+    @property
+    def message(self):
+        if self.anomaly_type is AnomalyType.deviation:
+            detail = f"z-score {self.score:.1f}"
+        elif self.anomaly_type is AnomalyType.rate_of_change:
+            detail = f"rate {self.score:.1f}/min"
+        else:
+            detail = f"{int(self.score)}s"
+        return f"{self.channel} {self.value}: {self.anomaly_type.value} ({detail})"
+
+    def __repr__(self):
+        return f"AnomalyAlert({self.device_id}, {self.channel}, {self.anomaly_type.value}, {self.value})"
+
+
+class ChannelState:
+    """O(1) стан одного каналу одного пристрою"""
+    __slots__ = ("n", "mean", "var", "last_value", "last_ts", "same_count", "same_since", "flat_since")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.last_value = None
+        self.last_ts = None
+        self.same_count = 0
+        self.same_since = None   # Коли з'явився поточний показ
+        self.flat_since = None   # Коли дисперсія впала нижче flat_variance (None - не впала)
+
+
+def hold_alpha(cfg, dt):
+    """
+    Сумарна вага пропущених тактів: (dt - sample_seconds) / sample_seconds повторів last_value.
+    Оновлення West з цією вагою точно дорівнює стільком окремим крокам з тим самим значенням.
+    """
+    if dt <= cfg.sample_seconds:
+        return 0.0
+    return 1.0 - (1.0 - cfg.alpha) ** ((dt - cfg.sample_seconds) / cfg.sample_seconds)
+
+
+def _ewma_step(state, alpha, value):
+    """Оновлення EWMA / EW-дисперсії (West, 1979)"""
+    diff = value - state.mean
+    incr = alpha * diff
+    state.mean += incr
+    state.var = (1.0 - alpha) * (state.var + diff * incr)
+
+
+def update_channel(state, cfg, value, ts):
+    """
+    Один крок детектора. Повертає список (AnomalyType, score) - порожній,
+    якщо все гаразд. Стан оновлюється in-place.
+    """
+    found = []
+    state.n += 1
+
+    if state.n == 1:
+        state.mean = value
+        state.last_value = value
+        state.last_ts = ts
+        state.same_since = ts
+        return found
+
+    # --- Завислий датчик / flatline (спрацьовують один раз, на переході) ---
+    if value == state.last_value:
+        state.same_count += 1
+        held = ts - state.same_since
+        was_stuck = state.same_count > cfg.stuck_samples and state.last_ts - state.same_since >= cfg.stuck_seconds
+        if state.same_count >= cfg.stuck_samples and held >= cfg.stuck_seconds and not was_stuck:
+            found.append((AnomalyType.stuck_sensor, held))
+    else:
+        state.same_count = 0
+        state.same_since = ts
+
+    # --- Рідкі покази (report-by-exception): між ними тримався last_value ---
+    hold = hold_alpha(cfg, ts - state.last_ts)
+    if hold > 0:
+        _ewma_step(state, hold, state.last_value)
+
+    if state.n > cfg.warmup:
+        # --- Відхилення від EWMA ---
+        std = max(math.sqrt(state.var), cfg.min_std)
+        if std > 0:
+            z = (value - state.mean) / std
+            if abs(z) > cfg.z_threshold:
+                found.append((AnomalyType.deviation, z))
+
+        # --- Швидкість зміни ---
+        dt = ts - state.last_ts
+        if dt > 0:
+            rate = (value - state.last_value) * 60.0 / dt
+            if abs(rate) > cfg.max_rate_per_min:
+                found.append((AnomalyType.rate_of_change, rate))
+
+    _ewma_step(state, cfg.alpha, value)
+
+    if state.n > cfg.warmup and state.var < cfg.flat_variance:
+        if state.flat_since is None:
+            state.flat_since = ts
+        flat = ts - state.flat_since
+        if flat >= cfg.flat_seconds and state.last_ts - state.flat_since < cfg.flat_seconds:
+            found.append((AnomalyType.flatline, flat))
+    else:
+        state.flat_since = None
+
+    state.last_value = value
+    state.last_ts = ts
+    return found
+
+
+class StreamingDetector:
+    """Банк станів: (device_id, channel) -> ChannelState"""
+    def __init__(self, configs=None):
+        self.configs = configs or DEFAULT_CONFIGS
+        self._states = {}
+
+    def update(self, device_id, ts, **values):
+        """
+        detector.update(1, ts, temperature=22.4, humidity=51.0) -> [AnomalyAlert, ...]
+        None-значення пропускаються (датчик не відповів).
+        """
+        alerts = []
+        for channel, value in values.items():
+            if value is None or channel not in self.configs:
+                continue
+            key = (device_id, channel)
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = ChannelState()
+            for anomaly_type, score in update_channel(state, self.configs[channel], float(value), ts):
+                alerts.append(AnomalyAlert(device_id, channel, anomaly_type, value, score, ts))
+        return alerts
+
+    def reset(self, device_id=None):
+        if device_id is None:
+            self._states.clear()
+            return
+        for key in [k for k in self._states if k[0] == device_id]:
+            del self._states[key]
+
+    def __len__(self):
+        return len(self._states)
+
+    def snapshot(self):
+        """Стани каналів для файлу стану воркера (JSON): [[device_id, channel, *поля]]"""
+        return [[device_id, channel, *(getattr(state, f) for f in ChannelState.__slots__)]
+                for (device_id, channel), state in list(self._states.items())]
+
+    def restore(self, rows):
+        for device_id, channel, *values in rows:
+            if channel not in self.configs:
+                continue
+            state = ChannelState()
+            for field, value in zip(ChannelState.__slots__, values):
+                setattr(state, field, value)
+            self._states[(device_id, channel)] = state
+
+
+# ==============================================================================
+# ВЕКТОРИЗОВАНИЙ РЕПЛЕЙ (той самий алгоритм для D пристроїв одночасно)
+# ==============================================================================
+
+class VectorDetector:
+    """Стан детектора для D пристроїв у масивах NumPy"""
+    def __init__(self, n_devices, cfg):
+        import numpy as np
+        self.np = np
+        self.cfg = cfg
+        self.n = 0
+        self.mean = np.zeros(n_devices)
+        self.var = np.zeros(n_devices)
+        self.last_value = np.zeros(n_devices)
+        self.last_ts = np.zeros(n_devices)
+        self.same_count = np.zeros(n_devices, dtype=np.int64)
+        self.same_since = np.zeros(n_devices)
+        self.flat_since = np.full(n_devices, np.nan)   # NaN - дисперсія не впала
+
+    def step(self, values, ts):
+        """
+        Один крок часу для всіх пристроїв.
+        Повертає dict AnomalyType -> bool[D] (де спрацювало).
+        """
+        np = self.np
+        cfg = self.cfg
+        self.n += 1
+        if self.n == 1:
+            self.mean[:] = values
+            self.last_value[:] = values
+            self.last_ts[:] = ts
+            self.same_since[:] = ts
+            return {}
+
+        same = values == self.last_value
+        self.same_count = np.where(same, self.same_count + 1, 0)
+        self.same_since = np.where(same, self.same_since, ts)
+        stuck = (self.same_count >= cfg.stuck_samples) & (ts - self.same_since >= cfg.stuck_seconds)
+        was_stuck = (self.same_count > cfg.stuck_samples) & (self.last_ts - self.same_since >= cfg.stuck_seconds)
+        result = {AnomalyType.stuck_sensor: stuck & ~was_stuck}
+
+        # Рідкі покази: пропущені такти - повтори last_value (див. hold_alpha)
+        dt = ts - self.last_ts
+        hold = 1.0 - (1.0 - cfg.alpha) ** (np.maximum(dt - cfg.sample_seconds, 0.0) / cfg.sample_seconds)
+        diff = self.last_value - self.mean
+        self.mean += hold * diff
+        self.var = (1.0 - hold) * (self.var + diff * hold * diff)
+
+        warm = self.n > cfg.warmup
+        if warm:
+            std = np.maximum(np.sqrt(self.var), cfg.min_std)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                z = np.where(std > 0, (values - self.mean) / std, 0.0)
+            result[AnomalyType.deviation] = np.abs(z) > cfg.z_threshold
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rate = np.where(dt > 0, (values - self.last_value) * 60.0 / dt, 0.0)
+            result[AnomalyType.rate_of_change] = np.abs(rate) > cfg.max_rate_per_min
+
+        diff = values - self.mean
+        incr = cfg.alpha * diff
+        self.mean += incr
+        self.var = (1.0 - cfg.alpha) * (self.var + diff * incr)
+
+        if warm:
+            flat = self.var < cfg.flat_variance
+            self.flat_since = np.where(flat, np.where(np.isnan(self.flat_since), ts, self.flat_since), np.nan)
+            result[AnomalyType.flatline] = ((ts - self.flat_since >= cfg.flat_seconds)
+                                            & (self.last_ts - self.flat_since < cfg.flat_seconds))
+        else:
+            self.flat_since[:] = np.nan
+
+        self.last_value[:] = values
+        self.last_ts[:] = ts
+        return result
+
+
+def replay(values, timestamps, cfg=None):
+    """
+    Реплей історії values[T, D] (timestamps[T] або [T, D], секунди).
+    Повертає (dict AnomalyType -> bool[T, D], samples/sec).
+    """
+    import numpy as np
+
+    cfg = cfg or DEFAULT_CONFIGS["temperature"]
+    values = np.asarray(values, dtype=np.float64)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if timestamps.ndim == 1:
+        timestamps = np.broadcast_to(timestamps[:, None], values.shape)
+
+    n_steps, n_devices = values.shape
+    detector = VectorDetector(n_devices, cfg)
+    flags = {t: np.zeros((n_steps, n_devices), dtype=bool) for t in ANOMALY_TYPES}
+
+    started = time.perf_counter()
+    for i in range(n_steps):
+        for anomaly_type, hit in detector.step(values[i], timestamps[i]).items():
+            flags[anomaly_type][i] = hit
+    elapsed = time.perf_counter() - started
+    return flags, values.size / max(elapsed, 1e-9)
+
+
+# ==============================================================================
+# ОЦІНКА (реплей з інжектованими збоями)
+# ==============================================================================
+
+def inject_faults(values, rng, n_faults_per_type=5, stuck_len=200, flat_len=400):
+    """
+    Додає в історію відомі збої (сплеск, завислий датчик, flatline).
+    Повертає (змінені values, dict AnomalyType -> [(t, d), ...]) - "правильні відповіді".
+    """
+    values = values.copy()
+    n_steps, n_devices = values.shape
+    truth = defaultdict(list)
+    margin = max(stuck_len, flat_len) + 50
+
+    for _ in range(n_faults_per_type):
+        # Сплеск: і відхилення, і неможлива швидкість (туди й назад)
+        t, d = int(rng.integers(100, n_steps - margin)), int(rng.integers(n_devices))
+        values[t, d] += rng.choice([-1, 1]) * 15.0
+        truth[AnomalyType.deviation].append((t, d))
+        truth[AnomalyType.rate_of_change].append((t, d))
+
+        t, d = int(rng.integers(100, n_steps - margin)), int(rng.integers(n_devices))
+        values[t:t + stuck_len, d] = values[t, d]
+        truth[AnomalyType.stuck_sensor].append((t, d))
+
+        # Flatline: "мертвий" сигнал з шумом АЦП - однакових показів немає, stuck не бачить
+        t, d = int(rng.integers(100, n_steps - margin)), int(rng.integers(n_devices))
+        values[t:t + flat_len, d] = values[t, d] + rng.normal(0.0, 0.005, flat_len)
+        truth[AnomalyType.flatline].append((t, d))
+    return values, truth
+
+
+def score(flags, truth, tolerance):
+    """
+    Precision/recall по кожному типу: спрацювання в межах tolerance кроків після збою
+    (число або dict AnomalyType -> кроків)
+    """
+    import numpy as np
+
+    report = {}
+    for anomaly_type, hits in flags.items():
+        expected = truth.get(anomaly_type, [])
+        window_len = tolerance[anomaly_type] if isinstance(tolerance, dict) else tolerance
+        detected = 0
+        matched = np.zeros_like(hits)
+        for t, d in expected:
+            window = hits[t:t + window_len, d]
+            if window.any():
+                detected += 1
+                matched[t:t + window_len, d] = window
+        fired = int(hits.sum())
+        report[anomaly_type.value] = {
+            "fired": fired,
+            "expected": len(expected),
+            "recall": round(detected / len(expected), 3) if expected else None,
+            "precision": round(int(matched.sum()) / fired, 3) if fired and expected else None,
+        }
+    return report
+
+
+def _load_csv(path, channel="temperature_val"):
+    """CSV з telemetry_export -> (values[T, D], timestamps[T, D]) з вирівнюванням по довжині"""
+    import numpy as np
+    from datetime import datetime
+
+    series = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row[channel]:
+                ts = datetime.fromisoformat(row["timestamp"]).timestamp()
+                series[row["device_id"]].append((ts, float(row[channel])))
+
+    length = min(len(s) for s in series.values())
+    ts = np.array([[p[0] for p in s[:length]] for s in series.values()]).T
+    vals = np.array([[p[1] for p in s[:length]] for s in series.values()]).T
+    return vals, ts
+
+
+def main(argv=None):
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description="Replay & score anomaly detectors")
+    parser.add_argument("--csv", default=None, help="Історія з telemetry_export (CSV)")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    if args.csv:
+        values, timestamps = _load_csv(args.csv)
+    else:
+        # Синтетична історія з фізики симулятора (data_generator)
+        from data_generator import FleetClimateModel
+        model = FleetClimateModel(rng.uniform(15, 25, args.devices), rng.uniform(26, 32, args.devices),
+                                  seed=args.seed)
+        values = np.empty((args.samples, args.devices))
+        for i in range(args.samples):
+            model.step()
+            values[i] = model.filtered
+        timestamps = np.arange(args.samples) * args.interval
+
+    flat_len = 400
+    values, truth = inject_faults(values, rng, flat_len=flat_len)
+    flags, throughput = replay(values, timestamps)
+    print(f"⚡ Replay: {values.size:,} samples, {throughput:,.0f} samples/s")
+    # Flatline чекає, поки EW-дисперсія згасне, - вікно на всю довжину збою
+    tolerance = {t: int(DEFAULT_CONFIGS["temperature"].stuck_seconds / args.interval) + 5 for t in ANOMALY_TYPES}
+    tolerance[AnomalyType.flatline] = flat_len
+    for name, stats in score(flags, truth, tolerance).items():
+        print(f"   {name:16s} {stats}")
+
+    # Для порівняння - скалярний (продакшн) шлях на підмножині
+    subset = values[:, : min(50, values.shape[1])]
+    detector = StreamingDetector()
+    ts_matrix = np.broadcast_to(np.asarray(timestamps, dtype=float).reshape(len(values), -1), values.shape)
+    started = time.perf_counter()
+    for i in range(subset.shape[0]):
+        for d in range(subset.shape[1]):
+            detector.update(d, ts_matrix[i, d], temperature=subset[i, d])
+    elapsed = time.perf_counter() - started
+    print(f"🐢 Scalar StreamingDetector: {subset.size / elapsed:,.0f} samples/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Інструментація API: латентність по маршрутах, кількість/час SQL-запитів на
+запит, час серіалізації відповіді (Pydantic) + ендпоінт /metrics.
+
+Опційно - семплюючий профайлер повільних запитів:
+    PROFILE_SLOW_REQUESTS_MS=500     поріг (мс), вище якого стек зберігається
+    PROFILE_INTERVAL_MS=5            період семплювання
+    PROFILE_OUTPUT_DIR=profiles      куди писати *.folded
+
+Файли *.folded - формат "collapsed stacks" (frame;frame;frame count), який
+напряму приймають flamegraph.pl, speedscope та inferno.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+from datetime import datetime
+
+import fastapi.routing
+from fastapi import APIRouter
+from fastapi.responses import Response
+from sqlalchemy import event
+
+from metrics import (
+    REGISTRY, Counter, Histogram, COUNT_BUCKETS, PROMETHEUS_CONTENT_TYPE
+)
+
+# --- МЕТРИКИ ---
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ("method", "route", "status")
+)
+REQUESTS_TOTAL = Counter(
+    "http_requests_total", "Requests by route and status", ("method", "route", "status")
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL queries executed per request", ("route",), buckets=COUNT_BUCKETS
+)
+DB_TIME = Histogram("http_request_db_seconds", "Time spent in SQL per request", ("route",))
+SERIALIZATION_TIME = Histogram(
+    "http_response_serialization_seconds", "Pydantic response validation/serialization time", ("route",)
+)
+SLOW_PROFILES = Counter("http_slow_request_profiles_total", "Stack profiles dumped for slow requests", ("route",))
+
+# Статистика поточного запиту. Це mutable dict: sync-ендпоінти виконуються в
+# threadpool з копією контексту, але мутують той самий об'єкт.
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def _route_label(scope):
+    route = scope.get("route")
+    # Шаблон маршруту (/telemetry/history/{enclosure_id}), а не сирий шлях
+    return getattr(route, "path", None) or "unmatched"
+
+
+# ==============================================================================
+# 1. SQL (події SQLAlchemy на engine)
+# ==============================================================================
+
+def install_db_hooks(engine):
+    """Рахує кількість і час SQL-запитів, виконаних у межах HTTP-запиту"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        # Одне значення, а не стек: запит з помилкою не доходить до after_cursor_execute,
+        # а наступний просто перезапише старт
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_start", None)
+        if started is None:
+            return
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["db_queries"] += 1
+            stats["db_seconds"] += time.perf_counter() - started
+
+
+# ==============================================================================
+# 2. СЕРІАЛІЗАЦІЯ (обгортка над fastapi.routing.serialize_response)
+# ==============================================================================
+
+_original_serialize_response = fastapi.routing.serialize_response
+
+
+async def _timed_serialize_response(*args, **kwargs):
+    started = time.perf_counter()
+    try:
+        return await _original_serialize_response(*args, **kwargs)
+    finally:
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["serialize_seconds"] += time.perf_counter() - started
+
+
+def install_serialization_hook():
+    fastapi.routing.serialize_response = _timed_serialize_response
+
+
+# ==============================================================================
+# 3. СЕМПЛЮЮЧИЙ ПРОФАЙЛЕР
+# ==============================================================================
+
+class SamplingProfiler:
+    """
+    Фоновий потік раз на interval знімає стеки всіх потоків (sys._current_frames)
+    і додає їх до кожного активного запиту. Якщо запит виявився повільним,
+    його стеки записуються у файл .folded; інакше просто відкидаються.
+    При паралельних запитах семпли змішуються - це компроміс за нульову
+    вартість для швидких запитів.
+    """
+    def __init__(self, threshold_ms, interval_ms=5.0, output_dir="profiles"):
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.output_dir = output_dir
+        self._active = {}  # id(samples) -> Counter стеків
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def begin(self):
+        samples = _StackCounter()
+        with self._lock:
+            self._active[id(samples)] = samples
+        self._wakeup.set()
+        return samples
+
+    def end(self, samples, duration, method, route):
+        with self._lock:
+            self._active.pop(id(samples), None)
+        if duration >= self.threshold and samples:
+            self._dump(samples, duration, method, route)
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            if not self._active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            time.sleep(self.interval)
+            stacks = [
+                _collapse(frame) for ident, frame in sys._current_frames().items()
+                if ident != own_ident
+            ]
+            with self._lock:
+                targets = list(self._active.values())
+            for samples in targets:
+                samples.update(stacks)
+
+    def _dump(self, samples, duration, method, route):
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_route = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{method}_{safe_route}_{int(duration * 1000)}ms.folded"
+        path = os.path.join(self.output_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        SLOW_PROFILES.inc(route=route)
+        print(f"🐢 [PROFILE] {method} {route} took {duration * 1000:.0f}ms -> {path}")
+
+
+def _collapse(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def profiler_from_env():
+    threshold = os.getenv("PROFILE_SLOW_REQUESTS_MS")
+    if not threshold:
+        return None
+    return SamplingProfiler(
+        threshold_ms=float(threshold),
+        interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+        output_dir=os.getenv("PROFILE_OUTPUT_DIR", "profiles"),
+    )
+
+
+# ==============================================================================
+# 4. MIDDLEWARE
+# ==============================================================================
+
+class MetricsMiddleware:
+    """Чиста ASGI-middleware (без BaseHTTPMiddleware - менше накладних витрат)"""
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"db_queries": 0, "db_seconds": 0.0, "serialize_seconds": 0.0}
+        token = _request_stats.set(stats)
+        status_holder = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["code"] = message["status"]
+            await send(message)
+
+        samples = self.profiler.begin() if self.profiler else None
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            _request_stats.reset(token)
+
+            method = scope.get("method", "")
+            route = _route_label(scope)
+            status = str(status_holder["code"])
+            REQUEST_LATENCY.observe(duration, method=method, route=route, status=status)
+            REQUESTS_TOTAL.inc(method=method, route=route, status=status)
+            DB_QUERIES.observe(stats["db_queries"], route=route)
+            DB_TIME.observe(stats["db_seconds"], route=route)
+            SERIALIZATION_TIME.observe(stats["serialize_seconds"], route=route)
+
+            if samples is not None:
+                self.profiler.end(samples, duration, method, route)
+
+
+def setup_monitoring(app, *engines):
+    """Підключає всю інструментацію до застосунку (engines: sync і sync_engine async-engine)"""
+    for engine in engines:
+        install_db_hooks(engine)
+    install_serialization_hook()
+    app.add_middleware(MetricsMiddleware, profiler=profiler_from_env())
+    app.include_router(router)
+
+
+# ==============================================================================
+# 5. ЕНДПОІНТ /metrics
+# ==============================================================================
+
+router = APIRouter(tags=["Monitoring"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Метрики у форматі Prometheus"""
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,75 @@
+"""
+Бенчмарк рушія правил алертів (alert_rules).
+
+Міряє:
+  * компіляцію таблиці правил для всіх вольєрів (один запит)
+  * оцінку показу за скомпільованими правилами (temp + hum + light, один прохід)
+  * для порівняння - старий підхід: запит профілю в БД на кожен показ
+
+    python benchmarks/bench_alert_rules.py --enclosures 500 --output rules.json
+"""
+import argparse
+import random
+import time
+
+from common import (
+    add_common_args, configure_database, ensure_dataset, measure,
+    summarize, print_result, write_results
+)
+
+
+def run(args):
+    from dependencies import engine, SessionLocal
+    from models import Animal, ClimateProfile
+    from alert_rules import RuleTable, evaluate_reading, rule_table
+
+    ensure_dataset(engine, args.rows, args.enclosures)
+    db = SessionLocal()
+    results = []
+    try:
+        table = RuleTable()
+        results.append(measure("rules_compile", lambda: table.compile(db),
+                               max(1, args.iterations // 10), {"enclosures": len(table.compile(db))}))
+
+        rules = list(table.compile(db).values())
+        samples = [(random.choice(rules), random.uniform(5, 40), random.uniform(10, 90), random.uniform(0, 900))
+                   for _ in range(10_000)]
+
+        # Чиста оцінка (без БД): пакет із 10к показів
+        started = time.perf_counter()
+        rounds = max(1, args.iterations // 10)
+        for _ in range(rounds):
+            for rule, t, h, lux in samples:
+                rule.evaluate(t, h, lux)
+        elapsed = time.perf_counter() - started
+        results.append(summarize("rules_evaluate", [], {"rules": len(rules)},
+                                 wall_seconds=elapsed, operations=rounds * len(samples)))
+
+        enclosure_ids = [r.enclosure_id for r in rules]
+        rule_table.compile(db)
+        results.append(measure(
+            "evaluate_reading_cached",
+            lambda: evaluate_reading(db, random.choice(enclosure_ids), random.uniform(5, 40), 50.0, None),
+            args.iterations * 10))
+
+        def legacy():
+            enc = random.choice(enclosure_ids)
+            animal = db.query(Animal).filter(Animal.enclosure_id == enc).first()
+            profile = db.query(ClimateProfile).filter(ClimateProfile.species_id == animal.species_id).first()
+            return profile.min_temperature
+
+        results.append(measure("legacy_profile_query_per_reading", legacy, args.iterations))
+    finally:
+        db.close()
+
+    for result in results:
+        print_result(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ZooSmartCare alert rules benchmark")
+    add_common_args(parser)
+    args = parser.parse_args()
+    configure_database(args.database_url)
+    write_results(run(args), args.output, {"enclosures": args.enclosures})
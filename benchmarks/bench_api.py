@@ -0,0 +1,126 @@
+"""
+Бенчмарк REST API (in-process, через TestClient - без мережі).
+
+Міряє:
+  * receive_telemetry (POST /telemetry/) - req/s
+  * get_telemetry_history / get_latest_telemetry / report_avg_temp - латентність
+    при заданому обсязі sensor_reading (--rows 1e5 .. 1e8)
+  * login - пропускна здатність (bcrypt)
+  * sync_device_config - одночасне опитування всім парком пристроїв
+
+    python benchmarks/bench_api.py --rows 1e6 --output api.json
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import (
+    add_common_args, configure_database, ensure_dataset, measure,
+    summarize, print_result, write_results
+)
+
+API = "/api/business"
+
+
+def _fleet(db):
+    from models import IoTDevice
+    return [(d.mac_address, d.enclosure_id) for d in
+            db.query(IoTDevice).filter(IoTDevice.enclosure_id.isnot(None)).all()]
+
+
+def bench_read_paths(client, fleet, iterations, rows):
+    results = []
+    params = {"rows": rows}
+    enclosure_ids = [enc for _, enc in fleet]
+
+    def history():
+        client.get(f"{API}/telemetry/history/{random.choice(enclosure_ids)}")
+
+    def latest():
+        client.get(f"{API}/telemetry/enclosure/{random.choice(enclosure_ids)}/latest")
+
+    def avg_temp():
+        client.get(f"{API}/reports/temperature-avg/{random.choice(enclosure_ids)}")
+
+    for name, fn in (("get_telemetry_history", history),
+                     ("get_latest_telemetry", latest),
+                     ("report_avg_temp", avg_temp)):
+        results.append(measure(name, fn, iterations, params))
+    return results
+
+
+def bench_receive_telemetry(client, fleet, iterations):
+    macs = [mac for mac, _ in fleet]
+
+    def post():
+        client.post(f"{API}/telemetry/", json={
+            "mac_address": random.choice(macs),
+            "temperature": round(random.uniform(15, 30), 1),
+            "humidity": round(random.uniform(30, 70), 1),
+        })
+
+    return measure("receive_telemetry", post, iterations, {"devices": len(macs)})
+
+
+def bench_login(client, iterations):
+    def login():
+        client.post("/api/admin/auth/login", data={"username": "Super Admin", "password": "admin"})
+
+    # bcrypt навмисно повільний - обмежуємо кількість ітерацій
+    return measure("login", login, max(1, iterations // 10), warmup=1)
+
+
+def bench_sync_config(client, fleet, pollers, rounds=3):
+    """Кожен пристрій парку запитує /config/{mac}; pollers паралельних клієнтів"""
+    macs = [mac for mac, _ in fleet] * rounds
+
+    def poll(mac):
+        t0 = time.perf_counter()
+        client.get(f"{API}/config/{mac}")
+        return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=pollers) as pool:
+        latencies = list(pool.map(poll, macs))
+    return summarize("sync_device_config_fleet", latencies,
+                     {"devices": len(fleet), "pollers": pollers, "rounds": rounds},
+                     wall_seconds=time.perf_counter() - started)
+
+
+def run(args):
+    from fastapi.testclient import TestClient
+    from dependencies import engine, SessionLocal
+
+    rows = ensure_dataset(engine, args.rows, args.enclosures)
+
+    import main
+    results = []
+    with TestClient(main.app) as client:  # with -> спрацьовує startup (створення admin)
+        db = SessionLocal()
+        try:
+            fleet = _fleet(db)
+        finally:
+            db.close()
+
+        print(f"🚀 API benchmark: {rows:,} readings, {len(fleet)} devices")
+        for result in (bench_read_paths(client, fleet, args.iterations, rows)
+                       + [bench_receive_telemetry(client, fleet, args.iterations),
+                          bench_login(client, args.iterations),
+                          bench_sync_config(client, fleet, args.pollers)]):
+            print_result(result)
+            results.append(result)
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ZooSmartCare API benchmark")
+    add_common_args(parser)
+    parser.add_argument("--pollers", type=int, default=16, help="Паралельні клієнти для sync_device_config")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    configure_database(args.database_url)
+    write_results(run(args), args.output, {"rows": args.rows})
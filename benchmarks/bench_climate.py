@@ -0,0 +1,93 @@
+"""
+Бенчмарк кліматичної аналітики (/reports/climate, climate_analytics).
+
+Міряє на масштабі зоопарку (сотні вольєрів x 30 днів):
+  * climate_report - один запит + векторизований розрахунок для всіх вольєрів
+  * окремо: завантаження в NumPy і чистий розрахунок analyze()
+  * для порівняння - старий підхід: запит і розрахунок по одному вольєру
+
+    python benchmarks/bench_climate.py --enclosures 300 --days 30 --output climate.json
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from common import (
+    add_common_args, configure_database, ensure_dataset, measure,
+    print_result, write_results
+)
+
+INTERVAL_SECONDS = 180  # Як у mqtt_worker (SAVE_INTERVAL_SECONDS)
+
+
+def run(args):
+    import numpy as np
+    from dependencies import engine, SessionLocal
+    from models import SensorReading, IoTDevice
+    import climate_analytics
+
+    days = getattr(args, "days", 30)
+    rows = max(int(args.rows), args.enclosures * days * 86400 // INTERVAL_SECONDS)
+    total = ensure_dataset(engine, rows, args.enclosures, INTERVAL_SECONDS)
+
+    end = datetime.utcnow()
+    start = end - timedelta(days=days)
+    iterations = max(1, args.iterations // 100)
+    db = SessionLocal()
+    results = []
+    try:
+        limits = climate_analytics.climate_limits(db)
+        arrays = climate_analytics.load_readings(db, None, start, end)
+        params = {"readings": len(arrays), "enclosures": len(limits), "days": days}
+        print(f"🚀 Climate benchmark: {len(arrays):,} readings in window ({total:,} total), {len(limits)} enclosures")
+
+        results.append(measure("climate_report_all_enclosures",
+                               lambda: climate_analytics.climate_report(db, None, start, end),
+                               iterations, params, warmup=1))
+        results.append(measure("climate_load_numpy",
+                               lambda: climate_analytics.load_readings(db, None, start, end),
+                               iterations, params, warmup=1))
+        results.append(measure("climate_analyze_vectorized",
+                               lambda: climate_analytics.analyze(arrays, limits),
+                               iterations * 10, params, warmup=1))
+
+        enclosure_ids = sorted(limits)
+
+        def legacy():
+            # Запит + розрахунок на кожен вольєр окремо
+            out = {}
+            for enc in enclosure_ids:
+                temps = [t for (t,) in db.query(SensorReading.temperature_val)
+                         .join(IoTDevice, SensorReading.device_id == IoTDevice.device_id)
+                         .filter(IoTDevice.enclosure_id == enc,
+                                 SensorReading.timestamp >= start, SensorReading.timestamp < end)
+                         .order_by(SensorReading.timestamp).all() if t is not None]
+                if not temps:
+                    continue
+                t_min, t_max = limits[enc]
+                values = np.array(temps)
+                out[enc] = (np.percentile(values, [5, 50, 95]),
+                            sum(1 for t in temps if (t_min is not None and t < t_min)
+                                or (t_max is not None and t > t_max)))
+            return out
+
+        # Повільно на великих обсягах - один прогін
+        results.append(measure("legacy_per_enclosure_queries", legacy, 1, params, warmup=0))
+    finally:
+        db.close()
+
+    for result in results:
+        print_result(result)
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ZooSmartCare climate analytics benchmark")
+    add_common_args(parser)
+    parser.add_argument("--days", type=int, default=30)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    configure_database(args.database_url)
+    write_results(run(args), args.output, {"enclosures": args.enclosures, "days": args.days})
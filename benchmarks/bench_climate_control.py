@@ -0,0 +1,164 @@
+"""
+Офлайн бенчмарк якості клімат-контролю контролера (замкнений контур на симуляторах
+ІоТ/machine.py + ІоТ/dht.py, без MQTT і без реального часу).
+
+Порівнює гістерезис і PID (часо-пропорційне реле) на однакових сценаріях і
+однаковому шумі: перерегулювання, час встановлення, частка часу в нормі,
+кількість увімкнень реле (короткі цикли) та енергія.
+
+    python benchmarks/bench_climate_control.py --hours 6 --output control.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+from datetime import datetime
+
+IOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ІоТ")
+if IOT_DIR not in sys.path:
+    sys.path.insert(0, IOT_DIR)
+
+STEP_SECONDS = 1.0          # Такт віртуального годинника (= період control-задачі main_loop)
+SAMPLE_EVERY_STEPS = 2      # Опитування датчика - як sample_seconds у main_loop
+SETTLE_WINDOW_STEPS = 300   # Встановлення: ковзне середнє за 5 хв лишається в нормі
+HEATER_POWER_W = 250.0
+FAN_POWER_W = 40.0
+
+SCENARIOS = {
+    # Симулятор дрейфує до 20°C: нагрів вимагає постійної роботи обігрівача
+    "heat_to_24_26": {"temp_min": 24.0, "temp_max": 26.0},
+    "cool_to_16_18": {"temp_min": 16.0, "temp_max": 18.0},
+}
+MODES = ("hysteresis", "pid")
+
+
+def base_config(scenario, mode):
+    return {
+        "aviary_id": "AV_SIM", "hysteresis": 0.5, "control_mode": mode,
+        "dht_pin": 15, "relay_heat_pin": 4, "relay_fan_pin": 5, "servo_pin": 18,
+        **SCENARIOS[scenario],
+    }
+
+
+def simulate(scenario, mode, hours, seed):
+    import machine
+    from core_business_logic import HardwareManager, LogicController
+
+    random.seed(seed)
+    cfg = base_config(scenario, mode)
+    steps = int(hours * 3600 / STEP_SECONDS)
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Логи [HARDWARE] на кожне перемикання
+        hw = HardwareManager(cfg)
+        clock = [0.0]
+        hw.sensor.clock = lambda: clock[0]       # Фізика симулятора - за віртуальним часом
+        # Свій стан фізики на кожен прогін (не глобальний SIMULATION_STATE)
+        hw.sensor.state = hw.heater.state = hw.fan.state = machine.new_simulation_state()
+        logic = LogicController(cfg)
+        temps, heater_steps, fan_steps, switches = [], 0, 0, 0
+        prev = (False, False)
+        filtered_t = None
+        for step in range(steps):
+            now = clock[0] = step * STEP_SECONDS
+            if step % SAMPLE_EVERY_STEPS == 0:
+                raw_t, raw_h = hw.read_sensors()      # Фізика + шум симулятора
+                filtered_t, _, _ = logic.filter_sample(raw_t, raw_h)
+            status, heat_on, fan_on = "error", False, False
+            if filtered_t is not None:
+                status, heat_on, fan_on = logic.process_climate(filtered_t, now)
+            hw.set_heater(heat_on)
+            hw.set_fan(fan_on)
+
+            temps.append(hw.sensor._temp)             # Справжня температура, не відфільтрована
+            heater_steps += heat_on
+            fan_steps += fan_on
+            switches += (heat_on and not prev[0]) + (fan_on and not prev[1])
+            prev = (heat_on, fan_on)
+
+    return summarize(cfg, temps, heater_steps, fan_steps, switches, hours)
+
+
+def summarize(cfg, temps, heater_steps, fan_steps, switches, hours):
+    t_min, t_max = cfg["temp_min"], cfg["temp_max"]
+    setpoint = (t_min + t_max) / 2.0
+    in_band = [t_min <= t <= t_max for t in temps]
+
+    # Перерегулювання: найбільший вихід за протилежну межу після першого входу в норму
+    first = next((i for i, ok in enumerate(in_band) if ok), None)
+    overshoot = 0.0
+    if first is not None:
+        heating = temps[0] < t_min
+        after = temps[first:]
+        overshoot = max(0.0, (max(after) - t_max) if heating else (t_min - min(after)))
+
+    # Встановлення: з якого моменту ковзне середнє (5 хв) більше не виходить з норми
+    settled_at = None
+    window = SETTLE_WINDOW_STEPS
+    for i in range(len(temps) - window, -1, -1):
+        mean = sum(temps[i:i + window]) / window
+        if not (t_min <= mean <= t_max):
+            break
+        settled_at = i
+    minutes_on = lambda steps: steps * STEP_SECONDS / 60.0
+
+    return {
+        "time_to_band_s": None if first is None else first * STEP_SECONDS,
+        "settling_time_s": None if settled_at is None else settled_at * STEP_SECONDS,
+        "overshoot_c": round(overshoot, 2),
+        "in_band_pct": round(100.0 * sum(in_band) / len(in_band), 1),
+        "rmse_c": round((sum((t - setpoint) ** 2 for t in temps[first or 0:])
+                         / max(1, len(temps) - (first or 0))) ** 0.5, 2),
+        "relay_cycles": switches,
+        "relay_cycles_per_hour": round(switches / hours, 1),
+        "heater_on_min": round(minutes_on(heater_steps), 1),
+        "fan_on_min": round(minutes_on(fan_steps), 1),
+        "energy_wh": round(minutes_on(heater_steps) / 60.0 * HEATER_POWER_W
+                           + minutes_on(fan_steps) / 60.0 * FAN_POWER_W, 1),
+    }
+
+
+def run(args):
+    results = []
+    for scenario in SCENARIOS:
+        for mode in MODES:
+            runs = [simulate(scenario, mode, args.hours, args.seed + i) for i in range(args.runs)]
+            # Медіана по прогонах з різним шумом
+            merged = {}
+            for key in runs[0]:
+                values = sorted(r[key] for r in runs if r[key] is not None)
+                merged[key] = values[len(values) // 2] if values else None
+            results.append({"scenario": scenario, "mode": mode, "runs": args.runs, **merged})
+            settle = merged['settling_time_s']
+            print(f"   {scenario:16s} {mode:10s} overshoot={merged['overshoot_c']}°C "
+                  f"settle={'n/a' if settle is None else f'{settle}s'} in_band={merged['in_band_pct']}% "
+                  f"cycles/h={merged['relay_cycles_per_hour']} energy={merged['energy_wh']}Wh")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ZooSmartCare controller climate-control benchmark")
+    parser.add_argument("--hours", type=float, default=6.0, help="Симульований час на прогін")
+    parser.add_argument("--runs", type=int, default=5, help="Прогонів з різним шумом на режим")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Файл JSON з результатами")
+    args = parser.parse_args()
+
+    print(f"🚀 Closed-loop control benchmark: {args.hours} h x {args.runs} runs, step {STEP_SECONDS}s")
+    results = run(args)
+    if args.output:
+        report = {
+            "meta": {"timestamp": datetime.utcnow().isoformat(), "python": platform.python_version(),
+                     "hours": args.hours, "runs": args.runs, "seed": args.seed, "step_seconds": STEP_SECONDS},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"📝 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
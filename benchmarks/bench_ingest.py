@@ -0,0 +1,211 @@
+"""
+Бенчмарк MQTT-інжесту (mqtt_worker).
+
+Міряє:
+  * msgs/sec через mqtt_worker.on_message - з реальним throttle
+    (більшість повідомлень відкидається) і без нього (кожне пишеться в БД)
+  * end-to-end латентність алерту: повідомлення з температурою поза нормою ->
+    рядок Alert закомічено в БД (включно з очікуванням пакетного запису,
+    до TELEMETRY_FLUSH_SECONDS)
+
+Режими:
+  * за замовчуванням - in-process (повідомлення подаються прямо в on_message)
+  * --broker localhost - через локальний брокер (mosquitto): публікація -> воркер -> БД
+  * --broker loopback - той самий шлях через брокер у пам'яті (transport.py), без мережі
+
+УВАГА: mqtt_worker видаляє показання, старші за DATA_RETENTION_HOURS,
+тому в run_all цей бенчмарк запускається останнім.
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from common import (
+    add_common_args, configure_database, ensure_dataset, measure,
+    summarize, print_result, write_results
+)
+from transport import BrokerSettings, LOOPBACK_HOST, create_transport
+
+
+def _devices(db):
+    """[(device_id, max_temperature)] для пристроїв з кліматичним профілем"""
+    from models import IoTDevice, Animal, ClimateProfile
+    rows = db.query(IoTDevice.device_id, ClimateProfile.max_temperature)\
+        .join(Animal, Animal.enclosure_id == IoTDevice.enclosure_id)\
+        .join(ClimateProfile, ClimateProfile.species_id == Animal.species_id)\
+        .distinct().all()
+    return [(d, t) for d, t in rows]
+
+
+_SEQ = itertools.count(1)  # Як контролер: кожне повідомлення з унікальним seq
+
+
+def _payload(device_id, temp):
+    return json.dumps({
+        "aviary_id": f"AV_{device_id:03d}",
+        "temp": temp,
+        "hum": 50.0,
+        "heater": 0,
+        "fan": 0,
+        "status": "stable",
+        "timestamp": time.time(),
+        "seq": next(_SEQ),
+    }).encode()
+
+
+def bench_ingest_throughput(worker, devices, iterations, throttled):
+    name = "mqtt_ingest_throttled" if throttled else "mqtt_ingest_every_message"
+    saved_interval = worker.SAVE_INTERVAL_SECONDS
+    if not throttled:
+        worker.SAVE_INTERVAL_SECONDS = 0
+    worker.last_save_time.clear()
+
+    def handle():
+        device_id, max_t = random.choice(devices)
+        msg = SimpleNamespace(topic="zoo/telemetry", payload=_payload(device_id, max_t - 2.0))
+        worker.on_message(None, None, msg)
+
+    try:
+        # Запис пакета (кожне TELEMETRY_BATCH_SIZE-те повідомлення) - у латентності того виклику
+        return measure(name, handle, iterations, {"devices": len(devices)})
+    finally:
+        worker.flush_buffers(force=True)
+        worker.SAVE_INTERVAL_SECONDS = saved_interval
+
+
+def _wait_for_alert(db_factory, enclosure_id, since_id, timeout=10.0):
+    from models import Alert
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        db = db_factory()
+        try:
+            found = db.query(Alert.alert_id).filter(
+                Alert.enclosure_id == enclosure_id, Alert.alert_id > since_id
+            ).first()
+        finally:
+            db.close()
+        if found:
+            return True
+        time.sleep(0.001)
+    return False
+
+
+def bench_alert_latency(worker, devices, publish, samples):
+    """Латентність 'повідомлення -> Alert у БД' (кожен зразок на іншому пристрої)"""
+    from dependencies import SessionLocal
+    from models import Alert, IoTDevice
+    from sqlalchemy import func
+
+    db = SessionLocal()
+    try:
+        enclosure_of = dict(db.query(IoTDevice.device_id, IoTDevice.enclosure_id).all())
+        # Закриваємо старі алерти, щоб анти-спам не заблокував нові
+        db.query(Alert).filter(Alert.status == "New").update({"status": "Resolved"})
+        db.commit()
+    finally:
+        db.close()
+    # ...і стан у пам'яті воркера. Зразки йдуть підряд по різних вольєрах -
+    # вимикаємо детектор шторму, щоб міряти шлях окремого алерту
+    worker.alert_state.reset()
+    storm_threshold = worker.alert_state.storm_min_enclosures
+    worker.alert_state.storm_min_enclosures = len(devices) + 1
+
+    latencies = []
+    for device_id, max_t in random.sample(devices, min(samples, len(devices))):
+        worker.last_save_time.pop(device_id, None)
+        db = SessionLocal()
+        try:
+            last_id = db.query(func.max(Alert.alert_id)).scalar() or 0
+        finally:
+            db.close()
+
+        t0 = time.perf_counter()
+        publish(device_id, max_t + worker.TEMP_CRITICAL_MARGIN + 5.0)
+        if _wait_for_alert(SessionLocal, enclosure_of[device_id], last_id):
+            latencies.append(time.perf_counter() - t0)
+
+    worker.alert_state.storm_min_enclosures = storm_threshold
+    return summarize("alert_end_to_end_latency", latencies, {"samples": len(latencies)})
+
+
+def run(args):
+    from dependencies import engine, SessionLocal
+    import mqtt_worker as worker
+
+    ensure_dataset(engine, args.rows, args.enclosures)
+    db = SessionLocal()
+    try:
+        devices = _devices(db)
+    finally:
+        db.close()
+
+    mode = "in-process" if not args.broker else "loopback" if args.broker == LOOPBACK_HOST else "broker"
+    print(f"🚀 Ingest benchmark: {len(devices)} devices, mode={mode}")
+    results = []
+    # Як у воркері: неповні пакети записує фоновий потік
+    threading.Thread(target=worker.flush_buffers_periodically, daemon=True).start()
+
+    if args.broker:
+        # Воркер - окремий клієнт у цьому ж процесі, підписаний на брокер (як у mqtt_worker)
+        worker.BROKER = BrokerSettings.from_env(host=args.broker, port=args.port,
+                                                client_id="bench-ingest-worker")
+        consumer = create_transport(worker.BROKER, on_connect=worker.on_connect,
+                                    on_message=worker.on_message, manual_ack=True).start()
+        producer = create_transport(BrokerSettings.from_env(host=args.broker, port=args.port,
+                                                            client_id="bench-ingest-producer")).start()
+        if not (consumer.wait_connected(10) and producer.wait_connected(10)):
+            raise SystemExit(f"❌ Broker {worker.BROKER} unavailable")
+
+        def publish(device_id, temp):
+            producer.publish(worker.MQTT_TOPIC, _payload(device_id, temp), qos=1).wait_for_publish()
+
+        worker.SAVE_INTERVAL_SECONDS, saved = 0, worker.SAVE_INTERVAL_SECONDS
+        count = args.iterations
+        started = time.perf_counter()
+        for i in range(count):
+            device_id, max_t = devices[i % len(devices)]
+            publish(device_id, max_t - 2.0)
+        if mode == "loopback":
+            worker.flush_buffers(force=True)  # Доставка синхронна - лишається дописати пакет
+        else:
+            # Чекаємо, поки воркер обробить хвіст черги
+            time.sleep(1.0)
+        worker.SAVE_INTERVAL_SECONDS = saved
+        results.append(summarize("mqtt_broker_publish", [], {"messages": count},
+                                 wall_seconds=time.perf_counter() - started, operations=count))
+        results.append(bench_alert_latency(worker, devices, publish, args.alert_samples))
+
+        consumer.stop()
+        producer.stop()
+    else:
+        def publish(device_id, temp):
+            worker.on_message(None, None, SimpleNamespace(topic="zoo/telemetry",
+                                                          payload=_payload(device_id, temp)))
+
+        results.append(bench_ingest_throughput(worker, devices, args.iterations, throttled=True))
+        results.append(bench_ingest_throughput(worker, devices, args.iterations, throttled=False))
+        results.append(bench_alert_latency(worker, devices, publish, args.alert_samples))
+
+    for result in results:
+        print_result(result)
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ZooSmartCare MQTT ingest benchmark")
+    add_common_args(parser)
+    parser.add_argument("--broker", default=None,
+                        help="Локальний MQTT брокер (напр. localhost) або loopback - брокер у пам'яті")
+    parser.add_argument("--port", type=int, default=None, help="За замовчуванням - MQTT_PORT / 1883")
+    parser.add_argument("--alert-samples", type=int, default=20)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    configure_database(args.database_url)
+    write_results(run(args), args.output, {"rows": args.rows})
@@ -0,0 +1,205 @@
+"""
+Навантажувальний тест API через мережу (uvicorn + httpx, asyncio-клієнти).
+
+На відміну від bench_api (послідовні виклики через TestClient) тут N клієнтів
+одночасно шлють запити протягом --duration секунд (closed loop), рівні
+--concurrency 1,10,50,...; для кожного ендпоінта - req/s, p50/p95 і
+найбільша конкурентність, за якої p95 <= --target-ms.
+
+Сервер піднімається тут же (uvicorn main:app на --port, одна worker-копія,
+свіжа на кожен рівень), або береться готовий через --url. Порівняння версій - compare.py:
+
+    python benchmarks/bench_load.py --rows 1e5 --output load_v2.json
+    python benchmarks/bench_load.py --url http://127.0.0.1:8000 --concurrency 1,50,200
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+from common import (
+    ROOT_DIR, add_common_args, configure_database, ensure_dataset,
+    summarize, print_result, write_results
+)
+
+API = "/api/business"
+
+
+def _fleet():
+    from dependencies import SessionLocal
+    from models import IoTDevice
+    db = SessionLocal()
+    try:
+        return [(d.mac_address, d.enclosure_id) for d in
+                db.query(IoTDevice).filter(IoTDevice.enclosure_id.isnot(None)).all()]
+    finally:
+        db.close()
+
+
+def start_server(port):
+    """uvicorn main:app у дочірньому процесі (та сама БД через DATABASE_URL)"""
+    import httpx
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT_DIR, env=os.environ.copy(),
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+        try:
+            httpx.get(f"{url}/metrics", timeout=1)
+            return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError("uvicorn did not start in 30s")
+
+
+def endpoints(fleet, token):
+    """name -> (method, path_fn, kwargs_fn): гарячі шляхи читання і інжесту"""
+    enclosure_ids = [enc for _, enc in fleet]
+    macs = [mac for mac, _ in fleet]
+    auth = {"Authorization": f"Bearer {token}"}
+
+    def telemetry():
+        return {"json": {
+            "mac_address": random.choice(macs),
+            "temperature": round(random.uniform(15, 30), 1),
+            "humidity": round(random.uniform(30, 70), 1),
+            # Як у реального контролера: стан механізмів у кожному показі (actuator_events)
+            "heater": random.random() < 0.5,
+            "fan": random.random() < 0.2,
+            "status": "OK",
+        }}
+
+    return {
+        "alerts_active": ("GET", lambda: f"{API}/alerts/", lambda: {"headers": auth}),
+        "telemetry_latest": ("GET", lambda: f"{API}/telemetry/enclosure/{random.choice(enclosure_ids)}/latest",
+                             dict),
+        "telemetry_history": ("GET", lambda: f"{API}/telemetry/history/{random.choice(enclosure_ids)}",
+                              dict),
+        "receive_telemetry": ("POST", lambda: f"{API}/telemetry/", telemetry),
+    }
+
+
+async def run_level(url, endpoint, concurrency, duration, timeout=10.0):
+    """concurrency клієнтів у циклі duration секунд -> (латентності, помилки, wall); timeout - помилка"""
+    import httpx
+    method, path, kwargs = endpoint
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < stop_at:
+                t0 = time.perf_counter()
+                try:
+                    response = await client.request(method, path(), **kwargs())
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return latencies, errors, wall
+
+
+def max_concurrency(results, target_ms):
+    """endpoint -> найбільша конкурентність з p95 <= target_ms (None - жодна)"""
+    best = {}
+    for result in results:
+        params = result["params"]
+        best.setdefault(params["endpoint"], None)
+        p95 = result["latency_ms"]["p95"]
+        if p95 is not None and p95 <= target_ms and not params["errors"]:
+            best[params["endpoint"]] = max(best[params["endpoint"]] or 0, params["concurrency"])
+    return best
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()  # Завислий сервер (вичерпаний пул) не завершується сам
+
+
+def login(url):
+    import httpx
+    response = httpx.post(f"{url}/api/admin/auth/login",
+                          data={"username": "Super Admin", "password": "admin"}, timeout=30)
+    return response.json()["access_token"]
+
+
+def run(args):
+    from dependencies import engine
+
+    rows = ensure_dataset(engine, args.rows, args.enclosures)
+    fleet = _fleet()
+    levels = [int(c) for c in args.concurrency.split(",")]
+    names = list(endpoints(fleet, "").keys())
+    if args.endpoints:
+        names = args.endpoints.split(",")
+
+    print(f"🚀 Load test: {rows:,} readings, {len(fleet)} devices, "
+          f"{args.duration}s per level, target p95 <= {args.target_ms}ms")
+    results = []
+    for name in names:
+        for concurrency in levels:
+            # Свій сервер - свіжий на кожен рівень: запити, кинуті клієнтом по таймауту,
+            # інакше займають пул і псують наступні рівні
+            proc, url = (None, args.url) if args.url else start_server(args.port)
+            try:
+                endpoint = endpoints(fleet, login(url))[name]
+                latencies, errors, wall = asyncio.run(
+                    run_level(url, endpoint, concurrency, args.duration, args.timeout))
+            finally:
+                if proc is not None:
+                    stop_server(proc)
+            result = summarize(f"{name}@{concurrency}", latencies,
+                               {"endpoint": name, "concurrency": concurrency, "errors": errors},
+                               wall_seconds=wall)
+            print_result(result)
+            if errors:
+                print(f"   ⚠️ {errors} failed requests")
+            results.append(result)
+
+    best = max_concurrency(results, args.target_ms)
+    for name, concurrency in best.items():
+        print(f"📈 {name:20s} max concurrency at p95 <= {args.target_ms}ms: {concurrency}")
+    return results, best
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="ZooSmartCare API load test")
+    add_common_args(parser)
+    parser.add_argument("--url", default=None, help="Готовий сервер (інакше - uvicorn тут)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", default="1,10,50,100,200", help="Рівні через кому")
+    parser.add_argument("--duration", type=float, default=10.0, help="Секунд на рівень")
+    parser.add_argument("--target-ms", type=float, default=100.0, help="Межа p95")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Таймаут запиту, с (зависання - помилка)")
+    parser.add_argument("--endpoints", default=None, help="Підмножина через кому")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    configure_database(args.database_url)
+    results, best = run(args)
+    write_results(results, args.output, {"rows": args.rows, "target_ms": args.target_ms,
+                                         "max_concurrency": best})
@@ -0,0 +1,161 @@
+"""
+Спільні інструменти бенчмарків: підготовка БД, заміри, запис JSON.
+
+БД вибирається ДО імпорту dependencies (engine створюється при імпорті):
+    --database-url postgresql://...   - локальний PostgreSQL
+    (за замовчуванням)                - тимчасовий файл SQLite
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Корінь репозиторію в sys.path (як у mqtt_worker / ІоТ/main_loop)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def configure_database(database_url=None):
+    """Виставляє DATABASE_URL для dependencies.py. Повертає URL."""
+    if database_url is None:
+        database_url = os.environ.get("DATABASE_URL")
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="zoo_bench_"), "bench.sqlite")
+        database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = database_url
+    return database_url
+
+
+def add_common_args(parser):
+    parser.add_argument("--database-url", default=None,
+                        help="БД для бенчмарку (за замовчуванням тимчасовий SQLite)")
+    parser.add_argument("--rows", type=float, default=1e5,
+                        help="Кількість показань у sensor_reading (1e5 .. 1e8)")
+    parser.add_argument("--enclosures", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", default=None, help="Файл JSON з результатами")
+
+
+# ==============================================================================
+# ЗАМІРИ
+# ==============================================================================
+
+def summarize(name, latencies, params=None, wall_seconds=None, operations=None):
+    """Зведення латентностей (сек) у запис результату"""
+    latencies = sorted(latencies)
+    count = operations if operations is not None else len(latencies)
+    total = wall_seconds if wall_seconds is not None else sum(latencies)
+
+    def pct(p):
+        if not latencies:
+            return None
+        idx = min(len(latencies) - 1, int(round(p / 100.0 * (len(latencies) - 1))))
+        return round(latencies[idx] * 1000, 3)
+
+    return {
+        "name": name,
+        "params": params or {},
+        "operations": count,
+        "seconds": round(total, 4),
+        "ops_per_sec": round(count / total, 1) if total else None,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+            "p50": pct(50),
+            "p95": pct(95),
+            "p99": pct(99),
+            "max": round(latencies[-1] * 1000, 3) if latencies else None,
+        },
+    }
+
+
+def measure(name, fn, iterations, params=None, warmup=5):
+    """Послідовно викликає fn() iterations разів і рахує латентність кожного виклику"""
+    for _ in range(min(warmup, iterations)):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(name, latencies, params, time.perf_counter() - started)
+
+
+def print_result(result):
+    lat = result["latency_ms"]
+    print(f"   {result['name']:40s} {result['ops_per_sec'] or 0:>10,.1f} ops/s  "
+          f"p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms")
+
+
+# ==============================================================================
+# ДАНІ
+# ==============================================================================
+
+def ensure_dataset(engine, rows, enclosures, interval=60):
+    """
+    Заповнює БД синтетичними даними (data_generator), якщо їх ще немає.
+    Повертає кількість показань у sensor_reading.
+    """
+    from sqlalchemy import func
+    from sqlalchemy.orm import sessionmaker
+    from data_generator import load_fleet
+    from models import Base, SensorReading
+
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        existing = db.query(func.count(SensorReading.reading_id)).scalar() or 0
+    finally:
+        db.close()
+
+    rows = int(rows)
+    if existing >= rows:
+        return existing
+
+    per_day = enclosures * (86400 // interval)
+    days = max(1, -(-(rows - existing) // per_day))
+    print(f"📦 Loading ~{days * per_day:,} synthetic readings ({enclosures} enclosures x {days} days)...")
+    stats = load_fleet(engine, enclosures, days, interval, seed=42, prefix="BENCH")
+    return existing + stats["rows"]
+
+
+# ==============================================================================
+# РЕЗУЛЬТАТИ
+# ==============================================================================
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def write_results(results, output=None, extra_meta=None):
+    """Записує результати у машиночитний JSON (для порівняння між версіями)"""
+    from dependencies import engine
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            **(extra_meta or {}),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"💾 Results saved to {output}")
+    return report
@@ -0,0 +1,53 @@
+"""
+Порівняння двох JSON-звітів бенчмарків (стара версія -> нова).
+
+    python benchmarks/compare.py baseline.json current.json --threshold 0.10
+
+Код виходу 1, якщо хоч один бенчмарк погіршився більше ніж на threshold
+(за ops/s або p95) - зручно для CI.
+"""
+import argparse
+import json
+import sys
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return {r["name"]: r for r in json.load(f)["results"]}
+
+
+def compare(old, new, threshold):
+    regressions = []
+    print(f"{'benchmark':40s} {'ops/s old':>12s} {'ops/s new':>12s} {'p95 old':>10s} {'p95 new':>10s}")
+    for name in sorted(set(old) & set(new)):
+        o, n = old[name], new[name]
+        o_ops, n_ops = o.get("ops_per_sec") or 0, n.get("ops_per_sec") or 0
+        o_p95, n_p95 = o["latency_ms"].get("p95"), n["latency_ms"].get("p95")
+
+        flag = ""
+        if o_ops and n_ops < o_ops * (1 - threshold):
+            flag = "  ⚠️ slower"
+        if o_p95 and n_p95 and n_p95 > o_p95 * (1 + threshold):
+            flag = "  ⚠️ p95 up"
+        if flag:
+            regressions.append(name)
+        print(f"{name:40s} {o_ops:>12,.1f} {n_ops:>12,.1f} {o_p95 or 0:>10.2f} {n_p95 or 0:>10.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare benchmark results")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    regressions = compare(_load(args.baseline), _load(args.current), args.threshold)
+    if regressions:
+        print(f"\n❌ Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Запуск усіх бенчмарків з одним JSON-звітом.
+
+    python benchmarks/run_all.py --rows 1e5 --output bench_v1.json
+    python benchmarks/run_all.py --database-url postgresql://... --rows 1e7 --broker localhost
+    python benchmarks/compare.py bench_v1.json bench_v2.json
+"""
+import argparse
+
+from common import add_common_args, configure_database, write_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ZooSmartCare benchmark suite")
+    add_common_args(parser)
+    parser.add_argument("--pollers", type=int, default=16)
+    parser.add_argument("--broker", default=None)
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--alert-samples", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30, help="Вікно кліматичного звіту")
+    args = parser.parse_args()
+
+    configure_database(args.database_url)
+
+    import bench_alert_rules
+    import bench_api
+    import bench_climate
+    import bench_ingest
+
+    results = []
+    results += bench_api.run(args)
+    results += bench_alert_rules.run(args)
+    results += bench_climate.run(args)
+    # Інжест останнім: mqtt_worker чистить показання, старші за 24 год
+    results += bench_ingest.run(args)
+
+    write_results(results, args.output, {"rows": args.rows, "enclosures": args.enclosures})
+
+
+if __name__ == "__main__":
+    main()
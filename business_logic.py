@@ -1,11 +1,24 @@
+import asyncio
 import datetime
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select
 
 # Імпорти інструментів
-from dependencies import get_db, get_current_user, require_role
+from dependencies import get_db, get_async_db, get_current_user, require_role, SessionLocal
+from alert_rules import evaluate_reading, record_violations, measured_channels
+import climate_resolver
+import feeding_analytics
+import climate_analytics
+import actuator_events
+from device_config import build_device_config
+from telemetry_export import (
+    stream_export, available_formats, EXPORT_FORMATS,
+    DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE
+)
 
 # Імпорти моделей та схем
 from models import (
@@ -18,7 +31,7 @@ from schemas import (
     FeedingScheduleCreate, FeedingScheduleResponse, FeedingScheduleUpdate,
     AlertResponse, AlertUpdate,
     SpeciesCreate, SpeciesResponse, SpeciesUpdate,
-    ClimateProfileCreate, ClimateProfileResponse, ClimateProfileUpdate,
+    ClimateProfileCreate, ClimateProfileResponse, ClimateProfileUpdate, EffectiveClimateResponse,
     AnimalResponse, AnimalUpdate,
     MedicalRecordCreate, MedicalRecordResponse, MedicalRecordUpdate,
     MaintenanceLogCreate, MaintenanceLogResponse, MaintenanceLogUpdate,
@@ -112,6 +125,8 @@ def create_climate_profile(
     db_profile = ClimateProfile(**profile.dict())
     db.add(db_profile)
     db.commit()
+    climate_resolver.recompute(db)  # Норми всіх вольєрів з цим видом
+    db.commit()
     db.refresh(db_profile)
     return db_profile
 
@@ -130,6 +145,8 @@ def update_climate_profile(
     for key, value in update_data.dict(exclude_unset=True).items():
         setattr(profile, key, value)
         
+    db.commit()
+    climate_resolver.recompute(db)
     db.commit()
     db.refresh(profile)
     return profile
@@ -147,8 +164,17 @@ def delete_climate_profile(
     
     db.delete(profile)
     db.commit()
+    climate_resolver.recompute(db)
+    db.commit()
     return {"detail": "Climate profile deleted successfully"}
 
+@router.get("/enclosures/{enclosure_id}/climate", response_model=EffectiveClimateResponse)
+def get_enclosure_climate(enclosure_id: int, db: Session = Depends(get_db)):
+    """Ефективні норми вольєра з урахуванням сезону та всіх видів"""
+    if not db.query(Enclosure.enclosure_id).filter(Enclosure.enclosure_id == enclosure_id).first():
+        raise HTTPException(status_code=404, detail="Enclosure not found")
+    return climate_resolver.get_effective_climate(db, enclosure_id)
+
 # ==============================================================================
 # 2. ЩОДЕННИЙ ДОГЛЯД (ТВАРИНИ)
 # ==============================================================================
@@ -187,9 +213,13 @@ def update_animal_status(
     if not db_animal:
         raise HTTPException(status_code=404, detail="Animal not found")
     
+    old_enclosure_id = db_animal.enclosure_id
     for key, value in animal_update.dict(exclude_unset=True).items():
         setattr(db_animal, key, value)
         
+    db.commit()
+    # Переселення або зміна виду -> перерахунок норм обох вольєрів
+    climate_resolver.recompute(db, [old_enclosure_id, db_animal.enclosure_id])
     db.commit()
     db.refresh(db_animal)
     return db_animal
@@ -207,6 +237,7 @@ def create_schedule(
     new_schedule = FeedingSchedule(**schedule.dict())
     db.add(new_schedule)
     db.commit()
+    feeding_analytics.refresh_today(db)  # План сьогодні - з нового розкладу
     db.refresh(new_schedule)
     return new_schedule
 
@@ -230,6 +261,7 @@ def update_schedule(
         setattr(schedule, key, value)
         
     db.commit()
+    feeding_analytics.refresh_today(db)
     db.refresh(schedule)
     return schedule
 
@@ -244,6 +276,7 @@ def delete_schedule(
         raise HTTPException(status_code=404, detail="Schedule not found")
     db.delete(schedule)
     db.commit()
+    feeding_analytics.refresh_today(db)
     return {"detail": "Schedule deleted"}
 
 # ==============================================================================
@@ -315,12 +348,16 @@ def get_enclosure_maintenance_logs(
 # ==============================================================================
 
 @router.get("/alerts/", response_model=List[AlertResponse])
-def get_active_alerts(
-    db: Session = Depends(get_db), 
+async def get_active_alerts(
+    expand_incidents: bool = False,
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user)
 ):
-    """Активні тривоги"""
-    return db.query(Alert).filter(Alert.status == "New").order_by(desc(Alert.timestamp)).all()
+    """Активні тривоги (алерти загального інциденту згорнуті в нього)"""
+    query = select(Alert).where(Alert.status == "New")
+    if not expand_incidents:
+        query = query.where(Alert.incident_id.is_(None))
+    return (await db.scalars(query.order_by(desc(Alert.timestamp)))).all()
 
 @router.put("/alerts/{alert_id}/resolve")
 def resolve_alert(
@@ -338,30 +375,57 @@ def resolve_alert(
     return {"detail": "Alert resolved"}
 
 @router.get("/alerts/history", response_model=List[AlertResponse])
-def get_alerts_history(
+async def get_alerts_history(
     enclosure_id: Optional[int] = None,
     limit: int = 50,
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_user)
 ):
     """[NEW] Архів тривог (фільтр за вольєром)"""
-    query = db.query(Alert)
+    query = select(Alert)
     if enclosure_id:
-        query = query.filter(Alert.enclosure_id == enclosure_id)
+        query = query.where(Alert.enclosure_id == enclosure_id)
     
-    return query.order_by(desc(Alert.timestamp)).limit(limit).all()
+    return (await db.scalars(query.order_by(desc(Alert.timestamp)).limit(limit))).all()
 
 # ==============================================================================
 # 7. IOT & TELEMETRY
 # ==============================================================================
 
+# Стан правил (alert_state, actuator_tracker) захищено threading-замками: між корутинами,
+# що чергуються на await усередині run_sync, вони не діють (той самий потік) - тож оцінку
+# показів на event loop виконуємо по одній
+_rules_lock = asyncio.Lock()
+
+def _process_reading(db: Session, device, reading, data: TelemetryData):
+    """Стан механізмів + правила алертів (спільні з mqtt_worker, sync-код) -> [повідомлення]"""
+    states = actuator_events.read_states({"heater": data.heater, "fan": data.fan, "status": data.status})
+    if states:
+        actuator_events.actuator_tracker.record(
+            db, device.device_id, device.enclosure_id, states, reading.timestamp
+        )
+
+    alerts_triggered = []
+    if device.enclosure_id:
+        violations = evaluate_reading(
+            db, device.enclosure_id,
+            temperature=data.temperature, humidity=data.humidity, light=data.light,
+            now=reading.timestamp
+        )
+        channels = measured_channels(data.temperature, data.humidity, data.light)
+        for alert in record_violations(db, device.enclosure_id, violations, channels):
+            alerts_triggered.append(alert.message)
+    return alerts_triggered
+
 @router.post("/telemetry/", status_code=status.HTTP_201_CREATED)
-def receive_telemetry(data: TelemetryData, db: Session = Depends(get_db)):
+async def receive_telemetry(data: TelemetryData, db: AsyncSession = Depends(get_async_db)):
     """
     Основна точка входу для даних з датчиків.
     """
     # 1. Валідація
-    device = db.query(IoTDevice).filter(IoTDevice.mac_address == data.mac_address).first()
+    device = (await db.scalars(
+        select(IoTDevice).where(IoTDevice.mac_address == data.mac_address).limit(1)
+    )).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device unknown")
 
@@ -379,117 +443,186 @@ def receive_telemetry(data: TelemetryData, db: Session = Depends(get_db)):
     )
     db.add(reading)
 
-    # 3. Аналіз на алерти (спрощено)
-    alerts_triggered = []
-    if device.enclosure_id:
-        animal = db.query(Animal).filter(Animal.enclosure_id == device.enclosure_id).first()
-        if animal:
-            profile = db.query(ClimateProfile).filter(ClimateProfile.species_id == animal.species_id).first()
-            if profile:
-                alert_msg = None
-                if data.temperature > profile.max_temperature:
-                    alert_msg = f"TEMP HIGH: {data.temperature}°C"
-                elif data.temperature < profile.min_temperature:
-                    alert_msg = f"TEMP LOW: {data.temperature}°C"
-                
-                if alert_msg:
-                    # Перевірка дублікатів (Anti-spam)
-                    existing = db.query(Alert).filter(
-                        Alert.enclosure_id == device.enclosure_id, 
-                        Alert.status == "New", 
-                        Alert.alert_type == "Climate"
-                    ).first()
-                    
-                    if not existing:
-                        new_alert = Alert(
-                            enclosure_id=device.enclosure_id,
-                            alert_type="Climate",
-                            message=alert_msg,
-                            status="New",
-                            timestamp=datetime.datetime.utcnow()
-                        )
-                        db.add(new_alert)
-                        alerts_triggered.append(alert_msg)
-
-    db.commit()
+    # 3. Механізми та алерти - sync-код у тій самій транзакції (run_sync: запити теж async).
+    # Commit - під замком: наступний показ бачить алерти/інцидент, відкриті цим
+    async with _rules_lock:
+        alerts_triggered = await db.run_sync(_process_reading, device, reading, data)
+        await db.commit()
     return {"status": "processed", "alerts": alerts_triggered}
 
-@router.get("/config/{mac_address}", response_model=SyncConfigResponse)
-def sync_device_config(mac_address: str, db: Session = Depends(get_db)):
-    """IoT пристрій запитує налаштування"""
+@router.get("/config/{mac_address}", response_model=SyncConfigResponse,
+            responses={304: {"description": "Config unchanged (version matches)"}})
+def sync_device_config(mac_address: str, version: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    IoT пристрій запитує налаштування. ?version= - версія з кешу контролера:
+    якщо не змінилась, відповідь 304 без тіла.
+    """
     device = db.query(IoTDevice).filter(IoTDevice.mac_address == mac_address).first()
     if not device or not device.enclosure_id:
         raise HTTPException(status_code=404, detail="Device not ready")
-    
-    config = {
-        "target_temperature_min": 20.0,
-        "target_temperature_max": 25.0,
-        "feeding_schedule": []
-    }
-    
-    animal = db.query(Animal).filter(Animal.enclosure_id == device.enclosure_id).first()
-    if animal:
-        profile = db.query(ClimateProfile).filter(ClimateProfile.species_id == animal.species_id).first()
-        if profile:
-            config["target_temperature_min"] = profile.min_temperature
-            config["target_temperature_max"] = profile.max_temperature
-            
-    schedules = db.query(FeedingSchedule).filter(FeedingSchedule.enclosure_id == device.enclosure_id).all()
-    for s in schedules:
-        config["feeding_schedule"].append({
-            "time": s.feed_time.strftime("%H:%M"),
-            "portion": s.portion_size,
-            "food_type": s.food_type
-        })
-        
+
+    config = build_device_config(db, device)
+    if version and version == config["version"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED)
     return config
 
 @router.get("/telemetry/enclosure/{enclosure_id}/latest", response_model=Optional[SensorReadingResponse])
-def get_latest_telemetry(enclosure_id: int, db: Session = Depends(get_db)):
+async def get_latest_telemetry(enclosure_id: int, db: AsyncSession = Depends(get_async_db)):
     """Поточні показники (Join через IoTDevice)"""
-    reading = db.query(SensorReading)\
-        .join(IoTDevice, SensorReading.device_id == IoTDevice.device_id)\
-        .filter(IoTDevice.enclosure_id == enclosure_id)\
-        .order_by(desc(SensorReading.timestamp))\
-        .first()
+    reading = (await db.scalars(
+        select(SensorReading)
+        .join(IoTDevice, SensorReading.device_id == IoTDevice.device_id)
+        .where(IoTDevice.enclosure_id == enclosure_id)
+        .order_by(desc(SensorReading.timestamp))
+        .limit(1)
+    )).first()
     return reading
 
 @router.get("/telemetry/history/{enclosure_id}", response_model=List[SensorReadingResponse])
-def get_telemetry_history(
+async def get_telemetry_history(
     enclosure_id: int, 
     start: Optional[datetime.datetime] = None,
     end: Optional[datetime.datetime] = None,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """[NEW] Історія для графіків"""
-    query = db.query(SensorReading)\
+    query = select(SensorReading)\
         .join(IoTDevice, SensorReading.device_id == IoTDevice.device_id)\
-        .filter(IoTDevice.enclosure_id == enclosure_id)
+        .where(IoTDevice.enclosure_id == enclosure_id)
         
     if start:
-        query = query.filter(SensorReading.timestamp >= start)
+        query = query.where(SensorReading.timestamp >= start)
     if end:
-        query = query.filter(SensorReading.timestamp <= end)
+        query = query.where(SensorReading.timestamp <= end)
         
-    return query.order_by(desc(SensorReading.timestamp)).limit(limit).all()
+    return (await db.scalars(query.order_by(desc(SensorReading.timestamp)).limit(limit))).all()
+
+@router.get("/telemetry/export")
+def export_telemetry(
+    enclosure_ids: List[int] = Query(default=[]),
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    format: str = "csv",
+    chunk_size: int = Query(default=DEFAULT_CHUNK_SIZE, ge=1, le=MAX_CHUNK_SIZE),
+    user: User = Depends(require_role(["zoologist", "admin"]))
+):
+    """[NEW] Потокове вивантаження історії (CSV / Arrow / Parquet) для аналітики"""
+    if format not in available_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format '{format}'. Available: {available_formats()}"
+        )
+
+    def body():
+        # Власна сесія: відповідь стрімиться довше, ніж живе залежність get_db
+        db = SessionLocal()
+        try:
+            yield from stream_export(db, enclosure_ids, start, end, format, chunk_size)
+        finally:
+            db.close()
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"sensor_history.{extension}"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # ==============================================================================
 # 8. АНАЛІТИКА (Reports)
 # ==============================================================================
 
 @router.get("/reports/feeding-consumption")
-def report_consumption(db: Session = Depends(get_db), user: User = Depends(require_role(["zoologist", "admin"]))):
-    total_meat = db.query(func.sum(FeedingSchedule.portion_size))\
-        .filter(FeedingSchedule.food_type == "М'ясо").scalar()
-    return {"total_meat_daily_kg": total_meat or 0}
+def report_consumption(
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_role(["zoologist", "admin"]))
+):
+    """Витрата корму за всіма типами: план (з days_of_week) і факт (події годування). За замовчуванням - 7 днів"""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must be <= end")
+    return feeding_analytics.consumption_report(db, start, end)
+
+@router.get("/reports/feeding-compliance")
+def report_feeding_compliance(
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    enclosure_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_role(["zoologist", "admin"]))
+):
+    """Заплановані vs виконані годування по вольєрах і типах корму (з денних агрегатів)"""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must be <= end")
+    return feeding_analytics.compliance_report(db, start, end, enclosure_id)
+
+def _report_window(start, end, max_days=366):
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be < end")
+    if start and (end or datetime.datetime.utcnow()) - start > datetime.timedelta(days=max_days):
+        raise HTTPException(status_code=400, detail=f"Window is limited to {max_days} days")
+
+@router.get("/reports/climate")
+def report_climate(
+    enclosure_id: Optional[List[int]] = Query(None, description="Кілька ?enclosure_id=; без параметра - всі"),
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    percentiles: List[float] = Query(list(climate_analytics.DEFAULT_PERCENTILES)),
+    db: Session = Depends(get_db),
+    user: User = Depends(require_role(["zoologist", "admin"]))
+):
+    """
+    Кліматичний звіт для багатьох вольєрів одним запитом: перцентилі, хвилини поза нормою,
+    градусо-години відхилення. За замовчуванням - останні 24 год.
+    """
+    _report_window(start, end)
+    if any(p < 0 or p > 100 for p in percentiles):
+        raise HTTPException(status_code=400, detail="Percentiles must be within 0..100")
+    return climate_analytics.climate_report(db, enclosure_id, start, end, tuple(percentiles))
+
+@router.get("/reports/actuators")
+def report_actuators(
+    enclosure_id: Optional[List[int]] = Query(None, description="Кілька ?enclosure_id=; без параметра - всі"),
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_role(["zoologist", "admin"]))
+):
+    """
+    Робота обігрівачів і вентиляторів: час увімкнення, цикли (у т.ч. короткі),
+    найдовша безперервна робота, оцінка енергії. За замовчуванням - останні 24 год.
+    """
+    _report_window(start, end)
+    return actuator_events.actuator_report(db, enclosure_id, start, end)
+
+@router.get("/enclosures/{enclosure_id}/actuators")
+def enclosure_actuators(
+    enclosure_id: int,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_role(["zoologist", "admin"]))
+):
+    """Підсумок по механізмах вольєра + серії станів (переходи) за вікно"""
+    _report_window(start, end, max_days=31)
+    end = end or datetime.datetime.utcnow()
+    start = start or end - datetime.timedelta(hours=24)
+    stats = actuator_events.actuator_stats(db, [enclosure_id], start, end)
+    return {
+        "enclosure_id": enclosure_id,
+        "start": start,
+        "end": end,
+        "summary": stats.get(enclosure_id),
+        "transitions": actuator_events.transitions(db, enclosure_id, start, end),
+    }
 
 @router.get("/reports/temperature-avg/{enclosure_id}")
 def report_avg_temp(enclosure_id: int, db: Session = Depends(get_db)):
-    one_day_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=24)
-    # Join потрібен, бо в reading немає enclosure_id
-    avg = db.query(func.avg(SensorReading.temperature_val))\
-        .join(IoTDevice, SensorReading.device_id == IoTDevice.device_id)\
-        .filter(IoTDevice.enclosure_id == enclosure_id)\
-        .filter(SensorReading.timestamp >= one_day_ago).scalar()
-    return {"enclosure_id": enclosure_id, "avg_temp_24h": avg or 0}
\ No newline at end of file
+    end = datetime.datetime.utcnow()
+    # Зважене за часом (LOCF): показання надходять нерівномірно (report-by-exception)
+    arrays = climate_analytics.load_readings(db, [enclosure_id], end - datetime.timedelta(hours=24), end)
+    stats = climate_analytics.analyze(arrays, {}).get(enclosure_id) or {}
+    return {"enclosure_id": enclosure_id, "avg_temp_24h": stats.get("mean_temperature") or 0}
\ No newline at end of file
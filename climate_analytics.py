@@ -0,0 +1,265 @@
+"""
+Векторизована аналітика клімату для багатьох вольєрів за довільне вікно.
+
+Показання всіх вибраних вольєрів витягуються ОДНИМ запитом (відсортовані за
+вольєром і часом) у масиви NumPy, далі всі метрики рахуються групово
+(np.add.reduceat по межах вольєрів) без циклу по вольєрах:
+
+  * перцентилі температури
+  * хвилини поза нормою (межі - ефективні норми climate_resolver)
+  * градусо-години відхилення (інтеграл |відхилення| * час)
+  * середні температура / вологість
+  * частка часу роботи обігрівача / вентилятора (з actuator_event)
+
+Кожен показ "важить" час до наступного показу того ж вольєра, але не більше
+MAX_GAP_SECONDS (розриви зв'язку не рахуються як час поза нормою). Середні та
+перцентилі теж зважені за часом: контролер звітує за винятком (ІоТ/reporting.py),
+тож показ чинний до наступного (LOCF), а часті звіти під час змін не зсувають
+статистику в бік перехідних значень.
+
+    python climate_analytics.py --days 30
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+
+from models import SensorReading, IoTDevice
+from climate_resolver import load_all_effective
+from actuator_events import actuator_stats
+
+MAX_GAP_SECONDS = 600            # Довший розрив - вважаємо пропуском даних
+DEFAULT_PERCENTILES = (5.0, 50.0, 95.0)
+
+
+class ReadingArrays:
+    """Стовпці показань, відсортовані за (enclosure_id, ts)"""
+    __slots__ = ("enclosure_id", "ts", "temperature", "humidity")
+
+    def __init__(self, enclosure_id, ts, temperature, humidity):
+        self.enclosure_id = enclosure_id
+        self.ts = ts
+        self.temperature = temperature
+        self.humidity = humidity
+
+    def __len__(self):
+        return len(self.ts)
+
+
+def load_readings(db, enclosure_ids: Optional[Sequence[int]], start: datetime, end: datetime) -> ReadingArrays:
+    """Один запит на всі вольєри -> ReadingArrays"""
+    stmt = select(
+        IoTDevice.enclosure_id,
+        func.extract("epoch", SensorReading.timestamp),
+        SensorReading.temperature_val,
+        SensorReading.humidity_val,
+    ).join(IoTDevice, SensorReading.device_id == IoTDevice.device_id)\
+     .where(SensorReading.timestamp >= start, SensorReading.timestamp < end,
+            IoTDevice.enclosure_id.isnot(None))
+    if enclosure_ids:
+        stmt = stmt.where(IoTDevice.enclosure_id.in_(list(enclosure_ids)))
+    stmt = stmt.order_by(IoTDevice.enclosure_id, SensorReading.timestamp)
+
+    rows = db.execute(stmt).all()
+    if not rows:
+        return ReadingArrays(np.empty(0, np.int64), np.empty(0), np.empty(0), np.empty(0))
+    # Транспонування рядків у стовпці; None -> NaN при dtype float64
+    enclosure_id, ts, temperature, humidity = zip(*rows)
+    return ReadingArrays(
+        np.array(enclosure_id, dtype=np.int64),
+        np.array(ts, dtype=np.float64),
+        np.array(temperature, dtype=np.float64),
+        np.array(humidity, dtype=np.float64),
+    )
+
+
+def grouped_percentiles(starts, counts, values, percentiles):
+    """
+    Перцентилі (лінійна інтерполяція, як np.percentile) для кожної групи.
+    values вже відсортовані всередині груп; NaN - в кінці групи і не рахуються.
+    """
+    q = np.asarray(percentiles, dtype=np.float64) / 100.0
+    out = np.full((len(starts), len(q)), np.nan)
+    has = counts > 0
+    if not has.any():
+        return out
+    pos = (counts[has, None] - 1) * q[None, :]          # позиція в межах групи
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, counts[has, None] - 1)
+    frac = pos - lo
+    base = starts[has, None]
+    out[has] = values[base + lo] * (1 - frac) + values[base + hi] * frac
+    return out
+
+
+def weighted_mean(values, weights, valid, starts, counts, total_weight):
+    """Середнє, зважене за часом; групи без ваги (один показ) - просте середнє"""
+    plain = np.add.reduceat(np.where(valid, values, 0.0), starts) / np.maximum(counts, 1)
+    weighted = np.add.reduceat(values * weights, starts) / np.where(total_weight > 0, total_weight, 1.0)
+    return np.where(total_weight > 0, weighted, plain)
+
+
+def grouped_weighted_percentiles(starts, counts, values, weights, percentiles):
+    """
+    Перцентилі, зважені за часом (значення, нижче якого вольєр провів q часу).
+    values/weights відсортовані за значенням всередині груп; групи без ваги
+    (один показ) - звичайні перцентилі.
+    """
+    q = np.asarray(percentiles, dtype=np.float64) / 100.0
+    out = grouped_percentiles(starts, counts, values, percentiles)
+    cw = np.cumsum(weights)
+    offset = np.concatenate(([0.0], cw))[starts]
+    total = np.add.reduceat(weights, starts) if len(weights) else np.zeros(len(starts))
+    has = (counts > 0) & (total > 0)
+    if not has.any():
+        return out
+    target = offset[has, None] + q[None, :] * total[has, None]
+    idx = np.searchsorted(cw, target, side="left")
+    first = starts[has, None]
+    idx = np.clip(idx, first, first + counts[has, None] - 1)
+    out[has] = values[idx]
+    return out
+
+
+def analyze(arrays: ReadingArrays, limits: dict, percentiles=DEFAULT_PERCENTILES, max_gap=MAX_GAP_SECONDS):
+    """
+    limits - {enclosure_id: (t_min, t_max)} (None - межа відсутня).
+    Повертає {enclosure_id: dict метрик}.
+    """
+    n = len(arrays)
+    if n == 0:
+        return {}
+    enc = arrays.enclosure_id
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(enc)) + 1))
+    enclosures = enc[starts]
+    sizes = np.diff(np.append(starts, n))
+
+    # Вага показу = час до наступного в тому ж вольєрі (обрізаний max_gap)
+    dt = np.empty(n)
+    dt[:-1] = np.diff(arrays.ts)
+    dt[-1] = 0.0
+    dt[starts[1:] - 1] = 0.0                              # остання точка групи
+    weight = np.clip(dt, 0.0, max_gap)
+
+    temp = arrays.temperature
+    valid = ~np.isnan(temp)
+    weight_t = np.where(valid, weight, 0.0)
+    temp0 = np.where(valid, temp, 0.0)
+
+    # Межі норм: по вольєру -> на кожен показ
+    t_min = np.array([(limits.get(int(e)) or (None, None))[0] for e in enclosures], dtype=np.float64)
+    t_max = np.array([(limits.get(int(e)) or (None, None))[1] for e in enclosures], dtype=np.float64)
+    lo = np.repeat(np.nan_to_num(t_min, nan=-np.inf), sizes)
+    hi = np.repeat(np.nan_to_num(t_max, nan=np.inf), sizes)
+
+    deviation = np.where(valid, np.maximum(lo - temp0, 0.0) + np.maximum(temp0 - hi, 0.0), 0.0)
+    out_of_range = deviation > 0
+
+    covered = np.add.reduceat(weight_t, starts)
+    minutes_out = np.add.reduceat(np.where(out_of_range, weight_t, 0.0), starts) / 60.0
+    minutes_above = np.add.reduceat(np.where(temp0 > hi, weight_t, 0.0), starts) / 60.0
+    degree_hours = np.add.reduceat(deviation * weight_t, starts) / 3600.0
+    count_t = np.add.reduceat(valid.astype(np.int64), starts)
+    mean_t = weighted_mean(temp0, weight_t, valid, starts, count_t, covered)
+
+    hum = arrays.humidity
+    hum_valid = ~np.isnan(hum)
+    count_h = np.add.reduceat(hum_valid.astype(np.int64), starts)
+    weight_h = np.where(hum_valid, weight, 0.0)
+    mean_h = weighted_mean(np.where(hum_valid, hum, 0.0), weight_h, hum_valid, starts, count_h,
+                           np.add.reduceat(weight_h, starts))
+
+    # Перцентилі: сортування всередині груп (NaN -> +inf -> у кінець групи)
+    order = np.lexsort((np.where(valid, temp, np.inf), enc))
+    pct = grouped_weighted_percentiles(starts, count_t, temp[order], weight_t[order], percentiles)
+
+    result = {}
+    for i, enclosure_id in enumerate(enclosures.tolist()):
+        has_t = count_t[i] > 0
+        result[enclosure_id] = {
+            "enclosure_id": enclosure_id,
+            "readings": int(sizes[i]),
+            "covered_minutes": round(float(covered[i]) / 60.0, 1),
+            "t_min": None if np.isnan(t_min[i]) else float(t_min[i]),
+            "t_max": None if np.isnan(t_max[i]) else float(t_max[i]),
+            "mean_temperature": round(float(mean_t[i]), 2) if has_t else None,
+            "mean_humidity": round(float(mean_h[i]), 2) if count_h[i] else None,
+            "temperature_percentiles": {
+                f"p{p:g}": (round(float(v), 2) if has_t else None) for p, v in zip(percentiles, pct[i])
+            },
+            "minutes_out_of_range": round(float(minutes_out[i]), 1),
+            "minutes_above_max": round(float(minutes_above[i]), 1),
+            "minutes_below_min": round(float(minutes_out[i] - minutes_above[i]), 1),
+            "degree_hours": round(float(degree_hours[i]), 2),
+            "out_of_range_pct": round(100.0 * float(minutes_out[i]) * 60.0 / float(covered[i]), 1)
+            if covered[i] else None,
+            # Заповнюється в climate_report з actuator_event
+            "heater_duty_pct": None,
+            "fan_duty_pct": None,
+        }
+    return result
+
+
+def climate_limits(db, enclosure_ids=None):
+    """{enclosure_id: (t_min, t_max)} з матеріалізованих ефективних норм"""
+    return {
+        row.enclosure_id: (row.min_temperature, row.max_temperature)
+        for row in load_all_effective(db)
+        if not enclosure_ids or row.enclosure_id in enclosure_ids
+    }
+
+
+def climate_report(db, enclosure_ids=None, start=None, end=None, percentiles=DEFAULT_PERCENTILES):
+    """Звіт по вольєрах за [start, end) (за замовчуванням - останні 24 год)"""
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(hours=24)
+    enclosure_ids = set(enclosure_ids or ())
+
+    started = time.perf_counter()
+    arrays = load_readings(db, enclosure_ids, start, end)
+    loaded = time.perf_counter()
+    stats = analyze(arrays, climate_limits(db, enclosure_ids), percentiles)
+    for enclosure_id, actuators in actuator_stats(db, enclosure_ids, start, end).items():
+        if enclosure_id in stats:
+            stats[enclosure_id]["heater_duty_pct"] = actuators["heater"]["duty_pct"]
+            stats[enclosure_id]["fan_duty_pct"] = actuators["fan"]["duty_pct"]
+    computed = time.perf_counter()
+
+    return {
+        "start": start,
+        "end": end,
+        "readings": len(arrays),
+        "timing_ms": {
+            "load": round((loaded - started) * 1000, 1),
+            "compute": round((computed - loaded) * 1000, 1),
+        },
+        "enclosures": [stats[e] for e in sorted(stats)],
+    }
+
+
+def main(argv=None):
+    from dependencies import SessionLocal
+
+    parser = argparse.ArgumentParser(description="ZooSmartCare climate report")
+    parser.add_argument("--days", type=float, default=1.0)
+    parser.add_argument("--enclosure", type=int, action="append", default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        end = datetime.utcnow()
+        report = climate_report(db, args.enclosure, end - timedelta(days=args.days), end)
+    finally:
+        db.close()
+    print(f"📊 {report['readings']:,} readings, {len(report['enclosures'])} enclosures, "
+          f"load {report['timing_ms']['load']} ms, compute {report['timing_ms']['compute']} ms")
+    for item in report["enclosures"][:20]:
+        print(f"   #{item['enclosure_id']}: mean {item['mean_temperature']}°C, "
+              f"out of range {item['minutes_out_of_range']} min, {item['degree_hours']} °C·h")
+
+
+if __name__ == "__main__":
+    main()
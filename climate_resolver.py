@@ -0,0 +1,225 @@
+"""
+Ефективні кліматичні норми вольєра з урахуванням сезону та ВСІХ видів у ньому.
+
+Для кожного виду у вольєрі вибирається профіль поточного сезону (або "All"),
+потім діапазони перетинаються: t_min = max(min), t_max = min(max),
+min_humidity = max(...), світловий період - перетин вікон.
+Якщо перетин порожній - береться найсуворіший (найвужчий) профіль, а рядок
+позначається has_conflict=True.
+
+Результат матеріалізовано в таблиці enclosure_climate. Він перераховується
+тільки при зміні тварин/профілів (явні виклики з ендпоінтів) або сезону
+(ліниво, при першому читанні в новому сезоні). Гарячі шляхи
+(sync_device_config, правила алертів) читають один готовий рядок.
+"""
+from datetime import datetime
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from models import Animal, ClimateProfile, Enclosure, EnclosureClimate, SeasonEnum
+
+# Підписники на перерахунок (напр. кеш правил алертів)
+_listeners = []
+_PENDING_KEY = "climate_recomputed"
+
+
+def on_recompute(callback):
+    """Реєструє callback() після commit (або rollback) сесії з перерахунком"""
+    _listeners.append(callback)
+    return callback
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _notify_listeners(session):
+    # Після rollback теж: кеш міг скомпілюватись із незакомічених норм цієї сесії
+    if session.info.pop(_PENDING_KEY, False):
+        for callback in _listeners:
+            callback()
+
+
+def current_season(now=None) -> str:
+    """Сезон за місяцем (північна півкуля) у форматі SeasonEnum"""
+    month = (now or datetime.now()).month
+    if month in (12, 1, 2):
+        return SeasonEnum.winter.value
+    if month in (3, 4, 5):
+        return SeasonEnum.spring.value
+    if month in (6, 7, 8):
+        return SeasonEnum.summer.value
+    return SeasonEnum.autumn.value
+
+
+def pick_seasonal_profile(profiles, season):
+    """Профіль поточного сезону -> "All" -> будь-який"""
+    by_season = {}
+    for profile in profiles:
+        by_season.setdefault((profile.season or "").lower(), profile)
+    return (by_season.get(season.lower())
+            or by_season.get(SeasonEnum.all_seasons.value.lower())
+            or (profiles[0] if profiles else None))
+
+
+def parse_lighting_schedule(value):
+    """'08:00-20:00' -> (480, 1200) хвилин доби; None якщо формат інший"""
+    if not value or "-" not in value:
+        return None
+    try:
+        start, end = value.split("-", 1)
+        h1, m1 = start.strip().split(":")
+        h2, m2 = end.strip().split(":")
+        return int(h1) * 60 + int(m1), int(h2) * 60 + int(m2)
+    except ValueError:
+        return None
+
+
+def _format_window(start, end):
+    return f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+
+def _max_defined(values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+def _min_defined(values):
+    values = [v for v in values if v is not None]
+    return min(values) if values else None
+
+
+def combine_profiles(profiles):
+    """
+    Поєднує профілі різних видів. Повертає dict з полями EnclosureClimate
+    (без enclosure_id/season).
+    """
+    if not profiles:
+        return {"min_temperature": None, "max_temperature": None, "min_humidity": None,
+                "lighting_schedule": None, "profile_ids": "", "has_conflict": False}
+
+    t_min = _max_defined(p.min_temperature for p in profiles)
+    t_max = _min_defined(p.max_temperature for p in profiles)
+    conflict = t_min is not None and t_max is not None and t_min > t_max
+
+    if conflict:
+        # Найсуворіший профіль = найвужчий температурний діапазон
+        def width(p):
+            if p.min_temperature is None or p.max_temperature is None:
+                return float("inf")
+            return p.max_temperature - p.min_temperature
+        strictest = min(profiles, key=width)
+        t_min, t_max = strictest.min_temperature, strictest.max_temperature
+
+    # Світловий період: перетин вікон, якщо всі у форматі HH:MM-HH:MM
+    windows = [parse_lighting_schedule(p.lighting_schedule) for p in profiles if p.lighting_schedule]
+    lighting = next((p.lighting_schedule for p in profiles if p.lighting_schedule), None)
+    if windows and all(w is not None and w[0] <= w[1] for w in windows):
+        start, end = max(w[0] for w in windows), min(w[1] for w in windows)
+        if start < end:
+            lighting = _format_window(start, end)
+
+    return {
+        "min_temperature": t_min,
+        "max_temperature": t_max,
+        "min_humidity": _max_defined(p.min_humidity for p in profiles),
+        "lighting_schedule": lighting,
+        "profile_ids": ",".join(str(p.profile_id) for p in profiles),
+        "has_conflict": conflict,
+    }
+
+
+def _resolve(db, enclosure_ids, season):
+    """{enclosure_id: dict норм} для заданих вольєрів (None = всі) двома запитами"""
+    query = db.query(Animal.enclosure_id, Animal.species_id).filter(Animal.enclosure_id.isnot(None))
+    if enclosure_ids is not None:
+        query = query.filter(Animal.enclosure_id.in_(enclosure_ids))
+
+    species_by_enclosure = {}
+    for enclosure_id, species_id in query.distinct().all():
+        if species_id is not None:
+            species_by_enclosure.setdefault(enclosure_id, set()).add(species_id)
+
+    all_species = set().union(*species_by_enclosure.values()) if species_by_enclosure else set()
+    profiles_by_species = {}
+    if all_species:
+        for profile in db.query(ClimateProfile)\
+                .filter(ClimateProfile.species_id.in_(all_species))\
+                .order_by(ClimateProfile.profile_id).all():
+            profiles_by_species.setdefault(profile.species_id, []).append(profile)
+
+    resolved = {}
+    for enclosure_id, species_ids in species_by_enclosure.items():
+        chosen = [pick_seasonal_profile(profiles_by_species.get(s, []), season) for s in sorted(species_ids)]
+        resolved[enclosure_id] = combine_profiles([p for p in chosen if p is not None])
+    return resolved
+
+
+def recompute(db, enclosure_ids=None, now=None):
+    """
+    Перераховує і зберігає enclosure_climate для вказаних вольєрів (None = всі).
+    Лише flush - commit робить викликач. Повертає кількість оновлених рядків.
+    """
+    season = current_season(now)
+    if enclosure_ids is not None:
+        enclosure_ids = sorted({e for e in enclosure_ids if e is not None})
+        if not enclosure_ids:
+            return 0
+        targets = enclosure_ids
+    else:
+        targets = [row[0] for row in db.query(Enclosure.enclosure_id).all()]
+
+    resolved = _resolve(db, enclosure_ids, season)
+    existing = {
+        row.enclosure_id: row for row in
+        db.query(EnclosureClimate).filter(EnclosureClimate.enclosure_id.in_(targets)).all()
+    }
+
+    computed_at = datetime.utcnow()
+    for enclosure_id in targets:
+        values = resolved.get(enclosure_id) or combine_profiles([])
+        row = existing.get(enclosure_id)
+        if row is None:
+            row = EnclosureClimate(enclosure_id=enclosure_id)
+            db.add(row)
+        row.season = season
+        row.computed_at = computed_at
+        for key, value in values.items():
+            setattr(row, key, value)
+
+    # Гарячі шляхи (правила алертів у батчі інжесту) викликають це всередині чужої транзакції
+    db.flush()
+    db.info[_PENDING_KEY] = True
+    return len(targets)
+
+
+def ensure_current_season(db, now=None):
+    """Якщо матеріалізовані норми з минулого сезону - перераховує все"""
+    season = current_season(now)
+    stale = db.query(EnclosureClimate.enclosure_id)\
+        .filter(EnclosureClimate.season != season).first()
+    if stale is not None:
+        print(f"🍂 [CLIMATE] Season changed to {season}, recomputing effective profiles...")
+        recompute(db, now=now)
+
+
+def get_effective_climate(db, enclosure_id, now=None):
+    """Гарячий шлях: один рядок enclosure_climate (обчислюється за потреби)"""
+    row = db.query(EnclosureClimate).filter(EnclosureClimate.enclosure_id == enclosure_id).first()
+    if row is None or row.season != current_season(now):
+        if row is not None:
+            ensure_current_season(db, now)
+        else:
+            recompute(db, [enclosure_id], now)
+        row = db.query(EnclosureClimate).filter(EnclosureClimate.enclosure_id == enclosure_id).first()
+    return row
+
+
+def load_all_effective(db, now=None):
+    """Всі матеріалізовані норми (для компіляції правил алертів)"""
+    ensure_current_season(db, now)
+    rows = db.query(EnclosureClimate).all()
+    # Вольєри, створені в обхід API (імпорт, генератор даних), ще не пораховані
+    if len(rows) < db.query(func.count(Enclosure.enclosure_id)).scalar():
+        recompute(db, now=now)
+        rows = db.query(EnclosureClimate).all()
+    return rows
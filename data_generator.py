@@ -0,0 +1,308 @@
+"""
+Генератор синтетичної телеметрії для N вольєрів + масове завантаження в БД.
+
+Фізика та регулятор - ті самі, що в симуляторі контролера (ІоТ/dht.py та
+LogicController.process_climate), але векторизовані NumPy по всіх вольєрах:
+один крок часу = кілька операцій над масивами розміром N.
+
+Показання пишуться в sensor_reading через COPY FROM STDIN (PostgreSQL)
+порціями по одній добі, тож пам'ять не залежить від тривалості періоду.
+Для SQLite (бенчмарки) використовується звичайний bulk insert.
+
+Приклад:
+    python data_generator.py --enclosures 200 --days 90 --interval 60
+"""
+import argparse
+import io
+import time
+from datetime import datetime, timedelta, time as dtime
+
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from models import (
+    Base, Species, Enclosure, Animal, ClimateProfile, IoTDevice,
+    SensorReading, FeedingSchedule
+)
+from climate_resolver import recompute
+
+# --- ФІЗИКА (з ІоТ/dht.py) ---
+TICK_SECONDS = 5            # Крок, на який задані прирости в dht.py (SIM_STEP_SECONDS)
+AMBIENT_TEMP = 20.0         # Температура, до якої "повертається" вольєр
+HEATER_TEMP_STEP = 0.8
+HEATER_HUM_STEP = -0.2
+FAN_TEMP_STEP = -0.6
+DRIFT_STEP = 0.1
+TEMP_NOISE = 0.2            # Збурення повітря (накопичується)
+SENSOR_NOISE = 0.5          # Похибка датчика (лише в показі)
+HUM_NOISE = 0.5
+
+# --- РЕГУЛЯТОР (з core_business_logic.LogicController) ---
+FILTER_SIZE = 5
+HYSTERESIS = 0.5
+
+# Шаблони видів: (наукова назва, загальна назва, сезон, t_min, t_max, min_humidity)
+SPECIES_TEMPLATES = [
+    ("Panthera leo", "Лев", "All", 15.0, 28.0, 30.0),
+    ("Python regius", "Королівський пітон", "All", 26.0, 32.0, 50.0),
+    ("Ailurus fulgens", "Червона панда", "All", 10.0, 22.0, 40.0),
+    ("Chamaeleo calyptratus", "Єменський хамелеон", "All", 24.0, 30.0, 55.0),
+    ("Macropus rufus", "Рудий кенгуру", "All", 12.0, 30.0, 25.0),
+    ("Testudo hermanni", "Грецька черепаха", "All", 20.0, 27.0, 45.0),
+]
+
+
+def step_physics(temp, hum, heater, fan, rng, ambient=AMBIENT_TEMP, dt=TICK_SECONDS):
+    """Крок фізики dht.DHT22.measure() тривалістю dt секунд для всіх вольєрів одразу (in-place)"""
+    n = temp.shape[0]
+    k = dt / TICK_SECONDS
+    fan_only = fan & ~heater  # У dht.py: if heater ... elif fan
+
+    temp += np.where(heater, HEATER_TEMP_STEP * k, 0.0) + np.where(fan_only, FAN_TEMP_STEP * k, 0.0)
+    hum += np.where(heater, HEATER_HUM_STEP * k, 0.0)
+
+    # Повільне повернення до кімнатної температури (не перескакуючи її)
+    delta = temp - ambient
+    temp -= np.sign(delta) * np.minimum(DRIFT_STEP * k, np.abs(delta))
+
+    temp += rng.uniform(-TEMP_NOISE, TEMP_NOISE, n) * k ** 0.5
+    hum += rng.uniform(-HUM_NOISE, HUM_NOISE, n) * k ** 0.5
+    np.clip(hum, 0.0, 100.0, out=hum)
+
+
+def read_sensor(temp, rng):
+    """Показ DHT22.temperature(): справжня температура + похибка датчика, округлення до 0.1"""
+    return np.round(temp + rng.uniform(-SENSOR_NOISE, SENSOR_NOISE, temp.shape[0]), 1)
+
+
+def step_control(filtered, t_min, t_max, heater, fan, hyst=HYSTERESIS):
+    """Гістерезис з LogicController.process_climate для масивів (in-place)"""
+    heater |= filtered <= (t_min - hyst)
+    heater &= ~(filtered >= t_min)
+
+    cooling = filtered >= (t_max + hyst)
+    fan |= cooling
+    fan &= ~(filtered <= t_max)
+    heater &= ~cooling  # Не можна гріти і охолоджувати одночасно
+
+
+def light_level(seconds_of_day, rng):
+    """Освітленість (лк): синусоїда з 06:00 до 18:00 + шум"""
+    phase = (seconds_of_day / 3600.0 - 6.0) / 12.0 * np.pi
+    lux = np.clip(np.sin(phase), 0.0, None) * 800.0
+    return np.clip(lux + rng.normal(0.0, 5.0, lux.shape), 0.0, None)
+
+
+class FleetClimateModel:
+    """Стан фізики + регулятора для N вольєрів"""
+    def __init__(self, t_min, t_max, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.t_min = np.asarray(t_min, dtype=np.float64)
+        self.t_max = np.asarray(t_max, dtype=np.float64)
+        n = self.t_min.shape[0]
+
+        self.temp = np.full(n, AMBIENT_TEMP)
+        self.hum = self.rng.uniform(40.0, 60.0, n)
+        self.heater = np.zeros(n, dtype=bool)
+        self.fan = np.zeros(n, dtype=bool)
+
+        # Кільцевий буфер ковзного середнього (як temp_history у контролері)
+        self._window = np.tile(self.temp, (FILTER_SIZE, 1))
+        self._pos = 0
+        self.filtered = self.temp.copy()
+
+    def step(self):
+        step_physics(self.temp, self.hum, self.heater, self.fan, self.rng)
+        self._window[self._pos] = read_sensor(self.temp, self.rng)
+        self._pos = (self._pos + 1) % FILTER_SIZE
+        self.filtered = np.round(self._window.mean(axis=0), 2)
+        step_control(self.filtered, self.t_min, self.t_max, self.heater, self.fan)
+
+
+def generate_readings(model, start, days, interval):
+    """
+    Генерує показання порціями по добі.
+    Повертає (timestamps[k], temp[k, n], hum[k, n], light[k, n]) для кожної доби.
+    """
+    ticks_per_sample = max(1, int(interval // TICK_SECONDS))
+    samples_per_day = int(86400 // (ticks_per_sample * TICK_SECONDS))
+    n = model.temp.shape[0]
+    sample_seconds = ticks_per_sample * TICK_SECONDS
+
+    for day in range(days):
+        day_start = np.datetime64(start + timedelta(days=day), "s")
+        offsets = np.arange(samples_per_day, dtype=np.int64) * sample_seconds
+        timestamps = day_start + offsets.astype("timedelta64[s]")
+
+        temp = np.empty((samples_per_day, n))
+        hum = np.empty((samples_per_day, n))
+        for i in range(samples_per_day):
+            for _ in range(ticks_per_sample):
+                model.step()
+            temp[i] = model.filtered
+            hum[i] = np.round(model.hum, 1)
+
+        light = light_level(offsets[:, None].astype(np.float64) + np.zeros((1, n)), model.rng)
+        yield timestamps, temp, hum, np.round(light, 1)
+
+
+# ==============================================================================
+# ДОВІДКОВІ ДАНІ (вольєри, пристрої, тварини, профілі)
+# ==============================================================================
+
+def seed_reference_data(db, n_enclosures, prefix="SIM"):
+    """
+    Створює види + кліматичні профілі, N вольєрів з IoT-пристроєм, тваринами
+    та розкладом годування. Повертає [(device_id, t_min, t_max), ...].
+    """
+    species_rows = []
+    for sci, common, season, t_min, t_max, min_hum in SPECIES_TEMPLATES:
+        species = db.query(Species).filter(Species.scientific_name == sci).first()
+        if not species:
+            species = Species(scientific_name=sci, common_name=common, general_diet_info="Synthetic")
+            db.add(species)
+            db.flush()
+            db.add(ClimateProfile(
+                species_id=species.species_id, season=season,
+                min_temperature=t_min, max_temperature=t_max,
+                min_humidity=min_hum, lighting_schedule="06:00-18:00"
+            ))
+        species_rows.append((species, t_min, t_max))
+
+    result = []
+    for i in range(n_enclosures):
+        species, t_min, t_max = species_rows[i % len(species_rows)]
+        enclosure = Enclosure(
+            name=f"{prefix} Enclosure {i + 1}",
+            qr_code_string=f"zoo://enclosure/{prefix.lower()}-{i + 1}",
+            geo_location=f"Sector {i // 50 + 1}"
+        )
+        db.add(enclosure)
+        db.flush()
+
+        device = IoTDevice(
+            enclosure_id=enclosure.enclosure_id,
+            mac_address=f"{prefix[:2]}:{(i >> 16) & 0xFF:02X}:{(i >> 8) & 0xFF:02X}:{i & 0xFF:02X}:00:01",
+            firmware_version="1.0.0",
+            status="Online",
+            last_sync=datetime.utcnow()
+        )
+        db.add(device)
+        db.add_all([
+            Animal(enclosure_id=enclosure.enclosure_id, species_id=species.species_id,
+                   nickname=f"{species.common_name} {i + 1}-{k + 1}")
+            for k in range(2)
+        ])
+        db.add_all([
+            FeedingSchedule(enclosure_id=enclosure.enclosure_id, feed_time=dtime(hour, 0),
+                            portion_size=1.5, food_type="М'ясо", days_of_week="Mon,Tue,Wed,Thu,Fri,Sat,Sun")
+            for hour in (9, 17)
+        ])
+        db.flush()
+        result.append((device.device_id, t_min, t_max))
+
+    db.commit()
+    return result
+
+
+# ==============================================================================
+# ЗАВАНТАЖЕННЯ
+# ==============================================================================
+
+COPY_SQL = (
+    "COPY sensor_reading (device_id, timestamp, temperature_val, humidity_val, light_val) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+
+def _chunk_to_csv(device_ids, timestamps, temp, hum, light) -> io.StringIO:
+    k, n = temp.shape
+    ts = np.repeat(timestamps.astype(str), n)
+    dev = np.tile(device_ids, k)
+    buf = io.StringIO()
+    buf.writelines(
+        f"{d},{t},{a},{b},{c}\n"
+        for d, t, a, b, c in zip(dev.tolist(), ts.tolist(), temp.ravel().tolist(),
+                                 hum.ravel().tolist(), light.ravel().tolist())
+    )
+    buf.seek(0)
+    return buf
+
+
+def copy_readings(engine, device_ids, chunks) -> int:
+    """Пише порції через COPY FROM STDIN (PostgreSQL) або bulk insert (інші БД)"""
+    device_ids = np.asarray(device_ids, dtype=np.int64)
+    total = 0
+
+    if engine.dialect.name == "postgresql":
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            for timestamps, temp, hum, light in chunks:
+                cursor.copy_expert(COPY_SQL, _chunk_to_csv(device_ids, timestamps, temp, hum, light))
+                raw.commit()
+                total += temp.size
+            cursor.close()
+        finally:
+            raw.close()
+        return total
+
+    with engine.begin() as conn:
+        for timestamps, temp, hum, light in chunks:
+            k, n = temp.shape
+            ts = np.repeat(timestamps.astype("datetime64[us]").astype(datetime), n)
+            dev = np.tile(device_ids, k)
+            conn.execute(insert(SensorReading), [
+                {"device_id": d, "timestamp": t, "temperature_val": a, "humidity_val": b, "light_val": c}
+                for d, t, a, b, c in zip(dev.tolist(), ts.tolist(), temp.ravel().tolist(),
+                                         hum.ravel().tolist(), light.ravel().tolist())
+            ])
+            total += temp.size
+    return total
+
+
+def load_fleet(engine, n_enclosures, days, interval, start=None, seed=None, prefix="SIM") -> dict:
+    """Повний цикл: довідкові дані -> генерація -> завантаження"""
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        devices = seed_reference_data(db, n_enclosures, prefix)
+        recompute(db)  # Матеріалізовані норми для нових вольєрів
+        db.commit()
+    finally:
+        db.close()
+
+    device_ids = [d for d, _, _ in devices]
+    model = FleetClimateModel([lo for _, lo, _ in devices], [hi for _, _, hi in devices], seed=seed)
+    start = start or (datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+                      - timedelta(days=days))
+
+    started = time.perf_counter()
+    rows = copy_readings(engine, device_ids, generate_readings(model, start, days, interval))
+    elapsed = time.perf_counter() - started
+    return {"enclosures": n_enclosures, "rows": rows, "seconds": elapsed}
+
+
+def main(argv=None):
+    from dependencies import SQLALCHEMY_DATABASE_URL
+
+    parser = argparse.ArgumentParser(description="ZooSmartCare synthetic fleet data generator")
+    parser.add_argument("--enclosures", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=180, help="Секунд між показаннями (180 = як у mqtt_worker)")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--prefix", default="SIM", help="Префікс назв/MAC, щоб не конфліктувати з реальними даними")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.database_url)
+    print(f"🚀 Generating {args.days} days x {args.enclosures} enclosures (every {args.interval}s)...")
+    stats = load_fleet(engine, args.enclosures, args.days, args.interval, args.start, args.seed, args.prefix)
+    print(f"✅ Loaded {stats['rows']:,} readings in {stats['seconds']:.1f}s "
+          f"({stats['rows'] / max(stats['seconds'], 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Конфігурація контролерів без доступу до БД з їхнього боку.
+
+Контролер отримує налаштування двома шляхами (обидва віддають той самий dict):
+  * HTTP: GET /api/business/config/{mac}?version=<v> -> 304, якщо не змінилось
+  * MQTT: retained-повідомлення в zoo/config/AV_XXX (ConfigPublisher у mqtt_worker
+    раз на CONFIG_PUBLISH_SECONDS публікує лише змінені конфіги)
+
+version - короткий хеш вмісту, тож контролер порівнює його з кешем на flash і
+нічого не перезаписує, якщо конфіг той самий.
+"""
+import hashlib
+import json
+
+from models import FeedingSchedule, IoTDevice
+from climate_resolver import get_effective_climate, load_all_effective
+
+CONFIG_TOPIC_PREFIX = "zoo/config/"
+CONFIG_PUBLISH_SECONDS = 60
+DEFAULT_TEMPERATURE_MIN = 20.0
+DEFAULT_TEMPERATURE_MAX = 25.0
+
+
+def config_topic(device_id: int) -> str:
+    """device_id 3 -> 'zoo/config/AV_003' (aviary_id контролера)"""
+    return f"{CONFIG_TOPIC_PREFIX}AV_{device_id:03d}"
+
+
+def config_version(config: dict) -> str:
+    payload = json.dumps({k: v for k, v in config.items() if k != "version"}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def build_device_config(db, device: IoTDevice, schedules=None, climate=None) -> dict:
+    """Норми вольєра (матеріалізовані) + розклад годувань + version"""
+    config = {
+        "target_temperature_min": DEFAULT_TEMPERATURE_MIN,
+        "target_temperature_max": DEFAULT_TEMPERATURE_MAX,
+        "feeding_schedule": [],
+    }
+
+    if climate is None:
+        climate = get_effective_climate(db, device.enclosure_id)
+    if climate:
+        if climate.min_temperature is not None:
+            config["target_temperature_min"] = climate.min_temperature
+        if climate.max_temperature is not None:
+            config["target_temperature_max"] = climate.max_temperature
+
+    if schedules is None:
+        schedules = db.query(FeedingSchedule).filter(FeedingSchedule.enclosure_id == device.enclosure_id).all()
+    for s in sorted(schedules, key=lambda s: (s.feed_time, s.schedule_id)):
+        config["feeding_schedule"].append({
+            "time": s.feed_time.strftime("%H:%M"),
+            "portion": s.portion_size,
+            "food_type": s.food_type,
+            "days_of_week": s.days_of_week,
+        })
+
+    config["version"] = config_version(config)
+    return config
+
+
+def build_all_device_configs(db) -> dict:
+    """{device_id: config} для всіх пристроїв з вольєром - трьома запитами, а не N"""
+    devices = db.query(IoTDevice).filter(IoTDevice.enclosure_id.isnot(None)).all()
+    climates = {row.enclosure_id: row for row in load_all_effective(db)}
+    schedules = {}
+    for schedule in db.query(FeedingSchedule).filter(FeedingSchedule.enclosure_id.isnot(None)).all():
+        schedules.setdefault(schedule.enclosure_id, []).append(schedule)
+
+    return {
+        device.device_id: build_device_config(db, device, schedules.get(device.enclosure_id, []),
+                                              climates.get(device.enclosure_id))
+        for device in devices
+    }
+
+
+class ConfigPublisher:
+    """Публікує retained-конфіги пристроїв, версія яких змінилась з минулого разу"""
+
+    def __init__(self, publish):
+        self.publish = publish  # publish(topic, payload: str)
+        self._versions = {}
+
+    def publish_changed(self, db):
+        published = 0
+        for device_id, config in build_all_device_configs(db).items():
+            if self._versions.get(device_id) == config["version"]:
+                continue
+            self.publish(config_topic(device_id), json.dumps(config))
+            self._versions[device_id] = config["version"]
+            published += 1
+        return published
@@ -0,0 +1,189 @@
+"""
+Події контролерів (топік zoo/events) -> таблиця device_event пакетами.
+
+Повідомлення буферизуються в пам'яті і записуються одним commit, коли набралось
+EVENT_BATCH_SIZE подій або найстаріша чекає EVENT_FLUSH_SECONDS. FEEDING_DONE
+прив'язується до найближчого годування з FeedingSchedule вольєра (з урахуванням
+days_of_week) і в тому ж commit інкрементує денні агрегати feeding_analytics.
+Повторна доставка (той самий seq контролера) не пишеться і не рахується вдруге;
+ack брокеру - після commit (див. ingest.py).
+
+    {"aviary_id": "AV_001", "event": "FEEDING_DONE", "timestamp": 1717000000.0}
+"""
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from models import DeviceEvent, FeedingSchedule, IoTDevice
+from feeding_analytics import FEEDING_EVENT, match_feeding_schedule, apply_feedings
+from ingest import insert_ignore, TELEMETRY_FLUSH_SECONDS
+
+EVENT_BATCH_SIZE = 50
+# Як у телеметрії: PUBACK ідуть строго в порядку отримання (OrderedAcks), тож подія,
+# що чекає в буфері, затримує ack усієї телеметрії після неї
+EVENT_FLUSH_SECONDS = TELEMETRY_FLUSH_SECONDS
+MAX_EVENT_AGE_SECONDS = 7 * 86400   # Черга подій контролера після обриву; давніше - збитий годинник
+MAX_CLOCK_SKEW_SECONDS = 300        # Як у воркері: з майбутнього далі за це - не довіряємо
+
+
+def _plausible_time(value, now):
+    """Unix-час контролера, якщо правдоподібний (як reading_time у воркері), інакше None"""
+    if isinstance(value, (int, float)) and now - MAX_EVENT_AGE_SECONDS < value < now + MAX_CLOCK_SKEW_SECONDS:
+        return min(value, now)
+    return None
+
+
+def _event_time(data, now=None):
+    """timestamp контролера або час отримання (1e20, NaN, рядок - не валять flush)"""
+    now = time.time() if now is None else now
+    sent_at = _plausible_time(data.get("timestamp", data.get("time")), now)
+    return now if sent_at is None else sent_at
+
+
+class EventBuffer:
+    """Потокобезпечний буфер подій з пакетним записом"""
+
+    def __init__(self, session_factory, parse_device_id, batch_size=EVENT_BATCH_SIZE,
+                 flush_seconds=EVENT_FLUSH_SECONDS):
+        self.session_factory = session_factory
+        self.parse_device_id = parse_device_id
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, data: dict, done=None):
+        """Додає подію; done() - після commit. Повертає кількість записаних, якщо спрацював flush"""
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((data, done))
+            full = len(self._pending) >= self.batch_size
+        return self.flush() if full else 0
+
+    def flush_if_due(self):
+        if self._pending and time.monotonic() - self._oldest >= self.flush_seconds:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """Записує всі накопичені події одним commit. Повертає кількість"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self._persist([data for data, _ in batch])
+            except Exception:
+                # Повертаємо в буфер - наступний flush спробує знову
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._oldest = time.monotonic()
+                raise
+            for _, done in batch:
+                if done:
+                    done()
+            return len(batch)
+
+    def _persist(self, batch):
+        db = self.session_factory()
+        try:
+            parsed = []
+            for data in batch:
+                try:
+                    device_id = self.parse_device_id(data)
+                    if not 0 <= device_id < 1 << 31:  # 'AV_99999999999' не валить запит пристроїв
+                        raise ValueError(f"device id {device_id} out of range")
+                except (TypeError, ValueError) as e:
+                    print(f"⚠️ Bad event dropped: {e}")
+                    continue
+                parsed.append((device_id, data))
+            device_ids = {device_id for device_id, _ in parsed}
+            enclosure_of = dict(
+                db.query(IoTDevice.device_id, IoTDevice.enclosure_id)
+                .filter(IoTDevice.device_id.in_(device_ids)).all()
+            )
+            schedules_by_enclosure = {}
+            enclosure_ids = {e for e in enclosure_of.values() if e is not None}
+            if enclosure_ids:
+                for schedule in db.query(FeedingSchedule)\
+                        .filter(FeedingSchedule.enclosure_id.in_(enclosure_ids)).all():
+                    schedules_by_enclosure.setdefault(schedule.enclosure_id, []).append(schedule)
+
+            received_at = datetime.utcnow()
+            now = time.time()
+            rows = []
+            feedings = []
+            for device_id, data in parsed:
+                if device_id not in enclosure_of:
+                    continue  # Невідомий пристрій
+                try:
+                    row, feeding = self._build_row(device_id, enclosure_of[device_id], data,
+                                                   schedules_by_enclosure, received_at, now)
+                except (TypeError, ValueError, OverflowError, OSError) as e:
+                    # Одна бита подія не блокує пакет: відкидається і отримує ack разом з іншими
+                    print(f"⚠️ Bad event from device {device_id} dropped: {e}")
+                    continue
+                rows.append(row)
+                if feeding is not None:
+                    feedings.append(feeding)
+
+            # Дублі доставки (вже записані події) не інкрементують агрегати вдруге
+            inserted = insert_ignore(db, DeviceEvent, rows, ["device_id", "message_id"])
+            fresh = []
+            for key, feeding in feedings:
+                if key[1] is None:
+                    fresh.append(feeding)
+                elif key in inserted:
+                    inserted.discard(key)  # Дубль у тому ж пакеті - один раз
+                    fresh.append(feeding)
+            apply_feedings(db, fresh)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _build_row(device_id, enclosure_id, data, schedules_by_enclosure, received_at, now):
+        """Подія -> (рядок device_event, годування для агрегатів або None)"""
+        sent_at = _event_time(data, now)
+        event_type = str(data.get("event", "UNKNOWN"))[:50]
+
+        seq = data.get("seq")
+        # BigInteger: seq поза діапазоном - як без seq (інакше INSERT падає на весь пакет)
+        message_id = seq if isinstance(seq, int) and not isinstance(seq, bool) and 0 <= seq < 1 << 63 else None
+
+        schedule = None
+        feeding = None
+        portion = data.get("portion")
+        if not isinstance(portion, (int, float)):
+            portion = None
+        if event_type == FEEDING_EVENT:
+            # Розклад у місцевому часі зоопарку; запізніле (catch-up) - за плановим часом
+            scheduled = _plausible_time(data.get("scheduled"), now)
+            local_time = datetime.fromtimestamp(sent_at if scheduled is None else scheduled)
+            schedule = match_feeding_schedule(schedules_by_enclosure.get(enclosure_id, ()), local_time)
+            if portion is None and schedule is not None:
+                portion = schedule.portion_size
+            feeding = ((device_id, message_id), (enclosure_id, local_time, schedule, portion))
+        row = {
+            "device_id": device_id,
+            "enclosure_id": enclosure_id,
+            "event_type": event_type,
+            "timestamp": datetime.fromtimestamp(sent_at, timezone.utc).replace(tzinfo=None),
+            "received_at": received_at,
+            "schedule_id": schedule.schedule_id if schedule else None,
+            "portion_size": portion,
+            "payload": json.dumps(data, ensure_ascii=False),
+            "message_id": message_id,
+        }
+        return row, feeding
@@ -0,0 +1,289 @@
+"""
+Аналітика годувань: план (FeedingSchedule з days_of_week) проти факту
+(події FEEDING_DONE у device_event).
+
+Все рахується в денних агрегатах feeding_daily (місцева дата, вольєр, тип корму):
+  * факт - інкрементально, при пакетному записі подій (device_events -> apply_feedings)
+  * план - розгортання розкладів на дні, що ще не зафіксовані (sync_expected -
+    у mqtt_worker раз на FEEDING_SYNC_SECONDS, а сьогоднішній день - ще й при зміні
+    розкладу); минулі дні фіксуються (expected_final), тож зміна розкладу не
+    переписує історію. Звіти лише читають агрегати.
+
+Рядки агрегатів створюються через INSERT ... ON CONFLICT DO NOTHING: API і воркер
+можуть одночасно створювати той самий (день, вольєр, корм).
+
+Звіти за рік читають ~365 x вольєри рядків агрегатів, без сирих подій.
+rebuild() перераховує діапазон із сирих подій (напр. після імпорту).
+
+    python feeding_analytics.py --rebuild --days 365
+"""
+import argparse
+import re
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from models import DeviceEvent, FeedingDaily, FeedingSchedule
+from ingest import insert_ignore
+
+FEEDING_EVENT = "FEEDING_DONE"
+FEEDING_MATCH_MINUTES = 30           # Годування далі від слоту розкладу - позапланове
+UNSCHEDULED_FOOD_TYPE = "unscheduled"
+UNKNOWN_FOOD_TYPE = "unknown"
+MAX_SYNC_DAYS = 366                  # Межа розгортання плану за один виклик
+FEEDING_SYNC_SECONDS = 60            # Як часто воркер доповнює план (слоти сьогодні, новий день)
+
+_DAY_ALIASES = {
+    0: ("mon", "monday", "пн"), 1: ("tue", "tuesday", "вт"), 2: ("wed", "wednesday", "ср"),
+    3: ("thu", "thursday", "чт"), 4: ("fri", "friday", "пт"), 5: ("sat", "saturday", "сб"),
+    6: ("sun", "sunday", "нд"),
+}
+_DAY_BY_NAME = {alias: day for day, aliases in _DAY_ALIASES.items() for alias in aliases}
+ALL_DAYS = frozenset(range(7))
+
+
+def parse_days_of_week(value):
+    """'Mon,Wed,Fri' -> {0, 2, 4}; порожньо / 'Daily' / нерозпізнане -> всі дні"""
+    if not value:
+        return ALL_DAYS
+    days = {_DAY_BY_NAME[token] for token in re.split(r"[\s,;]+", value.strip().lower())
+            if token in _DAY_BY_NAME}
+    return frozenset(days) or ALL_DAYS
+
+
+def match_feeding_schedule(schedules, local_time):
+    """Найближчий слот розкладу того ж дня тижня (±FEEDING_MATCH_MINUTES) або None"""
+    minute = local_time.hour * 60 + local_time.minute
+    best, best_diff = None, FEEDING_MATCH_MINUTES + 1
+    for schedule in schedules:
+        if local_time.weekday() not in parse_days_of_week(schedule.days_of_week):
+            continue
+        diff = abs(schedule.feed_time.hour * 60 + schedule.feed_time.minute - minute)
+        if diff < best_diff:
+            best, best_diff = schedule, diff
+    return best
+
+
+def utc_to_local(value):
+    """Наївний UTC datetime (як у БД) -> наївний місцевий час сервера"""
+    return value.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def expand_schedules(schedules, start, end):
+    """(день, розклад) для кожного запланованого годування в [start, end]"""
+    days = [(start + timedelta(days=i)) for i in range((end - start).days + 1)]
+    for schedule in schedules:
+        weekdays = parse_days_of_week(schedule.days_of_week)
+        for day in days:
+            if day.weekday() in weekdays:
+                yield day, schedule
+
+
+def _food_type(schedule):
+    return (schedule.food_type or UNKNOWN_FOOD_TYPE) if schedule else UNSCHEDULED_FOOD_TYPE
+
+
+def _load_rows(db, keys):
+    """{(day, enclosure_id, food_type): FeedingDaily} для заданих ключів (один запит)"""
+    if not keys:
+        return {}
+    days = {k[0] for k in keys}
+    enclosures = {k[1] for k in keys}
+    rows = db.query(FeedingDaily).filter(
+        FeedingDaily.day.between(min(days), max(days)),
+        FeedingDaily.enclosure_id.in_(enclosures)
+    ).all()
+    return {(r.day, r.enclosure_id, r.food_type): r for r in rows}
+
+
+def _ensure_rows(db, keys):
+    """{key: FeedingDaily} для keys; відсутні рядки - upsert (паралельний процес міг вставити той самий)"""
+    rows = _load_rows(db, keys)
+    missing = [key for key in keys if key not in rows]
+    if missing:
+        insert_ignore(db, FeedingDaily, [
+            dict(day=day, enclosure_id=enclosure_id, food_type=food_type,
+                 expected_count=0, expected_portion=0.0, fed_count=0, fed_portion=0.0,
+                 unscheduled_count=0, unscheduled_portion=0.0, expected_final=False)
+            for day, enclosure_id, food_type in missing
+        ], ["day", "enclosure_id", "food_type"])
+        rows.update(_load_rows(db, missing))
+    return rows
+
+
+def apply_feedings(db, feedings):
+    """
+    Інкремент факту: feedings - [(enclosure_id, місцевий datetime, FeedingSchedule|None, порція)].
+    Commit - на стороні викликача (той самий, що й для подій).
+    """
+    feedings = [f for f in feedings if f[0] is not None]
+    if not feedings:
+        return 0
+    keys = {(local.date(), enclosure_id, _food_type(schedule)) for enclosure_id, local, schedule, _ in feedings}
+    rows = _ensure_rows(db, keys)
+    for enclosure_id, local, schedule, portion in feedings:
+        row = rows[(local.date(), enclosure_id, _food_type(schedule))]
+        if schedule is not None:
+            row.fed_count += 1
+            row.fed_portion += portion or 0.0
+        else:
+            row.unscheduled_count += 1
+            row.unscheduled_portion += portion or 0.0
+    return len(feedings)
+
+
+def _fill_expected(db, start, end, now):
+    """Перераховує план для [start, end] з поточних розкладів (сьогодні - лише слоти, що вже настали)"""
+    today = now.date()
+    schedules = db.query(FeedingSchedule).filter(FeedingSchedule.enclosure_id.isnot(None)).all()
+    rows = {
+        (r.day, r.enclosure_id, r.food_type): r for r in
+        db.query(FeedingDaily).filter(FeedingDaily.day.between(start, end)).all()
+    }
+    for row in rows.values():
+        row.expected_count = 0
+        row.expected_portion = 0.0
+    planned = [(day, schedule) for day, schedule in expand_schedules(schedules, start, end)
+               if day < today or (day == today and schedule.feed_time <= now.time())]
+    rows.update(_ensure_rows(db, {(day, s.enclosure_id, _food_type(s)) for day, s in planned}))
+    for day, schedule in planned:
+        row = rows[(day, schedule.enclosure_id, _food_type(schedule))]
+        row.expected_count += 1
+        row.expected_portion += schedule.portion_size or 0.0
+    for row in rows.values():
+        row.expected_final = row.day < today
+
+
+def sync_expected(db):
+    """
+    Розгортає план на дні після останнього зафіксованого (включно з сьогодні,
+    який лишається незафіксованим). Зазвичай це 1-2 дні. Робить commit.
+    """
+    now = datetime.now()
+    today = now.date()
+    last_final = db.query(func.max(FeedingDaily.day)).filter(FeedingDaily.expected_final.is_(True)).scalar()
+    if last_final is not None:
+        start = last_final + timedelta(days=1)
+    else:
+        start = db.query(func.min(FeedingDaily.day)).scalar() or today
+    start = max(min(start, today), today - timedelta(days=MAX_SYNC_DAYS))
+    _fill_expected(db, start, today, now)
+    db.commit()
+
+
+def refresh_today(db):
+    """Після зміни розкладу: план сьогоднішнього дня з нового розкладу"""
+    now = datetime.now()
+    _fill_expected(db, now.date(), now.date(), now)
+    db.commit()
+
+
+def rebuild(db, start, end):
+    """Повний перерахунок [start, end] із сирих подій (план - з поточних розкладів)"""
+    db.query(FeedingDaily).filter(FeedingDaily.day.between(start, end)).delete(synchronize_session=False)
+
+    # Межі в UTC із запасом на часовий пояс; фільтр по місцевій даті нижче
+    events = db.query(DeviceEvent).filter(
+        DeviceEvent.event_type == FEEDING_EVENT,
+        DeviceEvent.timestamp >= datetime.combine(start - timedelta(days=1), datetime.min.time()),
+        DeviceEvent.timestamp < datetime.combine(end + timedelta(days=2), datetime.min.time()),
+    ).all()
+    schedules = {s.schedule_id: s for s in db.query(FeedingSchedule).all()}
+    feedings = []
+    for event in events:
+        local = utc_to_local(event.timestamp)
+        if start <= local.date() <= end:
+            feedings.append((event.enclosure_id, local, schedules.get(event.schedule_id), event.portion_size))
+    apply_feedings(db, feedings)
+    db.flush()
+    _fill_expected(db, start, end, datetime.now())
+    db.commit()
+    return len(feedings)
+
+
+def _period(start, end):
+    end = end or datetime.now().date()
+    start = start or end - timedelta(days=6)
+    return start, end
+
+
+def compliance_report(db, start: date = None, end: date = None, enclosure_id: int = None):
+    """План vs факт по вольєрах і типах корму за період (з агрегатів, без запису)"""
+    start, end = _period(start, end)
+    query = db.query(
+        FeedingDaily.enclosure_id, FeedingDaily.food_type,
+        func.sum(FeedingDaily.expected_count), func.sum(FeedingDaily.fed_count),
+        func.sum(FeedingDaily.unscheduled_count),
+        func.sum(FeedingDaily.expected_portion), func.sum(FeedingDaily.fed_portion),
+    ).filter(FeedingDaily.day.between(start, end))
+    if enclosure_id is not None:
+        query = query.filter(FeedingDaily.enclosure_id == enclosure_id)
+
+    items = []
+    for enc_id, food_type, expected, fed, unscheduled, expected_kg, fed_kg in \
+            query.group_by(FeedingDaily.enclosure_id, FeedingDaily.food_type)\
+                 .order_by(FeedingDaily.enclosure_id, FeedingDaily.food_type).all():
+        expected, fed = expected or 0, fed or 0
+        items.append({
+            "enclosure_id": enc_id,
+            "food_type": food_type,
+            "expected_feedings": expected,
+            "done_feedings": fed,
+            "missed_feedings": max(expected - fed, 0),
+            "unscheduled_feedings": unscheduled or 0,
+            "compliance_pct": round(100.0 * min(fed, expected) / expected, 1) if expected else None,
+            "expected_kg": round(expected_kg or 0.0, 3),
+            "fed_kg": round(fed_kg or 0.0, 3),
+        })
+    return {"start": start, "end": end, "items": items}
+
+
+def consumption_report(db, start: date = None, end: date = None):
+    """Витрата корму за типами: план і факт (разом із позаплановими годуваннями, без запису)"""
+    start, end = _period(start, end)
+    days = (end - start).days + 1
+    rows = db.query(
+        FeedingDaily.food_type,
+        func.sum(FeedingDaily.expected_portion),
+        func.sum(FeedingDaily.fed_portion + FeedingDaily.unscheduled_portion),
+    ).filter(FeedingDaily.day.between(start, end))\
+     .group_by(FeedingDaily.food_type).order_by(FeedingDaily.food_type).all()
+
+    return {
+        "start": start,
+        "end": end,
+        "days": days,
+        "food_types": [{
+            "food_type": food_type,
+            "planned_kg": round(planned or 0.0, 3),
+            "consumed_kg": round(consumed or 0.0, 3),
+            "planned_daily_kg": round((planned or 0.0) / days, 3),
+        } for food_type, planned, consumed in rows],
+    }
+
+
+def main(argv=None):
+    from dependencies import SessionLocal
+
+    parser = argparse.ArgumentParser(description="ZooSmartCare feeding aggregates")
+    parser.add_argument("--rebuild", action="store_true", help="Перерахувати агрегати з сирих подій")
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        end = datetime.now().date()
+        start = end - timedelta(days=args.days - 1)
+        if args.rebuild:
+            count = rebuild(db, start, end)
+            print(f"✅ Rebuilt {start}..{end}: {count} feeding events")
+        else:
+            sync_expected(db)
+        for item in compliance_report(db, start, end)["items"]:
+            print(item)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+"""
+Headless-симулятор парку контролерів для навантажувального (soak) тестування бекенду.
+
+Тисячі віртуальних контролерів в одному процесі: стан фізики, фільтра і
+регулятора кожного - рядок у масивах NumPy (крок фізики той самий, що в
+data_generator / ІоТ/dht.py), тож один такт віртуального годинника - кілька
+векторних операцій на весь парк. Годинник іде в --speed разів швидше за
+реальний (0 - без пауз, максимально швидко).
+
+У брокер іде той самий трафік, що й від ІоТ/main_loop.py:
+  * zoo/telemetry - за винятком, як ІоТ/reporting.py: зміна реле / статусу,
+                    зміна показу більше за deadband, heartbeat, часто під час
+                    тривоги (--report periodic - повний payload кожні --publish-every с)
+  * zoo/alerts    - CRITICAL, поки температура більше ніж на 2°C поза нормою
+  * zoo/events    - FEEDING_DONE за розкладом вольєра
+Плюс збої: обриви зв'язку (пристрій мовчить, але далі керує кліматом) і збої
+датчика (немає показу, завислий показ, дрейф калібровки).
+
+timestamp у payload - віртуальний час (детектор аномалій і трекер реле
+воркера бачать реальний темп), --timestamps wall - реальний.
+
+    python fleet_simulator.py --devices 2000 --speed 1000 --broker localhost
+    python fleet_simulator.py --from-db --hours 24 --broker localhost    # пристрої та норми з БД
+    python fleet_simulator.py --devices 5000 --hours 6 --dry-run         # без брокера
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from transport import BrokerSettings, ERR_NO_CONN, create_transport
+
+from data_generator import (
+    TICK_SECONDS, AMBIENT_TEMP, FILTER_SIZE, SPECIES_TEMPLATES,
+    step_physics, step_control, read_sensor
+)
+
+# Параметри report-by-exception - ті самі, що в прошивці
+IOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ІоТ")
+if IOT_DIR not in sys.path:
+    sys.path.append(IOT_DIR)
+from reporting import HEARTBEAT_SECONDS, ALERT_SECONDS, TEMP_DEADBAND, HUM_DEADBAND  # noqa: E402
+
+TELEMETRY_TOPIC = "zoo/telemetry"
+ALERTS_TOPIC = "zoo/alerts"
+EVENTS_TOPIC = "zoo/events"
+
+PUBLISH_SECONDS = 5          # Як publish-задача main_loop
+CRITICAL_MARGIN = 2.0        # main_loop: алерт за межами temp_min - 2 / temp_max + 2
+MAX_HOLD = 3                 # SignalPipeline.max_hold: стільки вимірів поспіль тримаємо останнє значення
+DEFAULT_FEEDINGS = (("09:00", 1.5, "М'ясо"), ("17:00", 1.5, "М'ясо"))  # Як у seed_reference_data
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# Збої датчика
+FAULT_NONE, FAULT_DROPOUT, FAULT_STUCK, FAULT_DRIFT = 0, 1, 2, 3
+FAULT_NAMES = {FAULT_DROPOUT: "dropout", FAULT_STUCK: "stuck", FAULT_DRIFT: "drift"}
+STATUS_NAMES = ("stable", "heating", "cooling", "error")
+REASON_NAMES = (None, "startup", "state", "delta", "alert", "heartbeat")
+
+
+class VirtualClock:
+    """Віртуальний час = start + speed * (реальний час від старту)"""
+
+    def __init__(self, speed=1000.0, start=None):
+        self.speed = speed
+        self.start = time.time() if start is None else start
+        self._t0 = time.perf_counter()
+
+    def wall_elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def wait_until(self, virtual_t):
+        """Чекає, поки реальний час дожене virtual_t. Повертає відставання (с реального часу)"""
+        if self.speed <= 0:
+            return 0.0
+        delay = (virtual_t - self.start) / self.speed - self.wall_elapsed()
+        if delay > 0:
+            time.sleep(delay)
+            return 0.0
+        return -delay
+
+
+class FleetSimulator:
+    """Стан N контролерів (по рядку на пристрій) + генерація їхніх повідомлень"""
+
+    def __init__(self, device_ids, t_min, t_max, feedings=None, start=None, step=TICK_SECONDS,
+                 publish_every=PUBLISH_SECONDS, outages_per_day=1.0, outage_minutes=10.0,
+                 faults_per_day=0.5, fault_minutes=30.0, drift_per_hour=2.0, report="exception",
+                 temp_deadband=TEMP_DEADBAND, hum_deadband=HUM_DEADBAND, heartbeat=HEARTBEAT_SECONDS,
+                 seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.device_ids = list(device_ids)
+        self.aviary_ids = [f"AV_{d:03d}" for d in self.device_ids]
+        self.t_min = np.asarray(t_min, dtype=np.float64)
+        self.t_max = np.asarray(t_max, dtype=np.float64)
+        n = self.n = len(self.device_ids)
+
+        self.step_seconds = step
+        self.publish_every = max(1, int(round(publish_every / step)))
+        self.now = time.time() if start is None else start
+        self.ticks = 0
+
+        # Фізика і реле (окремо для кожного пристрою, без глобального стану)
+        self.temp = np.full(n, AMBIENT_TEMP)
+        self.hum = self.rng.uniform(40.0, 60.0, n)
+        self.heater = np.zeros(n, dtype=bool)
+        self.fan = np.zeros(n, dtype=bool)
+
+        # Ковзне середнє по валідних показах + утримання останнього значення при збої
+        self._window = np.zeros((FILTER_SIZE, n))
+        self._pos = np.zeros(n, dtype=np.int64)
+        self._count = np.zeros(n, dtype=np.int64)
+        self._held = np.zeros(n, dtype=np.int64)
+        self.reading = np.full(n, np.nan)
+        self.filtered = np.full(n, np.nan)
+        self.status = np.full(n, 3, dtype=np.int8)
+
+        # Обриви зв'язку та збої датчика: ймовірність старту на такт + тривалість (експоненційна)
+        self.outage_p = outages_per_day * step / 86400.0
+        self.outage_seconds = outage_minutes * 60.0
+        self.offline_until = np.zeros(n)
+        self.fault_p = faults_per_day * step / 86400.0
+        self.fault_seconds = fault_minutes * 60.0
+        self.drift_per_second = drift_per_hour / 3600.0
+        self.fault = np.zeros(n, dtype=np.int8)
+        self.fault_started = np.zeros(n)
+        self.fault_until = np.zeros(n)
+        self.fault_value = np.zeros(n)   # STUCK: завислий показ; DRIFT: знак дрейфу
+
+        # Розклад: хвилина доби -> [(індекс пристрою, порція, корм, дні тижня)]
+        self.feedings = {}
+        for i, plan in enumerate(feedings or [DEFAULT_FEEDINGS] * n):
+            for item in plan:
+                hh, mm = (int(x) for x in item[0].split(":"))
+                self.feedings.setdefault(hh * 60 + mm, []).append((i, *item[1:]))
+
+        # Report-by-exception: останній НАДІСЛАНИЙ знімок кожного пристрою
+        self.report = report
+        self.temp_deadband = temp_deadband
+        self.hum_deadband = hum_deadband
+        self.heartbeat = heartbeat
+        self.sent_temp = np.full(n, np.nan)
+        self.sent_hum = np.full(n, np.nan)
+        self.sent_heater = np.zeros(n, dtype=bool)
+        self.sent_fan = np.zeros(n, dtype=bool)
+        self.sent_status = np.full(n, -1, dtype=np.int8)   # -1 - ще нічого не надсилали
+        self.sent_at = np.full(n, -np.inf)
+        self.alert_at = np.full(n, -np.inf)
+
+        # seq як у MessageSequence контролера (boot = 1): дедуплікація QoS 1 на воркері
+        self.seq = [1 << 32] * n
+        self.stats = {"telemetry": 0, "skipped": 0, "alerts": 0, "events": 0, "suppressed": 0,
+                      "outages": 0, **{f"fault_{name}": 0 for name in FAULT_NAMES.values()}}
+
+    @property
+    def online(self):
+        return self.now >= self.offline_until
+
+    def _start_incidents(self):
+        n = self.n
+        new_outages = self.online & (self.rng.random(n) < self.outage_p)
+        k = int(new_outages.sum())
+        if k:
+            self.offline_until[new_outages] = self.now + self.rng.exponential(self.outage_seconds, k)
+            self.stats["outages"] += k
+
+        self.fault[(self.fault != FAULT_NONE) & (self.now >= self.fault_until)] = FAULT_NONE
+        new_faults = (self.fault == FAULT_NONE) & (self.rng.random(n) < self.fault_p)
+        k = int(new_faults.sum())
+        if k:
+            kinds = self.rng.integers(FAULT_DROPOUT, FAULT_DRIFT + 1, k).astype(np.int8)
+            self.fault[new_faults] = kinds
+            self.fault_started[new_faults] = self.now
+            self.fault_until[new_faults] = self.now + self.rng.exponential(self.fault_seconds, k)
+            last = self.reading[new_faults]
+            self.fault_value[new_faults] = np.where(
+                kinds == FAULT_STUCK, np.where(np.isnan(last), self.temp[new_faults], last),
+                self.rng.choice([-1.0, 1.0], k)
+            )
+            for kind, name in FAULT_NAMES.items():
+                self.stats[f"fault_{name}"] += int((kinds == kind).sum())
+
+    def _sense(self):
+        """Показ датчика зі збоями -> фільтр контролера"""
+        reading = read_sensor(self.temp, self.rng)
+        stuck = self.fault == FAULT_STUCK
+        reading[stuck] = self.fault_value[stuck]
+        drift = self.fault == FAULT_DRIFT
+        reading[drift] += np.round(self.fault_value[drift] * self.drift_per_second
+                                   * (self.now - self.fault_started[drift]), 1)
+        reading[self.fault == FAULT_DROPOUT] = np.nan
+        self.reading = reading
+
+        valid = ~np.isnan(reading)
+        idx = np.flatnonzero(valid)
+        self._window[self._pos[idx], idx] = reading[idx]
+        self._pos[idx] = (self._pos[idx] + 1) % FILTER_SIZE
+        self._count[idx] = np.minimum(self._count[idx] + 1, FILTER_SIZE)
+        self._held[valid] = 0
+        self._held[~valid] += 1
+
+        mean = self._window.sum(axis=0) / np.maximum(self._count, 1)
+        ok = (self._count > 0) & (self._held <= MAX_HOLD)
+        self.filtered = np.where(ok, np.round(mean, 2), np.nan)
+        self.hum_reading = np.where(valid, np.round(self.hum, 1), np.nan)
+
+    def _control(self):
+        step_control(self.filtered, self.t_min, self.t_max, self.heater, self.fan)
+        no_signal = np.isnan(self.filtered)
+        # Немає показу -> статус error, реле вимкнені (як control_task у main_loop)
+        self.heater[no_signal] = False
+        self.fan[no_signal] = False
+        self.status = np.where(no_signal, 3, np.where(self.heater, 1, np.where(self.fan, 2, 0))).astype(np.int8)
+
+    def step(self, emit, timestamp=None):
+        """Один такт для всього парку. emit(індекс, топік, dict) - для кожного повідомлення"""
+        prev = self.now
+        self.now += self.step_seconds
+        self.ticks += 1
+
+        self._start_incidents()
+        step_physics(self.temp, self.hum, self.heater, self.fan, self.rng, dt=self.step_seconds)
+        self._sense()
+        self._control()
+
+        def send(i, topic, data):
+            self.seq[i] += 1
+            data["seq"] = self.seq[i]
+            emit(i, topic, data)
+
+        sent_at = self.now if timestamp is None else timestamp
+        online = self.online
+        if self.report == "exception":
+            self._publish_exceptions(send, online, sent_at)
+        elif self.ticks % self.publish_every == 0:
+            self._publish_telemetry(send, online, sent_at)
+        self._publish_feedings(send, online, prev, sent_at)
+
+    def _critical(self):
+        return (self.status != 0) & (
+            (self.filtered < self.t_min - CRITICAL_MARGIN) | (self.filtered > self.t_max + CRITICAL_MARGIN))
+
+    def _publish_exceptions(self, emit, online, sent_at):
+        """ReportPolicy.reason() для всього парку; показ порівнюється з останнім надісланим"""
+        def moved(value, last, deadband):
+            return (np.isnan(value) != np.isnan(last)) | (np.abs(value - last) >= deadband)
+
+        elapsed = self.now - self.sent_at
+        alarm = self._critical()
+        reasons = np.zeros(self.n, dtype=np.int8)
+        # Пріоритет як у ReportPolicy: startup > state > delta > alert > heartbeat
+        for code, mask in ((5, elapsed >= self.heartbeat),
+                           (4, alarm & (elapsed >= ALERT_SECONDS)),
+                           (3, moved(self.filtered, self.sent_temp, self.temp_deadband)
+                            | moved(self.hum_reading, self.sent_hum, self.hum_deadband)),
+                           (2, (self.status != self.sent_status) | (self.heater != self.sent_heater)
+                            | (self.fan != self.sent_fan)),
+                           (1, self.sent_status < 0)):
+            reasons[mask] = code
+        due = reasons > 0
+        self.stats["skipped"] += int((~due).sum())
+        send = due & online
+        # Без зв'язку знімок не вважається надісланим - повтор на наступному такті
+        self.stats["suppressed"] += int((due & ~online).sum())
+
+        self.sent_temp[send] = self.filtered[send]
+        self.sent_hum[send] = self.hum_reading[send]
+        self.sent_heater[send] = self.heater[send]
+        self.sent_fan[send] = self.fan[send]
+        self.sent_status[send] = self.status[send]
+        self.sent_at[send] = self.now
+        self._emit_telemetry(emit, np.flatnonzero(send), sent_at, reasons)
+
+        alerts = alarm & online & (self.now - self.alert_at >= ALERT_SECONDS)
+        self.alert_at[alerts] = self.now
+        self._emit_alerts(emit, alerts, sent_at)
+
+    def _publish_telemetry(self, emit, online, sent_at):
+        idx = np.flatnonzero(online)
+        self.stats["suppressed"] += self.n - idx.size
+        self._emit_telemetry(emit, idx, sent_at)
+        # Критичні стани - так само, як publish_task контролера
+        self._emit_alerts(emit, online & self._critical(), sent_at)
+
+    def _emit_telemetry(self, emit, idx, sent_at, reasons=None):
+        temps = self.filtered[idx].tolist()
+        hums = self.hum_reading[idx].tolist()
+        heater = self.heater[idx].tolist()
+        fan = self.fan[idx].tolist()
+        status = self.status[idx].tolist()
+        why = None if reasons is None else reasons[idx].tolist()
+        for k, i in enumerate(idx.tolist()):
+            t = temps[k]
+            data = {
+                "aviary_id": self.aviary_ids[i],
+                "temp": None if t != t else t,
+                "hum": None if hums[k] != hums[k] else hums[k],
+                "heater": int(heater[k]),
+                "fan": int(fan[k]),
+                "status": STATUS_NAMES[status[k]],
+                "timestamp": sent_at,
+            }
+            if why is not None:
+                data["reason"] = REASON_NAMES[why[k]]
+            emit(i, TELEMETRY_TOPIC, data)
+        self.stats["telemetry"] += idx.size
+
+    def _emit_alerts(self, emit, critical, sent_at):
+        for i in np.flatnonzero(critical).tolist():
+            emit(i, ALERTS_TOPIC, {"aviary_id": self.aviary_ids[i], "level": "CRITICAL",
+                                   "msg": f"Temp warning: {self.filtered[i]}", "timestamp": sent_at})
+            self.stats["alerts"] += 1
+
+    def _publish_feedings(self, emit, online, prev, sent_at):
+        # Хвилини (місцевий час), що почались у (prev, now]
+        for minute in range(int(prev // 60) + 1, int(self.now // 60) + 1):
+            local = time.localtime(minute * 60)
+            plan = self.feedings.get(local.tm_hour * 60 + local.tm_min)
+            if not plan:
+                continue
+            weekday = WEEKDAYS[local.tm_wday]
+            for i, portion, food_type, *days in plan:
+                if days and days[0] and weekday not in days[0]:
+                    continue
+                if not online[i]:
+                    self.stats["suppressed"] += 1  # Годування відбулось, подія загубилась
+                    continue
+                emit(i, EVENTS_TOPIC, {"aviary_id": self.aviary_ids[i], "event": "FEEDING_DONE",
+                                       "portion": portion, "food_type": food_type,
+                                       "scheduled": minute * 60.0, "late": False, "timestamp": sent_at})
+                self.stats["events"] += 1
+
+
+# ==============================================================================
+# ПУБЛІКАЦІЯ
+# ==============================================================================
+
+class NullPublisher:
+    """--dry-run: лише серіалізація і підрахунок (швидкість самого генератора)"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def publish(self, device_index, topic, data):
+        self.messages += 1
+        self.bytes += len(json.dumps(data))
+
+    def close(self):
+        pass
+
+
+class MqttPublisher:
+    """Пул з'єднань (transport.py): пристрій i публікує через з'єднання i % connections"""
+
+    def __init__(self, broker, port=None, connections=1, qos=0, connect_timeout=10.0):
+        self.qos = qos
+        self.messages = 0
+        self.bytes = 0
+        self.errors = 0
+        self.transports = []
+        for k in range(connections):
+            settings = BrokerSettings.from_env(host=broker, port=port, client_id=f"FleetSim_{k}")
+            transport = create_transport(settings).start()
+            self.transports.append(transport)
+            if not transport.wait_connected(connect_timeout):
+                self.close()
+                raise ConnectionError(f"broker {settings} unavailable")
+
+    def publish(self, device_index, topic, data):
+        payload = json.dumps(data)
+        info = self.transports[device_index % len(self.transports)].publish(topic, payload, qos=self.qos)
+        # Під час перепідключення QoS 1 чекає в черзі клієнта - не помилка
+        if info.rc and not (self.qos and info.rc == ERR_NO_CONN):
+            self.errors += 1
+            return
+        self.messages += 1
+        self.bytes += len(payload)
+
+    def close(self):
+        for transport in self.transports:
+            transport.stop()
+
+
+# ==============================================================================
+# ПАРК: синтетичний або з БД
+# ==============================================================================
+
+def synthetic_fleet(n):
+    """AV_001..AV_N з нормами шаблонів видів (як seed_reference_data)"""
+    limits = [SPECIES_TEMPLATES[i % len(SPECIES_TEMPLATES)][3:5] for i in range(n)]
+    return list(range(1, n + 1)), [lo for lo, _ in limits], [hi for _, hi in limits], None
+
+
+def db_fleet(seed_devices=0):
+    """Пристрої, норми та розклад - ті самі конфіги, що отримують справжні контролери"""
+    from dependencies import SessionLocal, engine
+    from models import Base
+    from device_config import build_all_device_configs
+    from data_generator import seed_reference_data
+    from climate_resolver import recompute
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if seed_devices:
+            seed_reference_data(db, seed_devices, prefix="FLEET")
+            recompute(db)
+            db.commit()
+        configs = build_all_device_configs(db)
+    finally:
+        db.close()
+
+    device_ids = sorted(configs)
+    plans = [[(f["time"], f["portion"], f["food_type"], f.get("days_of_week"))
+              for f in configs[d]["feeding_schedule"]] for d in device_ids]
+    return (device_ids, [configs[d]["target_temperature_min"] for d in device_ids],
+            [configs[d]["target_temperature_max"] for d in device_ids], plans)
+
+
+def run(sim, publisher, clock, hours, wall_timestamps=False, report_every=10.0):
+    end = sim.now + hours * 3600.0
+    virtual_start = sim.now
+    next_report = report_every
+    max_lag = 0.0
+
+    while sim.now < end:
+        max_lag = max(max_lag, clock.wait_until(sim.now + sim.step_seconds))
+        sim.step(publisher.publish, time.time() if wall_timestamps else None)
+
+        elapsed = clock.wall_elapsed()
+        if elapsed >= next_report:
+            next_report += report_every
+            print(f"⏱️ +{(sim.now - virtual_start) / 3600:.1f} h virtual in {elapsed:.0f}s "
+                  f"(x{(sim.now - virtual_start) / elapsed:.0f}), {publisher.messages / elapsed:,.0f} msg/s, "
+                  f"online {int(sim.online.sum())}/{sim.n}, faults {int((sim.fault != FAULT_NONE).sum())}")
+
+    elapsed = max(clock.wall_elapsed(), 1e-9)
+    return {
+        "devices": sim.n,
+        "virtual_hours": round((sim.now - virtual_start) / 3600.0, 2),
+        "wall_seconds": round(elapsed, 2),
+        "speed": round((sim.now - virtual_start) / elapsed, 1),
+        "max_lag_seconds": round(max_lag, 3),
+        "messages": publisher.messages,
+        "messages_per_second": round(publisher.messages / elapsed, 1),
+        "megabytes": round(publisher.bytes / 1e6, 2),
+        "publish_errors": publisher.errors,
+        **sim.stats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ZooSmartCare headless fleet simulator")
+    parser.add_argument("--devices", type=int, default=1000, help="Синтетичний парк (або скільки створити з --seed-db)")
+    parser.add_argument("--from-db", action="store_true", help="Пристрої, норми й розклад з БД (DATABASE_URL)")
+    parser.add_argument("--seed-db", action="store_true", help="Спершу створити --devices вольєрів у БД (з --from-db)")
+    parser.add_argument("--hours", type=float, default=24.0, help="Віртуальних годин")
+    parser.add_argument("--speed", type=float, default=1000.0, help="Множник віртуального часу (0 - без пауз)")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None, help="Початок віртуального часу")
+    parser.add_argument("--step", type=float, default=TICK_SECONDS, help="Такт фізики, с")
+    parser.add_argument("--report", choices=("exception", "periodic"), default="exception",
+                        help="Телеметрія за винятком (як прошивка) або кожні --publish-every с")
+    parser.add_argument("--publish-every", type=float, default=PUBLISH_SECONDS, help="Період для --report periodic, с")
+    parser.add_argument("--outages-per-day", type=float, default=1.0, help="Обривів зв'язку на пристрій за добу")
+    parser.add_argument("--outage-minutes", type=float, default=10.0, help="Середня тривалість обриву")
+    parser.add_argument("--faults-per-day", type=float, default=0.5, help="Збоїв датчика на пристрій за добу")
+    parser.add_argument("--fault-minutes", type=float, default=30.0)
+    parser.add_argument("--timestamps", choices=("virtual", "wall"), default="virtual")
+    parser.add_argument("--broker", default=None, help="За замовчуванням - MQTT_HOST / localhost; loopback - у пам'яті")
+    parser.add_argument("--port", type=int, default=None, help="За замовчуванням - MQTT_PORT / 1883")
+    parser.add_argument("--connections", type=int, default=4, help="MQTT-з'єднань на весь парк")
+    parser.add_argument("--qos", type=int, choices=(0, 1), default=1)
+    parser.add_argument("--dry-run", action="store_true", help="Без брокера")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Файл JSON з підсумком")
+    args = parser.parse_args(argv)
+
+    if args.from_db or args.seed_db:
+        device_ids, t_min, t_max, plans = db_fleet(args.devices if args.seed_db else 0)
+    else:
+        device_ids, t_min, t_max, plans = synthetic_fleet(args.devices)
+    if not device_ids:
+        print("❌ No devices to simulate")
+        return
+
+    clock = VirtualClock(args.speed, args.start.timestamp() if args.start else None)
+    sim = FleetSimulator(device_ids, t_min, t_max, plans, start=clock.start, step=args.step,
+                         publish_every=args.publish_every, outages_per_day=args.outages_per_day,
+                         outage_minutes=args.outage_minutes, faults_per_day=args.faults_per_day,
+                         fault_minutes=args.fault_minutes, report=args.report, seed=args.seed)
+    try:
+        publisher = NullPublisher() if args.dry_run else MqttPublisher(args.broker, args.port, args.connections, args.qos)
+    except OSError as e:
+        print(f"❌ MQTT Failed: {e}")
+        return
+
+    target = "dry run" if args.dry_run else str(BrokerSettings.from_env(host=args.broker, port=args.port))
+    print(f"🚀 Simulating {sim.n} controllers for {args.hours} h at x{args.speed:g} -> {target}")
+    try:
+        summary = run(sim, publisher, clock, args.hours, args.timestamps == "wall")
+    except KeyboardInterrupt:
+        print("\n🛑 Simulation stopped.")
+        return
+    finally:
+        publisher.close()
+
+    print(f"✅ {summary['virtual_hours']} h of {summary['devices']} devices in {summary['wall_seconds']}s "
+          f"(x{summary['speed']:g}): {summary['messages']:,} messages, {summary['messages_per_second']:,.0f} msg/s, "
+          f"{summary['outages']} outages, {summary['publish_errors']} publish errors")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": vars(args) | {"start": clock.start}, "summary": summary}, f,
+                      indent=2, ensure_ascii=False, default=str)
+        print(f"📝 Summary written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
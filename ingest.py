@@ -0,0 +1,178 @@
+"""
+At-least-once інжест телеметрії: QoS 1 + ack лише після commit + ідемпотентний запис.
+
+Контролер нумерує кожне повідомлення (seq = boot << 32 | лічильник, див.
+ІоТ/reporting.MessageSequence), воркер пише показання пакетами через
+INSERT ... ON CONFLICT (device_id, message_id) DO NOTHING, тож повторна
+доставка (рестарт воркера, обрив зв'язку до PUBACK) нічого не коштує.
+
+PUBACK брокеру - тільки після commit пакета і в порядку отримання (MQTT 3.1.1,
+4.6): невдалий commit лишає повідомлення непідтвердженими, і брокер доставить їх
+знову (persistent session). Брокер обмежує кількість непідтверджених
+повідомлень (mosquitto: max_inflight_messages), тож пакет скидається і тоді,
+коли непідтверджених набралось ACK_WINDOW.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import insert
+
+from models import SensorReading
+
+TELEMETRY_BATCH_SIZE = 100
+TELEMETRY_FLUSH_SECONDS = 0.2   # Затримка запису (і алертів) не більше за це
+ACK_WINDOW = int(os.getenv("MQTT_ACK_WINDOW", "100"))  # <= max_inflight_messages брокера
+
+
+def insert_ignore(db, model, rows, index_elements):
+    """
+    Пакетний INSERT ... ON CONFLICT DO NOTHING (PostgreSQL / SQLite).
+    Повертає множину ключів index_elements вставлених рядків.
+    """
+    if not rows:
+        return set()
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+
+    columns = [getattr(model, name) for name in index_elements]
+    if dialect_insert is None:
+        # Інші БД: без ON CONFLICT (дублікати ловить унікальний індекс - тоді помилка пакета)
+        db.execute(insert(model), rows)
+        return {tuple(row.get(name) for name in index_elements) for row in rows}
+    stmt = dialect_insert(model).on_conflict_do_nothing(index_elements=index_elements).returning(*columns)
+    return {tuple(r) for r in db.execute(stmt, rows).all()}
+
+
+class OrderedAcks:
+    """
+    PUBACK у порядку отримання: повідомлення підтверджується, коли воно і всі
+    попередні оброблені (записані або свідомо відкинуті).
+    """
+
+    def __init__(self):
+        self._queue = deque()   # [client, mid, qos, done]
+        self._lock = threading.Lock()
+        self.acked = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def track(self, client, msg):
+        """-> callable done(); для QoS 0 / без клієнта (бенчмарк in-process) - no-op"""
+        qos = getattr(msg, "qos", 0)
+        if client is None or not qos:
+            return _noop
+        entry = [client, msg.mid, qos, False]
+        with self._lock:
+            self._queue.append(entry)
+
+        def done():
+            with self._lock:
+                entry[3] = True
+                while self._queue and self._queue[0][3]:
+                    client_, mid, qos_, _ = self._queue.popleft()
+                    client_.ack(mid, qos_)
+                    self.acked += 1
+        return done
+
+    def clear(self):
+        """Після обриву з'єднання: брокер повторить непідтверджені сам"""
+        with self._lock:
+            self._queue.clear()
+
+
+def _noop():
+    pass
+
+
+class TelemetryBuffer:
+    """
+    Показання -> пакетний ідемпотентний запис; ack кожного - після commit.
+    on_inserted(db, items) - у тій самій транзакції для реально вставлених
+    (не дублікатів): перевірка алертів тощо.
+    """
+
+    def __init__(self, session_factory, on_inserted=None, before_insert=None,
+                 batch_size=TELEMETRY_BATCH_SIZE, flush_seconds=TELEMETRY_FLUSH_SECONDS):
+        self.session_factory = session_factory
+        self.on_inserted = on_inserted
+        self.before_insert = before_insert
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._pending = []      # (row, data, done)
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.written = 0
+        self.duplicates = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, row: dict, data: dict, done=_noop):
+        """Додає показ; повертає кількість записаних, якщо спрацював flush"""
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((row, data, done))
+            full = len(self._pending) >= self.batch_size
+        return self.flush() if full else 0
+
+    def flush_if_due(self):
+        if self._pending and time.monotonic() - self._oldest >= self.flush_seconds:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """Один INSERT + commit на пакет, потім ack. Повертає кількість вставлених"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                inserted = self._persist(batch)
+            except Exception:
+                # Повертаємо в буфер (без ack) - наступний flush спробує знову
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._oldest = time.monotonic()
+                raise
+            for _, _, done in batch:
+                done()
+            return inserted
+
+    def _persist(self, batch):
+        db = self.session_factory()
+        try:
+            if self.before_insert:
+                self.before_insert(db)
+            rows = [row for row, _, _ in batch]
+            keys = insert_ignore(db, SensorReading, rows, ["device_id", "message_id"])
+            # Без message_id (старі прошивки) - дублікатів не розпізнати, вставлено завжди
+            fresh = []
+            for row, data, _ in batch:
+                key = (row["device_id"], row.get("message_id"))
+                if key[1] is None:
+                    fresh.append((row, data))
+                elif key in keys:
+                    keys.discard(key)  # Той самий дубль двічі в пакеті - рахуємо один раз
+                    fresh.append((row, data))
+            if self.on_inserted and fresh:
+                self.on_inserted(db, fresh)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.written += len(fresh)
+        self.duplicates += len(batch) - len(fresh)
+        return len(fresh)
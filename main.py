@@ -3,12 +3,14 @@ from fastapi import FastAPI
 from dotenv import load_dotenv
 
 # Імпортуємо спільні налаштування (БД, engine) з dependencies
-from dependencies import engine, Base, get_password_hash # Переконайся, що dependencies.py створено
+from dependencies import engine, async_engine, Base, get_password_hash # Переконайся, що dependencies.py створено
 from models import User
 
 # Імпортуємо наші роутери
 from admin_logic import router as admin_router
 from business_logic import router as business_router
+from api_monitoring import setup_monitoring
+from alert_dispatch import dispatcher
 
 # Завантаження змінних оточення (якщо треба для config)
 load_dotenv()
@@ -27,6 +29,9 @@ app = FastAPI(
 app.include_router(admin_router)
 app.include_router(business_router)
 
+# Метрики (/metrics) та опційний профайлер повільних запитів
+setup_monitoring(app, engine, async_engine.sync_engine)
+
 # --- Startup Event: Створення адміна ---
 @app.on_event("startup")
 def create_initial_admin():
@@ -46,4 +51,17 @@ def create_initial_admin():
             db.commit()
             print("✅ Default Admin created (login=admin, pass=admin)")
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# --- Розсилка алертів (фоновий asyncio-цикл) ---
+@app.on_event("startup")
+def start_alert_dispatch():
+    dispatcher.start()
+
+@app.on_event("shutdown")
+def stop_alert_dispatch():
+    dispatcher.stop()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await async_engine.dispose()
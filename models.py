@@ -1,5 +1,5 @@
 # 1. ІМПОРТИ
-from sqlalchemy import Column, Integer, String, Date, Float, Text, Time, ForeignKey, DateTime, Boolean, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Date, Float, Text, Time, ForeignKey, DateTime, Boolean, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 import enum
@@ -68,6 +68,9 @@ class Enclosure(Base):
     feeding_schedules = relationship("FeedingSchedule", back_populates="enclosure")
     alerts = relationship("Alert", back_populates="enclosure")
     maintenance_logs = relationship("MaintenanceLog", back_populates="enclosure")
+    effective_climate = relationship(
+        "EnclosureClimate", back_populates="enclosure", uselist=False, cascade="all, delete-orphan"
+    )
 
 
 class Animal(Base):
@@ -98,6 +101,23 @@ class ClimateProfile(Base):
     species = relationship("Species", back_populates="climate_profiles")
 
 
+class EnclosureClimate(Base):
+    """Ефективні кліматичні норми вольєра (матеріалізовано climate_resolver)"""
+    __tablename__ = "enclosure_climate"
+
+    enclosure_id = Column(Integer, ForeignKey("enclosure.enclosure_id"), primary_key=True)
+    season = Column(String(20))
+    min_temperature = Column(Float)
+    max_temperature = Column(Float)
+    min_humidity = Column(Float)
+    lighting_schedule = Column(String(100))
+    profile_ids = Column(String(100))           # Профілі, з яких зібрано норми: "3,7"
+    has_conflict = Column(Boolean, default=False)  # Діапазони видів не перетинаються
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    enclosure = relationship("Enclosure", back_populates="effective_climate")
+
+
 class FeedingSchedule(Base):
     __tablename__ = "feeding_schedule"
 
@@ -127,6 +147,12 @@ class IoTDevice(Base):
 
 class SensorReading(Base):
     __tablename__ = "sensor_reading"
+    # Діапазонні вибірки по пристроях (history, export, /reports/climate)
+    __table_args__ = (
+        Index("ix_sensor_reading_device_ts", "device_id", "timestamp"),
+        # Повторна доставка QoS 1 -> ON CONFLICT DO NOTHING (NULL - старі прошивки / HTTP, не конфліктують)
+        UniqueConstraint("device_id", "message_id", name="uq_sensor_reading_message"),
+    )
 
     reading_id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("iot_device.device_id"))
@@ -134,6 +160,7 @@ class SensorReading(Base):
     temperature_val = Column(Float)
     humidity_val = Column(Float)
     light_val = Column(Float)
+    message_id = Column(BigInteger, nullable=True)  # seq контролера (boot << 32 | лічильник)
 
     device = relationship("IoTDevice", back_populates="sensor_readings")
 
@@ -147,10 +174,84 @@ class Alert(Base):
     alert_type = Column(String(50))
     message = Column(Text)
     status = Column(String(20), default="New")
+    # Стан дедуплікації (alert_state): пишеться лише на переходах
+    occurrences = Column(Integer, default=1)
+    last_seen = Column(DateTime, nullable=True)
+    resolved_at = Column(DateTime, nullable=True)
+    # Загальний інцидент (enclosure_id = NULL), до якого віднесено алерт
+    incident_id = Column(Integer, ForeignKey("alert.alert_id"), nullable=True, index=True)
 
     enclosure = relationship("Enclosure", back_populates="alerts")
 
 
+class DeviceEvent(Base):
+    """Події контролерів (zoo/events), напр. FEEDING_DONE -> прив'язка до розкладу"""
+    __tablename__ = "device_event"
+    __table_args__ = (UniqueConstraint("device_id", "message_id", name="uq_device_event_message"),)
+
+    event_id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("iot_device.device_id"), index=True)
+    enclosure_id = Column(Integer, ForeignKey("enclosure.enclosure_id"), nullable=True, index=True)
+    event_type = Column(String(50), nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)  # Час події на контролері (UTC)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    # Для FEEDING_DONE: найближче годування за розкладом (NULL - позапланове)
+    schedule_id = Column(Integer, ForeignKey("feeding_schedule.schedule_id", ondelete="SET NULL"), nullable=True)
+    portion_size = Column(Float, nullable=True)
+    payload = Column(Text)
+    message_id = Column(BigInteger, nullable=True)  # seq контролера: дублі доставки не пишуться
+
+    schedule = relationship("FeedingSchedule")
+
+
+class ActuatorEvent(Base):
+    """Стан механізмів контролера (heater / fan / status): лише переходи (actuator_events)"""
+    __tablename__ = "actuator_event"
+    __table_args__ = (Index("ix_actuator_event_device_ts", "device_id", "actuator", "started_at"),)
+
+    event_id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("iot_device.device_id"), nullable=False)
+    enclosure_id = Column(Integer, ForeignKey("enclosure.enclosure_id"), nullable=True, index=True)
+    actuator = Column(String(20), nullable=False)
+    state = Column(String(20), nullable=False)   # on / off для реле, heating / cooling / ... для status
+    started_at = Column(DateTime, nullable=False)  # UTC
+    # Останній показ у цьому стані (= started_at наступного стану, якщо без розриву)
+    last_seen = Column(DateTime, nullable=False)
+
+
+class FeedingDaily(Base):
+    """Денні агрегати годувань (feeding_analytics): план vs факт по вольєру та типу корму"""
+    __tablename__ = "feeding_daily"
+
+    day = Column(Date, primary_key=True)  # Місцева дата зоопарку
+    enclosure_id = Column(Integer, ForeignKey("enclosure.enclosure_id"), primary_key=True)
+    food_type = Column(String(100), primary_key=True)
+    expected_count = Column(Integer, default=0)
+    expected_portion = Column(Float, default=0.0)
+    fed_count = Column(Integer, default=0)          # FEEDING_DONE, прив'язані до розкладу
+    fed_portion = Column(Float, default=0.0)
+    unscheduled_count = Column(Integer, default=0)  # Годування поза розкладом
+    unscheduled_portion = Column(Float, default=0.0)
+    # План дня зафіксовано (минулі дні не перераховуються при зміні розкладу)
+    expected_final = Column(Boolean, default=False)
+
+
+class AlertRoute(Base):
+    """Маршрут розсилки алертів (alert_dispatch): кому, куди і які"""
+    __tablename__ = "alert_route"
+
+    route_id = Column(Integer, primary_key=True, index=True)
+    # Отримувачі: конкретний користувач АБО всі з роллю
+    user_id = Column(Integer, ForeignKey("app_user.user_id"), nullable=True)
+    role = Column(String(50), nullable=True)
+    # NULL = всі вольєри (і загальні інциденти)
+    enclosure_id = Column(Integer, ForeignKey("enclosure.enclosure_id"), nullable=True)
+    critical_only = Column(Boolean, default=True)
+    sink = Column(String(30), nullable=False, default="push")  # webhook / push
+    target = Column(String(255), nullable=True)  # URL / номер; NULL = contact_info користувача
+    is_active = Column(Boolean, default=True)
+
+
 class MaintenanceLog(Base):
     __tablename__ = "maintenance_log"
 
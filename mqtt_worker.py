@@ -1,9 +1,11 @@
 import json
+import re
+import signal
+import threading
 import time
 import sys
 import os
 from datetime import datetime, timedelta, timezone 
-import paho.mqtt.client as mqtt
 from sqlalchemy import delete
 
 # --- Налаштування шляхів (щоб бачити dependencies.py) ---
@@ -13,20 +15,68 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 from dependencies import SessionLocal
-from models import SensorReading, IoTDevice, Animal, ClimateProfile, Alert, Enclosure, Species
+from models import SensorReading, IoTDevice
+from metrics import Counter, Histogram, start_metrics_server
+from anomaly_detection import StreamingDetector
+from alert_rules import evaluate_reading, record_violations, measured_channels, Violation, TEMP_CRITICAL_MARGIN
+from alert_state import alert_state
+from alert_dispatch import dispatcher, submit_device_alert, device_alert_type
+from device_events import EventBuffer
+from actuator_events import actuator_tracker, read_states, payload_time
+from device_config import ConfigPublisher, CONFIG_PUBLISH_SECONDS
+from feeding_analytics import sync_expected, FEEDING_SYNC_SECONDS
+from ingest import TelemetryBuffer, OrderedAcks, ACK_WINDOW
+from transport import BrokerSettings, create_transport
 
 # --- КОНФІГУРАЦІЯ ---
-MQTT_BROKER = "broker.hivemq.com"
-MQTT_PORT = 1883
+# Брокер - з env MQTT_* (transport.py; за замовчуванням локальний, MQTT_HOST=loopback - у пам'яті).
+# client_id сталий і сесія persistent - брокер тримає непідтверджені на час рестарту воркера
+BROKER = BrokerSettings.from_env(client_id=os.getenv("WORKER_CLIENT_ID", "zoo-mqtt-worker"),
+                                 clean_session=False)
+MQTT_QOS = 1  # At-least-once: persistent session + ack після commit (ingest.py)
 MQTT_TOPIC = "zoo/telemetry"
+ALERTS_TOPIC = "zoo/alerts"  # Алерти контролерів -> машина станів алертів -> розсилка
+EVENTS_TOPIC = "zoo/events"  # Події контролерів (FEEDING_DONE) -> device_event пакетами
 
 # Словник для відстеження часу останнього запису кожного пристрою
 # Format: {device_id: last_save_timestamp}
 last_save_time = {}
 
 SAVE_INTERVAL_SECONDS = 180 # 3 хвилини
+# Report-by-exception (ІоТ/reporting.py): зміни пишуться одразу, повз throttle.
+# Періодичні payload без reason і heartbeat - не частіше SAVE_INTERVAL_SECONDS.
+EXCEPTION_REASONS = {"startup", "state", "delta", "alert"}
 DATA_RETENTION_HOURS = 24   # Зберігати дані за 24 години
-ALERT_THRESHOLD = 5.0       # Поріг відхилення для алерту (градуси)
+CLEANUP_SECONDS = 60        # Очищення - не частіше (раніше - на кожен запис)
+MAX_CLOCK_SKEW_SECONDS = 300  # timestamp контролера з майбутнього далі за це - не довіряємо
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))  # 0 = вимкнено
+# Throttle, детектор аномалій, серії реле і стан алертів переживають рестарт
+STATE_PATH = os.getenv("WORKER_STATE_PATH", "worker_state.json")
+SNAPSHOT_SECONDS = 30       # Падіння процесу втрачає не більше за цей інтервал стану
+STATE_VERSION = 2           # 2: вікна детектора аномалій у секундах (same_since, flat_since)
+
+# --- МЕТРИКИ (GET http://127.0.0.1:9101/metrics) ---
+STAGE_SECONDS = Histogram(
+    "mqtt_worker_stage_seconds", "Time per processing stage", ("stage",)
+)
+MESSAGES_TOTAL = Counter(
+    "mqtt_worker_messages_total", "Messages by topic and outcome", ("topic", "outcome")
+)
+BUSY_SECONDS = Counter(
+    "mqtt_worker_busy_seconds_total", "Time spent inside on_message (rate ~ 1.0 = saturated)"
+)
+LAG_SECONDS = Histogram(
+    "mqtt_worker_lag_seconds", "Delay from payload timestamp to received/committed", ("point",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+ALERTS_TOTAL = Counter("mqtt_worker_alerts_total", "Alerts created", ("alert_type",))
+
+
+def observe_lag(data: dict, point: str):
+    """Затримка від timestamp у payload (час контролера) до поточного моменту"""
+    sent_at = data.get("timestamp")
+    if isinstance(sent_at, (int, float)):
+        LAG_SECONDS.observe(max(0.0, time.time() - sent_at), point=point)
 
 def clean_old_data(db_session):
     """Видаляє записи, старіші за DATA_RETENTION_HOURS."""
@@ -42,162 +92,474 @@ def clean_old_data(db_session):
     except Exception as e:
         print(f"⚠️ Cleanup Error: {e}")
 
-def check_and_create_alert(db_session, device_id, current_temp):
-    """
-    Перевіряє, чи виходить температура за межі норми.
-    Якщо так - створює запис в таблиці Alert.
-    """
+# Потоковий детектор аномалій: бачить КОЖНЕ повідомлення (до throttle)
+detector = StreamingDetector()
+
+def create_alerts(db_session, enclosure_id, violations, channels=()):
+    """Передає порушення в машину станів алертів (alert_state). Commit - на стороні викликача."""
+    created = record_violations(db_session, enclosure_id, violations, channels)
+    for alert in created:
+        print(f"🚨 [ALERT] {alert.message}")
+        ALERTS_TOTAL.inc(alert_type=alert.alert_type)
+    return created
+
+def check_anomalies(device_id, data: dict):
+    """Прогоняє вимір через детектор; при аномалії - записує алерт"""
+    sent_at = data.get("timestamp")
+    ts = sent_at if isinstance(sent_at, (int, float)) else time.time()
+    anomalies = detector.update(device_id, ts, temperature=data.get("temp"), humidity=data.get("hum"))
+    if not anomalies:
+        return
+
+    db = SessionLocal()
     try:
-        # 1. Знаходимо пристрій та його вольєр
-        device = db_session.query(IoTDevice).filter(IoTDevice.device_id == device_id).first()
+        device = db.query(IoTDevice).filter(IoTDevice.device_id == device_id).first()
         if not device or not device.enclosure_id:
             return
+        create_alerts(db, device.enclosure_id, [
+            Violation(anomaly.alert_type, False, f"Device {device_id}: {anomaly.message}")
+            for anomaly in anomalies
+        ])
+        db.commit()
+    except Exception as e:
+        print(f"⚠️ Anomaly Check Error: {e}")
+        db.rollback()
+    finally:
+        db.close()
 
-        # 2. Знаходимо тварину у цьому вольєрі -> її вид -> кліматичний профіль
-        # (Використовуємо join для ефективності)
-        # SELECT min_temp, max_temp FROM ...
-        result = db_session.query(ClimateProfile.min_temperature, ClimateProfile.max_temperature)\
-            .join(Species, ClimateProfile.species_id == Species.species_id)\
-            .join(Animal, Species.species_id == Animal.species_id)\
-            .filter(Animal.enclosure_id == device.enclosure_id)\
-            .first()
+def check_and_create_alert(db_session, device_id, data: dict, enclosure_id=None, reading_ts=None):
+    """
+    Перевіряє показ за правилами вольєра (температура, вологість, освітленість).
+    Якщо є порушення - створює записи в таблиці Alert.
+    reading_ts - час показу (UTC); за замовчуванням - з payload.
+    """
+    try:
+        # 1. Знаходимо вольєр пристрою (пакетний запис передає його готовим)
+        if enclosure_id is None:
+            enclosure_id = db_session.query(IoTDevice.enclosure_id)\
+                .filter(IoTDevice.device_id == device_id).scalar()
+        if not enclosure_id:
+            return
 
-        if not result:
-            return # Немає норм - немає алертів
+        # 2. Правила вольєра (скомпільовані з ClimateProfile, без запитів на кожен показ)
+        violations = evaluate_reading(
+            db_session, enclosure_id,
+            temperature=data.get("temp"), humidity=data.get("hum"), light=data.get("light"),
+            now=reading_ts or reading_time(data, time.time())
+        )
 
-        min_temp, max_temp = result
-        
-        # 3. Перевірка на відхилення
-        alert_msg = None
-        alert_type = None
-        
-        if current_temp < (min_temp - ALERT_THRESHOLD):
-            diff = round(min_temp - current_temp, 1)
-            alert_type = "Critical Low Temp"
-            alert_msg = f"Температура {current_temp}°C нижче норми на {diff}°C (Min: {min_temp}°C)"
-            
-        elif current_temp > (max_temp + ALERT_THRESHOLD):
-            diff = round(current_temp - max_temp, 1)
-            alert_type = "Critical High Temp"
-            alert_msg = f"Температура {current_temp}°C вище норми на {diff}°C (Max: {max_temp}°C)"
-
-        # 4. Якщо є проблема - записуємо в БД та консоль
-        if alert_msg: 
-            # Перевіряємо, чи не було такого ж алерту за останні 10 хвилин (щоб не спамити)
-            last_alert = db_session.query(Alert)\
-                .filter(Alert.enclosure_id == device.enclosure_id)\
-                .filter(Alert.status == "New")\
-                .order_by(Alert.timestamp.desc())\
-                .first()
-            
-            now_utc = datetime.now(timezone.utc).replace(tzinfo=None) # Приводимо до naive для порівняння з БД
-            
-            # Якщо останній алерт був недавно і про те саме - пропускаємо
-            if last_alert and last_alert.alert_type == alert_type and \
-               (now_utc - last_alert.timestamp).total_seconds() < 600:
-                return
-
-            print(f"🚨 [ALERT] {alert_msg}")
-            
-            new_alert = Alert(
-                enclosure_id=device.enclosure_id,
-                alert_type=alert_type,
-                message=alert_msg,
-                status="New",
-                timestamp=now_utc
-            )
-            db_session.add(new_alert)
-            db_session.commit()
+        # 3. Переходи станів (нові / ескальовані / закриті алерти) - в БД та консоль
+        channels = measured_channels(data.get("temp"), data.get("hum"), data.get("light"))
+        create_alerts(db_session, enclosure_id, violations, channels)
 
     except Exception as e:
         print(f"⚠️ Alert Check Error: {e}")
 
-def save_to_db(data: dict):
-    """
-    Зберігає дані, якщо пройшло достатньо часу з останнього запису.
-    Також запускає очищення старих даних та перевірку алертів.
-    """
-    global last_save_time
-    
-    # 1. Отримуємо ID пристрою з повідомлення
-    aviary_str = str(data.get("aviary_id", "1"))
+def parse_device_id(data: dict) -> int:
+    """'AV_003' -> 3 (як у контролері)"""
+    digits = re.findall(r'\d+', str(data.get("aviary_id", "1")))
+    return int(digits[0]) if digits else 1
+
+def handle_device_alert(data: dict, done=None):
+    """zoo/alerts: алерт контролера одразу в алерт-пайплайн (без throttle); ack - після commit"""
+    device_id = parse_device_id(data)
+    level = str(data.get("level", "WARNING")).upper()
+    sent_at = data.get("timestamp")
+    violation = Violation(
+        device_alert_type(level), level == "CRITICAL", f"Device {device_id}: {data.get('msg', '')}",
+        source="device", detected_at=sent_at if isinstance(sent_at, (int, float)) else None
+    )
+
+    db = SessionLocal()
     try:
-        import re
-        digits = re.findall(r'\d+', aviary_str)
-        device_id = int(digits[0]) if digits else 1
-    except:
-        device_id = 1
-
-    # 2. Перевірка інтервалу (Throttle)
-    current_time = time.time()
-    last_time = last_save_time.get(device_id, 0)
-    
-    if current_time - last_time < SAVE_INTERVAL_SECONDS:
+        enclosure_id = db.query(IoTDevice.enclosure_id).filter(IoTDevice.device_id == device_id).scalar()
+        if enclosure_id is None:
+            # Пристрій без вольєра: тільки розсилка, без запису
+            submit_device_alert(data)
+        else:
+            # Та сама дедуплікація/шторм/розсилка, що й для серверних алертів
+            create_alerts(db, enclosure_id, [violation])
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if done:
+        done()
+    print(f"📣 [DEVICE ALERT] {violation.message}")
+    MESSAGES_TOTAL.inc(topic=ALERTS_TOPIC, outcome="processed")
+
+# Події пишуться пакетами (EVENT_BATCH_SIZE або кожні EVENT_FLUSH_SECONDS)
+event_buffer = EventBuffer(SessionLocal, parse_device_id)
+acks = OrderedAcks()
+
+def handle_device_event(data: dict, done=None):
+    """zoo/events: у буфер; запис - пакетом, ack - після його commit"""
+    with STAGE_SECONDS.time(stage="event_buffer"):
+        written = event_buffer.add(data, done)
+    MESSAGES_TOTAL.inc(topic=EVENTS_TOPIC, outcome="buffered")
+    if written:
+        print(f"🗂️ [EVENTS] Saved batch of {written} events")
+
+def flush_buffers(force=False):
+    """Записує неповні пакети (force - всі, інакше - лише ті, що чекають довше свого flush_seconds)"""
+    with STAGE_SECONDS.time(stage="telemetry_flush"):
+        saved = telemetry_buffer.flush() if force else telemetry_buffer.flush_if_due()
+    with STAGE_SECONDS.time(stage="event_flush"):
+        written = event_buffer.flush() if force else event_buffer.flush_if_due()
+    if written:
+        print(f"🗂️ [EVENTS] Saved batch of {written} events")
+    return saved + written
+
+def flush_buffers_periodically(interval=0.05):
+    """Фоновий потік: пакети телеметрії та подій, що чекають довше свого flush_seconds"""
+    while True:
+        time.sleep(interval)
+        try:
+            flush_buffers()
+        except Exception as e:
+            print(f"⚠️ Flush Error: {e}")
+
+def record_actuators(device_id, data: dict):
+    """Стан heater/fan/status: у БД лише переходи та рідкий heartbeat (на кожному повідомленні)"""
+    states = read_states(data)
+    ts = payload_time(data)
+    if not states or not actuator_tracker.due(device_id, states, ts):
         return
 
-    # 3. Збереження в БД
     db = SessionLocal()
     try:
-        # Спочатку почистимо старі дані
-        clean_old_data(db)
-
-        current_temp = float(data.get("temp"))
-
-        # Створюємо новий запис
-        record = SensorReading(
-            device_id=device_id,
-            temperature_val=current_temp,
-            humidity_val=data.get("hum"),
-            light_val=0.0,
-            timestamp=datetime.now(timezone.utc).replace(tzinfo=None)
-        )
-        
-        db.add(record)
-        
-        # --- ПЕРЕВІРКА НА АЛЕРТИ ---
-        check_and_create_alert(db, device_id, current_temp)
-        
+        enclosure_id = db.query(IoTDevice.enclosure_id).filter(IoTDevice.device_id == device_id).scalar()
+        changes = actuator_tracker.record(db, device_id, enclosure_id, states, ts)
         db.commit()
-        
-        # Оновлюємо час останнього запису
-        last_save_time[device_id] = current_time
-        print(f"💾 [DB SAVED] Device {device_id}: T={current_temp}°C (Next save in {SAVE_INTERVAL_SECONDS}s)")
-        
     except Exception as e:
-        print(f"❌ DB Save Error: {e}")
+        print(f"⚠️ Actuator Save Error: {e}")
         db.rollback()
+        actuator_tracker.reset()  # Кеш міг розійтися з БД - перечитаємо
+        return
     finally:
         db.close()
+    for actuator, old, new in changes:
+        print(f"🔁 [ACTUATOR] Device {device_id}: {actuator} {old} -> {new}")
+
+def reading_time(data: dict, now: float):
+    """
+    Час показу: timestamp контролера, якщо правдоподібний (повторна доставка після обриву
+    приходить із запізненням), інакше - час отримання (годинник контролера не синхронізовано).
+    """
+    sent_at = data.get("timestamp")
+    if (isinstance(sent_at, (int, float))
+            and now - DATA_RETENTION_HOURS * 3600 < sent_at < now + MAX_CLOCK_SKEW_SECONDS):
+        now = min(sent_at, now)
+    return datetime.fromtimestamp(now, timezone.utc).replace(tzinfo=None)
+
+def save_to_db(data: dict, done=None):
+    """
+    Ставить показ у пакетний запис, якщо пройшло достатньо часу з останнього запису.
+    Перевірка алертів і ack - після запису пакета (TelemetryBuffer).
+    """
+    global last_save_time
+    
+    # 1. Отримуємо ID пристрою з повідомлення
+    with STAGE_SECONDS.time(stage="device_resolution"):
+        device_id = parse_device_id(data)
+
+    # 2. Детектор аномалій (на кожному повідомленні, до throttle)
+    with STAGE_SECONDS.time(stage="anomaly_check"):
+        check_anomalies(device_id, data)
+
+    # 3. Стан механізмів (теж до throttle, інакше переходи губляться)
+    with STAGE_SECONDS.time(stage="actuators"):
+        record_actuators(device_id, data)
+
+    # 4. Перевірка інтервалу (Throttle)
+    with STAGE_SECONDS.time(stage="throttle"):
+        current_time = time.time()
+        last_time = last_save_time.get(device_id, 0)
+        throttled = (data.get("reason") not in EXCEPTION_REASONS
+                     and current_time - last_time < SAVE_INTERVAL_SECONDS)
+
+    if throttled:
+        MESSAGES_TOTAL.inc(topic=MQTT_TOPIC, outcome="throttled")
+        if done:
+            done()
+        return
+
+    # None - датчик не відповідає: теж пишемо, щоб попередній показ не "тягнувся" далі (LOCF)
+    current_temp = data.get("temp")
+    if current_temp is not None:
+        current_temp = float(current_temp)
+    seq = data.get("seq")
+
+    # 5. У пакет (запис - при заповненні або за TELEMETRY_FLUSH_SECONDS)
+    row = {
+        "device_id": device_id,
+        "temperature_val": current_temp,
+        "humidity_val": data.get("hum"),
+        "light_val": data.get("light"),  # None - датчика освітленості немає
+        "timestamp": reading_time(data, current_time),
+        "message_id": seq if isinstance(seq, int) and not isinstance(seq, bool) else None,
+    }
+    last_save_time[device_id] = current_time
+    with STAGE_SECONDS.time(stage="telemetry_buffer"):
+        telemetry_buffer.add(row, data, done or _noop)
+
+def _noop():
+    pass
+
+_last_cleanup = [0.0]
+
+def cleanup_if_due(db_session):
+    """Очищення старих даних - не частіше за CLEANUP_SECONDS (перед записом пакета)"""
+    if time.time() - _last_cleanup[0] >= CLEANUP_SECONDS:
+        _last_cleanup[0] = time.time()
+        with STAGE_SECONDS.time(stage="cleanup"):
+            clean_old_data(db_session)
+
+def on_readings_inserted(db_session, fresh):
+    """Нові (не дублікати) показання пакета: перевірка алертів у тій самій транзакції"""
+    device_ids = {row["device_id"] for row, _ in fresh}
+    enclosures = dict(db_session.query(IoTDevice.device_id, IoTDevice.enclosure_id)
+                      .filter(IoTDevice.device_id.in_(device_ids)).all())
+    with STAGE_SECONDS.time(stage="alert_check"):
+        for row, data in fresh:
+            enclosure_id = enclosures.get(row["device_id"])
+            if enclosure_id:
+                check_and_create_alert(db_session, row["device_id"], data, enclosure_id, row["timestamp"])
+    for _, data in fresh:
+        observe_lag(data, "committed")
+    MESSAGES_TOTAL.inc(len(fresh), topic=MQTT_TOPIC, outcome="saved")
+    print(f"💾 [DB SAVED] {len(fresh)} readings from {len(device_ids)} devices "
+          f"(Next save in {SAVE_INTERVAL_SECONDS}s)")
+
+telemetry_buffer = TelemetryBuffer(SessionLocal, on_inserted=on_readings_inserted,
+                                   before_insert=cleanup_if_due)
+
+def publish_configs_periodically(client, interval=CONFIG_PUBLISH_SECONDS):
+    """Фоновий потік: retained-конфіги контролерам (zoo/config/AV_XXX), лише змінені"""
+    publisher = ConfigPublisher(lambda topic, payload: client.publish(topic, payload, qos=1, retain=True))
+    while True:
+        db = SessionLocal()
+        try:
+            published = publisher.publish_changed(db)
+            if published:
+                print(f"📤 [CONFIG] Published {published} device configs")
+        except Exception as e:
+            print(f"⚠️ Config Publish Error: {e}")
+        finally:
+            db.close()
+        time.sleep(interval)
+
+def sync_feeding_plan_periodically(interval=FEEDING_SYNC_SECONDS):
+    """Фоновий потік: план годувань у feeding_daily (слоти, що настали; новий день) - звіти API лише читають"""
+    while not shutting_down.is_set():
+        db = SessionLocal()
+        try:
+            sync_expected(db)
+        except Exception as e:
+            print(f"⚠️ Feeding Plan Sync Error: {e}")
+            db.rollback()
+        finally:
+            db.close()
+        shutting_down.wait(interval)
 
 # --- MQTT CALLBACKS ---
 
+# Топік -> обробник розпарсеного JSON
+TOPIC_HANDLERS = {
+    MQTT_TOPIC: save_to_db,
+    ALERTS_TOPIC: handle_device_alert,
+    EVENTS_TOPIC: handle_device_event,
+}
+
 def on_connect(client, userdata, flags, rc, properties=None):
-    print(f"✅ Connected to MQTT Broker ({MQTT_BROKER}) with code {rc}")
-    client.subscribe(MQTT_TOPIC)
-    print(f"👂 Listening on topic: {MQTT_TOPIC}")
+    print(f"✅ Connected to MQTT Broker ({BROKER}) with code {rc}")
+    for topic in TOPIC_HANDLERS:
+        client.subscribe(topic, qos=MQTT_QOS)
+    print(f"👂 Listening on topics: {', '.join(TOPIC_HANDLERS)}")
 
 def on_message(client, userdata, msg):
+    if shutting_down.is_set():
+        return  # Без ack: після рестарту брокер доставить знову (persistent session)
+    started = time.perf_counter()
+    # PUBACK - коли обробник викличе done() (після commit), у порядку отримання
+    done = acks.track(client, msg)
     try:
-        payload = msg.payload.decode()
-        data = json.loads(payload)
-        save_to_db(data)
+        with STAGE_SECONDS.time(stage="decode"):
+            payload = msg.payload.decode()
+            data = json.loads(payload)
     except Exception as e:
+        # Битий payload - відкидаємо (і підтверджуємо: повтор нічого не змінить)
         print(f"⚠️ Message Error: {e}")
+        MESSAGES_TOTAL.inc(topic=msg.topic, outcome="dropped")
+        done()
+        BUSY_SECONDS.inc(time.perf_counter() - started)
+        return
+
+    handler = TOPIC_HANDLERS.get(msg.topic)
+    if handler is None:
+        MESSAGES_TOTAL.inc(topic=msg.topic, outcome="unrouted")
+        done()
+        BUSY_SECONDS.inc(time.perf_counter() - started)
+        return
+
+    observe_lag(data, "received")
+    try:
+        handler(data, done)
+    except Exception as e:
+        # Не підтверджене повідомлення тримало б усю чергу ack - підтверджуємо і логуємо
+        print(f"⚠️ Message Error: {e}")
+        MESSAGES_TOTAL.inc(topic=msg.topic, outcome="error")
+        done()
+    finally:
+        # Брокер не надішле більше за max_inflight непідтверджених - не чекаємо таймера
+        if len(acks) >= ACK_WINDOW:
+            try:
+                flush_buffers(force=True)
+            except Exception as e:
+                print(f"⚠️ Flush Error: {e}")
+        BUSY_SECONDS.inc(time.perf_counter() - started)
+
+def on_disconnect(client, userdata, flags, reason_code, properties):
+    # Непідтверджені брокер доставить знову в новій сесії (clean_session=False)
+    acks.clear()
+    print(f"⚠️ Disconnected from MQTT Broker: {reason_code}")
+
+# --- СТАН ТА ЗУПИНКА ---
+
+shutting_down = threading.Event()   # Сигнал отримано: нові повідомлення не приймаються
+shutdown_done = threading.Event()   # Буфери дописані, стан збережено
+
+def save_state(path=STATE_PATH):
+    """Знімок стану в файл (через тимчасовий: падіння під час запису не лишає битий файл)"""
+    snapshot = {
+        "version": STATE_VERSION,
+        "saved_at": time.time(),
+        "last_save_time": {str(device_id): ts for device_id, ts in list(last_save_time.items())},
+        "detector": detector.snapshot(),
+        "actuators": actuator_tracker.snapshot(),
+        "alerts": alert_state.snapshot(),
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def load_state(path=STATE_PATH):
+    """Відновлення при старті. Немає / битий / інша версія файлу - старт з чистого стану"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as e:
+        print(f"⚠️ State file {path} unreadable: {e}")
+        return False
+    if snapshot.get("version") != STATE_VERSION:
+        print(f"⚠️ State file {path}: unsupported version {snapshot.get('version')}")
+        return False
+    try:
+        last_save_time.update({int(device_id): ts for device_id, ts in snapshot["last_save_time"].items()})
+        detector.restore(snapshot["detector"])
+        actuator_tracker.restore(snapshot["actuators"])
+        alerts = alert_state.restore(snapshot["alerts"])
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"⚠️ State file {path} corrupted: {e}")
+        last_save_time.clear()
+        detector.reset()
+        actuator_tracker.reset()
+        alert_state.reset()
+        return False
+    age = time.time() - snapshot["saved_at"]
+    print(f"♻️ [STATE] Restored {len(last_save_time)} devices, {len(detector)} detector channels, "
+          f"{alerts} active alerts (snapshot {age:.0f}s old)")
+    return True
+
+def save_state_periodically(interval=SNAPSHOT_SECONDS):
+    """Фоновий потік: знімок стану на випадок падіння (kill -9, OOM)"""
+    while not shutting_down.wait(interval):
+        try:
+            save_state()
+        except Exception as e:
+            print(f"⚠️ State Save Error: {e}")
+
+def flush_actuators():
+    """last_seen серій реле, що лишились у пам'яті - в БД"""
+    db = SessionLocal()
+    try:
+        actuator_tracker.flush(db)
+        db.commit()
+    finally:
+        db.close()
+
+def shutdown(transport, reason, attempts=3):
+    """
+    Зупинка без втрат: нові повідомлення не приймаються (без ack - брокер їх збереже),
+    буфери дописуються й підтверджуються, черга розсилки доставляється, стан - у файл.
+    """
+    print(f"\n🛑 Shutting down ({reason}): draining buffers...")
+    for attempt in range(1, attempts + 1):
+        try:
+            saved = flush_buffers(force=True)
+            flush_actuators()
+            print(f"💾 [SHUTDOWN] Flushed {saved} buffered messages")
+            break
+        except Exception as e:
+            # Незаписане лишається непідтвердженим - брокер доставить після рестарту
+            print(f"⚠️ Shutdown Flush Error (attempt {attempt}/{attempts}): {e}")
+            time.sleep(1.0)
+    dispatcher.stop()
+    try:
+        save_state()
+        print(f"📝 [STATE] Saved to {STATE_PATH}")
+    except Exception as e:
+        print(f"⚠️ State Save Error: {e}")
+    shutdown_done.set()
+    transport.stop()
+
+def install_signal_handlers(transport):
+    """SIGTERM (systemd, docker stop) і SIGINT - зупинка з дописуванням; повторний SIGINT - одразу"""
+    def handle(signum, frame):
+        if shutting_down.is_set():
+            raise KeyboardInterrupt
+        shutting_down.set()
+        # Не в обробнику сигналу: flush чекає на БД і на мережевий потік (ack)
+        threading.Thread(target=shutdown, args=(transport, signal.Signals(signum).name),
+                         name="shutdown").start()
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
 
 # --- ЗАПУСК ---
 
 if __name__ == "__main__":
     print("🚀 Starting MQTT Worker (Logger & Alert System)...")
-    print(f"⚙️  Policy: Save every {SAVE_INTERVAL_SECONDS}s, Keep {DATA_RETENTION_HOURS}h, Alert diff: {ALERT_THRESHOLD}°C")
+    print(f"⚙️  Policy: Save every {SAVE_INTERVAL_SECONDS}s, Keep {DATA_RETENTION_HOURS}h, Critical margin: {TEMP_CRITICAL_MARGIN}°C")
+
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+        print(f"📈 Metrics: http://127.0.0.1:{METRICS_PORT}/metrics")
     
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-    client.on_connect = on_connect
-    client.on_message = on_message
+    # Стан попереднього запуску: без хвилі записів від усіх пристроїв одразу
+    load_state()
+    dispatcher.start()
+    threading.Thread(target=flush_buffers_periodically, name="buffer-flush", daemon=True).start()
+    threading.Thread(target=save_state_periodically, name="state-snapshot", daemon=True).start()
+    threading.Thread(target=sync_feeding_plan_periodically, name="feeding-plan", daemon=True).start()
+    # Ручний ack: повідомлення, не записані до падіння, брокер доставить знову
+    transport = create_transport(BROKER, on_connect=on_connect, on_message=on_message,
+                                 on_disconnect=on_disconnect, manual_ack=True)
+    install_signal_handlers(transport)
     
     try:
-        client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        client.loop_forever()
+        threading.Thread(target=publish_configs_periodically, args=(transport,), name="config-publish",
+                         daemon=True).start()
+        # Обрив / недоступний брокер - перепідключення з backoff, воркер не падає
+        transport.run_forever()
+        # Повертається після shutdown()
+        shutdown_done.wait()
+        print("🛑 Worker stopped.")
     except KeyboardInterrupt:
-        print("\n🛑 Worker stopped.")
+        print("\n🛑 Worker stopped (forced, buffers not drained).")
     except Exception as e:
         print(f"❌ Critical Error: {e}")
\ No newline at end of file
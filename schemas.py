@@ -129,6 +129,22 @@ class ClimateProfileUpdate(BaseModel):
         from_attributes = True
 
 
+class EffectiveClimateResponse(BaseModel):
+    """Ефективні норми вольєра (сезон + всі види)"""
+    enclosure_id: int
+    season: Optional[str] = None
+    min_temperature: Optional[float] = None
+    max_temperature: Optional[float] = None
+    min_humidity: Optional[float] = None
+    lighting_schedule: Optional[str] = None
+    profile_ids: Optional[str] = None
+    has_conflict: bool = False
+    computed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 # Базова схема для FeedingSchedule
 class FeedingScheduleBase(BaseModel):
     enclosure_id: int
@@ -204,7 +220,7 @@ class SensorReadingUpdate(BaseModel):
 
 # Базова схема для Alert
 class AlertBase(BaseModel):
-    enclosure_id: int
+    enclosure_id: Optional[int] = None  # None - загальний інцидент
     alert_type: Optional[str] = None
     message: Optional[str] = None
     status: Optional[str] = "New"
@@ -215,6 +231,10 @@ class AlertCreate(AlertBase):
 class AlertResponse(AlertBase):
     alert_id: int
     timestamp: datetime
+    occurrences: Optional[int] = 1
+    last_seen: Optional[datetime] = None
+    resolved_at: Optional[datetime] = None
+    incident_id: Optional[int] = None
 
 class AlertUpdate(BaseModel):
     status: Optional[str] = None
@@ -225,6 +245,26 @@ class AlertUpdate(BaseModel):
         from_attributes = True
 
 
+# Маршрут розсилки алертів (alert_dispatch)
+class AlertRouteBase(BaseModel):
+    user_id: Optional[int] = None
+    role: Optional[str] = None
+    enclosure_id: Optional[int] = None  # None - всі вольєри
+    critical_only: bool = True
+    sink: str = "push"
+    target: Optional[str] = None  # None - contact_info користувача
+    is_active: bool = True
+
+class AlertRouteCreate(AlertRouteBase):
+    pass
+
+class AlertRouteResponse(AlertRouteBase):
+    route_id: int
+
+    class Config:
+        from_attributes = True
+
+
 # Базова схема для MaintenanceLog
 class MaintenanceLogBase(BaseModel):
     user_id: int
@@ -276,9 +316,14 @@ class TelemetryData(BaseModel):
     mac_address: str
     temperature: float
     humidity: float
-    light: Optional[float] = 0.0
+    light: Optional[float] = None  # None = датчика освітленості немає
+    # Стан механізмів (як у MQTT-телеметрії); в БД - лише переходи
+    heater: Optional[bool] = None
+    fan: Optional[bool] = None
+    status: Optional[str] = None
 
 class SyncConfigResponse(BaseModel):
     target_temperature_min: float
     target_temperature_max: float
-    feeding_schedule: List[dict]
\ No newline at end of file
+    feeding_schedule: List[dict]
+    version: str  # Хеш вмісту (device_config.config_version)
\ No newline at end of file
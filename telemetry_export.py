@@ -0,0 +1,308 @@
+"""
+Потокове вивантаження історії датчиків (sensor_reading) для аналітиків.
+
+Дані читаються серверним курсором порціями по chunk_size рядків і одразу
+кодуються у вихідний формат, тому пам'ять обмежена розміром однієї порції
+незалежно від довжини діапазону.
+
+Формати: CSV (завжди), Arrow IPC stream та Parquet (якщо встановлено pyarrow).
+
+Запуск з консолі:
+    python telemetry_export.py --enclosure 1 --enclosure 2 \
+        --start 2025-01-01 --end 2025-04-01 --format parquet -o history.parquet
+    python telemetry_export.py --enclosure 1 --benchmark
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import SensorReading, IoTDevice
+
+# pyarrow - опціональна залежність (тільки для Arrow/Parquet)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    pa = None
+    pq = None
+    HAS_PYARROW = False
+
+DEFAULT_CHUNK_SIZE = 10_000
+MAX_CHUNK_SIZE = 100_000
+
+EXPORT_COLUMNS = (
+    "reading_id", "enclosure_id", "device_id", "timestamp",
+    "temperature_val", "humidity_val", "light_val",
+)
+
+# Формат -> (media type, розширення файлу)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def available_formats() -> List[str]:
+    if HAS_PYARROW:
+        return list(EXPORT_FORMATS)
+    return ["csv"]
+
+
+# ==============================================================================
+# 1. ЧИТАННЯ (серверний курсор)
+# ==============================================================================
+
+def build_export_query(
+    enclosure_ids: Sequence[int],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """SELECT тих самих полів, що й history, але для кількох вольєрів одразу"""
+    stmt = select(
+        SensorReading.reading_id,
+        IoTDevice.enclosure_id,
+        SensorReading.device_id,
+        SensorReading.timestamp,
+        SensorReading.temperature_val,
+        SensorReading.humidity_val,
+        SensorReading.light_val,
+    ).join(IoTDevice, SensorReading.device_id == IoTDevice.device_id)
+
+    if enclosure_ids:
+        stmt = stmt.where(IoTDevice.enclosure_id.in_(list(enclosure_ids)))
+    # Фільтри такі ж, як у GET /telemetry/history/{enclosure_id}
+    if start:
+        stmt = stmt.where(SensorReading.timestamp >= start)
+    if end:
+        stmt = stmt.where(SensorReading.timestamp <= end)
+
+    return stmt.order_by(IoTDevice.enclosure_id, SensorReading.timestamp)
+
+
+def iter_reading_chunks(
+    db: Session,
+    enclosure_ids: Sequence[int],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[list]:
+    """
+    Повертає порції рядків (списки tuple).
+    stream_results=True -> psycopg2 використовує іменований (серверний) курсор,
+    тож PostgreSQL віддає дані частинами, а не весь результат одразу.
+    """
+    stmt = build_export_query(enclosure_ids, start, end).execution_options(
+        stream_results=True, yield_per=chunk_size
+    )
+    result = db.execute(stmt)
+    try:
+        for part in result.partitions(chunk_size):
+            yield [tuple(row) for row in part]
+    finally:
+        result.close()
+
+
+def _to_columns(rows: list) -> dict:
+    """Рядки -> колонки (для Arrow)"""
+    columns = list(zip(*rows)) if rows else [()] * len(EXPORT_COLUMNS)
+    return {name: list(col) for name, col in zip(EXPORT_COLUMNS, columns)}
+
+
+# ==============================================================================
+# 2. КОДУВАННЯ
+# ==============================================================================
+
+def encode_csv(chunks: Iterable[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue().encode("utf-8")
+
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate(0)
+        for row in rows:
+            ts = row[3]
+            writer.writerow(row[:3] + (ts.isoformat() if ts else "",) + row[4:])
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _arrow_schema():
+    return pa.schema([
+        ("reading_id", pa.int64()),
+        ("enclosure_id", pa.int64()),
+        ("device_id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("temperature_val", pa.float64()),
+        ("humidity_val", pa.float64()),
+        ("light_val", pa.float64()),
+    ])
+
+
+class _ChunkSink:
+    """
+    Файлоподібний буфер для pyarrow, який можна спорожнювати після кожної порції.
+    tell() рахує всі записані байти - Parquet використовує його для зміщень.
+    """
+    def __init__(self):
+        self._parts = []
+        self._written = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def encode_arrow(chunks: Iterable[list]) -> Iterator[bytes]:
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    for rows in chunks:
+        writer.write_batch(pa.RecordBatch.from_pydict(_to_columns(rows), schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def encode_parquet(chunks: Iterable[list]) -> Iterator[bytes]:
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    # Одна порція = одна row group, тож у пам'яті ніколи не більше chunk_size рядків
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for rows in chunks:
+        writer.write_table(pa.Table.from_pydict(_to_columns(rows), schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(
+    db: Session,
+    enclosure_ids: Sequence[int],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    fmt: str = "csv",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """Головна функція: БД -> порції -> байти вибраного формату"""
+    if fmt not in available_formats():
+        raise ValueError(f"Unsupported export format: {fmt}. Available: {available_formats()}")
+
+    chunks = iter_reading_chunks(db, enclosure_ids, start, end, chunk_size)
+    if fmt == "arrow":
+        return encode_arrow(chunks)
+    if fmt == "parquet":
+        return encode_parquet(chunks)
+    return encode_csv(chunks)
+
+
+# ==============================================================================
+# 3. CLI
+# ==============================================================================
+
+def _parse_dt(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def run_export(args) -> dict:
+    from dependencies import SessionLocal
+
+    db = SessionLocal()
+    out = open(args.output or os.devnull, "wb")
+    started = time.perf_counter()
+    total_bytes = 0
+    try:
+        for part in stream_export(db, args.enclosure, args.start, args.end, args.format, args.chunk_size):
+            out.write(part)
+            total_bytes += len(part)
+    finally:
+        out.close()
+        db.close()
+
+    return {"bytes": total_bytes, "seconds": time.perf_counter() - started}
+
+
+def run_benchmark(args) -> None:
+    """Пропускна здатність експорту для кожного доступного формату"""
+    from dependencies import SessionLocal
+
+    db = SessionLocal()
+    try:
+        total_rows = sum(len(rows) for rows in iter_reading_chunks(
+            db, args.enclosure, args.start, args.end, args.chunk_size))
+    finally:
+        db.close()
+
+    print(f"📊 Export benchmark: {total_rows} rows, chunk={args.chunk_size}")
+    for fmt in available_formats():
+        args.format = fmt
+        args.output = None
+        stats = run_export(args)
+        seconds = max(stats["seconds"], 1e-9)
+        print(f"   {fmt:8s} {total_rows / seconds:>12,.0f} rows/s  "
+              f"{stats['bytes'] / seconds / 1e6:>8.1f} MB/s  ({stats['bytes'] / 1e6:.1f} MB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ZooSmartCare sensor history export")
+    parser.add_argument("--enclosure", type=int, action="append", default=[],
+                        help="ID вольєра (можна кілька разів; без нього - всі)")
+    parser.add_argument("--start", type=_parse_dt, default=None)
+    parser.add_argument("--end", type=_parse_dt, default=None)
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("-o", "--output", default=None, help="Файл (за замовчуванням stdout)")
+    parser.add_argument("--benchmark", action="store_true", help="Заміряти швидкість усіх форматів")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        run_benchmark(args)
+        return
+
+    if args.format not in available_formats():
+        parser.error(f"format '{args.format}' requires pyarrow")
+
+    if args.output is None:
+        from dependencies import SessionLocal
+        db = SessionLocal()
+        try:
+            for part in stream_export(db, args.enclosure, args.start, args.end, args.format, args.chunk_size):
+                sys.stdout.buffer.write(part)
+        finally:
+            db.close()
+        return
+
+    stats = run_export(args)
+    print(f"✅ Exported {stats['bytes'] / 1e6:.1f} MB to {args.output} in {stats['seconds']:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
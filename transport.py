@@ -0,0 +1,394 @@
+"""
+Транспорт MQTT для воркера, симулятора парку та бенчмарків.
+
+Налаштування брокера - з env (префікс MQTT_), не захардкоджений публічний брокер:
+    MQTT_HOST (localhost), MQTT_PORT (1883 / 8883 з TLS), MQTT_TLS, MQTT_CA_CERTS,
+    MQTT_USERNAME, MQTT_PASSWORD, MQTT_KEEPALIVE, MQTT_CLIENT_ID,
+    MQTT_RECONNECT_MIN_SECONDS, MQTT_RECONNECT_MAX_SECONDS
+
+MqttTransport - paho; після обриву перепідключення з експоненційною затримкою
+і jitter (вбудований reconnect paho - без jitter).
+LoopbackTransport - брокер у пам'яті процесу (MQTT_HOST=loopback): тести й
+бенчмарки проганяють увесь інжест без мережі. Колбеки обох - як у paho
+(CallbackAPIVersion.VERSION2), тож обробники воркера не знають, який транспорт.
+"""
+import os
+import random
+import threading
+from collections import deque
+
+LOOPBACK_HOST = "loopback"
+ERR_NO_CONN = 4  # paho MQTTErrorCode.MQTT_ERR_NO_CONN: немає з'єднання (QoS 1 - у черзі клієнта)
+RECONNECT_MIN_SECONDS = 1.0
+RECONNECT_MAX_SECONDS = 60.0
+
+
+def _env_flag(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class BrokerSettings:
+    """Куди і як підключатись. from_env() - з MQTT_*; явні аргументи мають пріоритет"""
+
+    def __init__(self, host="localhost", port=None, tls=False, ca_certs=None, username=None,
+                 password=None, keepalive=60, client_id="", clean_session=True,
+                 reconnect_min=RECONNECT_MIN_SECONDS, reconnect_max=RECONNECT_MAX_SECONDS):
+        self.host = host
+        self.port = port or (8883 if tls else 1883)
+        self.tls = tls
+        self.ca_certs = ca_certs
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.client_id = client_id
+        self.clean_session = clean_session
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+
+    @classmethod
+    def from_env(cls, **overrides):
+        settings = {
+            "host": os.getenv("MQTT_HOST", "localhost"),
+            "port": int(os.getenv("MQTT_PORT", "0")) or None,
+            "tls": _env_flag("MQTT_TLS"),
+            "ca_certs": os.getenv("MQTT_CA_CERTS") or None,
+            "username": os.getenv("MQTT_USERNAME") or None,
+            "password": os.getenv("MQTT_PASSWORD") or None,
+            "keepalive": int(os.getenv("MQTT_KEEPALIVE", "60")),
+            "client_id": os.getenv("MQTT_CLIENT_ID", ""),
+            "reconnect_min": float(os.getenv("MQTT_RECONNECT_MIN_SECONDS", RECONNECT_MIN_SECONDS)),
+            "reconnect_max": float(os.getenv("MQTT_RECONNECT_MAX_SECONDS", RECONNECT_MAX_SECONDS)),
+        }
+        # Порожні override (напр. --broker не задано) не перекривають env
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**settings)
+
+    @property
+    def loopback(self):
+        return self.host == LOOPBACK_HOST
+
+    def __repr__(self):
+        scheme = "mqtts" if self.tls else "mqtt"
+        return f"{scheme}://{self.host}:{self.port}"
+
+
+def backoff_delays(minimum, maximum, rng=random):
+    """Нескінченна послідовність затримок: випадкова в [d/2, d], d = min(maximum, minimum * 2^n)"""
+    attempt = 0
+    while True:
+        delay = min(maximum, minimum * 2 ** attempt)
+        yield delay / 2 + rng.random() * delay / 2
+        attempt += 1
+
+
+class MqttTransport:
+    """
+    paho-клієнт з налаштувань + власний цикл перепідключення.
+    on_connect / on_message / on_disconnect - сигнатури paho VERSION2.
+    """
+
+    def __init__(self, settings, on_connect=None, on_message=None, on_disconnect=None,
+                 manual_ack=False):
+        import paho.mqtt.client as mqtt
+
+        self.settings = settings
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2, client_id=settings.client_id,
+            clean_session=settings.clean_session, manual_ack=manual_ack,
+            reconnect_on_failure=False,  # Після обриву loop_forever повертається -> свій backoff
+        )
+        if settings.username:
+            self.client.username_pw_set(settings.username, settings.password)
+        if settings.tls:
+            self.client.tls_set(ca_certs=settings.ca_certs)
+        self._on_connect = on_connect
+        self.client.on_connect = self._handle_connect
+        self.client.on_message = on_message
+        self.client.on_disconnect = on_disconnect
+        self._stopped = threading.Event()
+        self._connected = threading.Event()
+        self._thread = None
+        self.reconnects = 0
+
+    def _handle_connect(self, client, userdata, flags, reason_code, properties):
+        if not reason_code.is_failure:
+            self._connected.set()
+        if self._on_connect:
+            self._on_connect(client, userdata, flags, reason_code, properties)
+
+    def run_forever(self):
+        """Блокує до stop(): підключення, цикл мережі, після обриву - пауза backoff і знову"""
+        delays = None
+        while not self._stopped.is_set():
+            self._connected.clear()
+            try:
+                self.client.connect(self.settings.host, self.settings.port, self.settings.keepalive)
+            except OSError as e:
+                error = e
+            else:
+                self.client.loop_forever(retry_first_connection=False)
+                error = "connection lost"
+            if self._stopped.is_set():
+                break
+            if self._connected.is_set() or delays is None:
+                # Було робоче з'єднання - послідовність затримок з початку
+                delays = backoff_delays(self.settings.reconnect_min, self.settings.reconnect_max)
+            delay = next(delays)
+            self.reconnects += 1
+            print(f"⚠️ MQTT {self.settings} unavailable ({error}), retry in {delay:.1f}s")
+            self._stopped.wait(delay)
+
+    def start(self):
+        """run_forever у фоновому потоці"""
+        self._thread = threading.Thread(target=self.run_forever, name="mqtt-transport", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait_connected(self, timeout=None):
+        return self._connected.wait(timeout)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        return self.client.publish(topic, payload, qos=qos, retain=retain)
+
+    def stop(self):
+        self._stopped.set()
+        self.client.disconnect()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+# --- LOOPBACK ---
+
+def topic_matches(pattern, topic):
+    """Фільтр підписки MQTT (+ / #) проти топіка"""
+    pattern_parts, topic_parts = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class LoopbackMessage:
+    """Як paho MQTTMessage: topic, payload (bytes), qos, retain, mid, dup"""
+
+    __slots__ = ("topic", "payload", "qos", "retain", "mid", "dup")
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0, dup=False):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+        self.dup = dup
+
+
+class _PublishResult:
+    """Як paho MQTTMessageInfo (rc, mid, wait_for_publish)"""
+
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return self.rc == 0
+
+
+class LoopbackBroker:
+    """
+    Брокер у пам'яті: доставка синхронна (у потоці publish), retained повідомлення,
+    persistent session для clean_session=False - непідтверджені QoS 1
+    доставляються знову (dup=True) при наступному підключенні того ж client_id.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients = {}    # client_id -> LoopbackClient (підключені)
+        self._sessions = {}   # client_id -> {"subscriptions": {pattern: qos}, "inflight": {mid: msg}}
+        self._retained = {}
+        self._mid = 0
+        self.delivered = 0
+
+    def _session(self, client_id, clean):
+        if clean or client_id not in self._sessions:
+            self._sessions[client_id] = {"subscriptions": {}, "inflight": {}}
+        return self._sessions[client_id]
+
+    def connect(self, client):
+        with self._lock:
+            session = self._session(client.client_id, client.clean_session)
+            session_present = bool(session["subscriptions"])
+            self._clients[client.client_id] = client
+            pending = list(session["inflight"].values())
+        for msg in pending:
+            msg.dup = True
+            client._deliver(msg)
+        return session_present
+
+    def disconnect(self, client):
+        with self._lock:
+            if self._clients.get(client.client_id) is client:
+                del self._clients[client.client_id]
+            if client.clean_session:
+                self._sessions.pop(client.client_id, None)
+
+    def subscribe(self, client, pattern, qos):
+        with self._lock:
+            self._sessions[client.client_id]["subscriptions"][pattern] = qos
+            retained = [m for t, m in self._retained.items() if topic_matches(pattern, t)]
+        for msg in retained:
+            self._route(client.client_id, msg, min(qos, msg.qos), retain=True)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        elif payload is None:
+            payload = b""
+        msg = LoopbackMessage(topic, payload, qos, retain)
+        with self._lock:
+            if retain:
+                if payload:
+                    self._retained[topic] = msg
+                else:
+                    self._retained.pop(topic, None)
+            targets = []
+            for client_id, session in self._sessions.items():
+                granted = [q for pattern, q in session["subscriptions"].items() if topic_matches(pattern, topic)]
+                if granted:
+                    targets.append((client_id, min(qos, max(granted))))
+        for client_id, granted in targets:
+            self._route(client_id, msg, granted, retain=False)
+
+    def _route(self, client_id, msg, qos, retain):
+        with self._lock:
+            self._mid = self._mid % 65535 + 1
+            copy = LoopbackMessage(msg.topic, msg.payload, qos, retain, self._mid if qos else 0)
+            session = self._sessions.get(client_id)
+            if session is None:
+                return
+            if qos:
+                session["inflight"][copy.mid] = copy
+            client = self._clients.get(client_id)
+        if client is not None:
+            self.delivered += 1
+            client._deliver(copy)
+
+    def ack(self, client, mid):
+        with self._lock:
+            session = self._sessions.get(client.client_id)
+            if session:
+                session["inflight"].pop(mid, None)
+
+    def inflight(self, client_id):
+        with self._lock:
+            session = self._sessions.get(client_id)
+            return len(session["inflight"]) if session else 0
+
+
+class LoopbackClient:
+    """Підмножина API paho.Client, якою користуються воркер і симулятор"""
+
+    def __init__(self, broker, client_id, clean_session=True, manual_ack=False):
+        self.broker = broker
+        self.client_id = client_id or f"loopback-{id(self):x}"
+        self.clean_session = clean_session
+        self.manual_ack = manual_ack
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+        self.connected = False
+        self._delivering = threading.Lock()
+        self._queue = deque()
+
+    def connect(self):
+        self.connected = True
+        session_present = self.broker.connect(self)
+        if self.on_connect:
+            self.on_connect(self, None, {"session present": session_present}, 0, None)
+
+    def disconnect(self):
+        if not self.connected:
+            return
+        self.connected = False
+        self.broker.disconnect(self)
+        if self.on_disconnect:
+            self.on_disconnect(self, None, {}, 0, None)
+
+    def subscribe(self, topic, qos=0):
+        self.broker.subscribe(self, topic, qos)
+        return 0, 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.broker.publish(topic, payload, qos, retain)
+        return _PublishResult(0, 0)
+
+    def ack(self, mid, qos):
+        if qos:
+            self.broker.ack(self, mid)
+
+    def _deliver(self, msg):
+        # Публікація з обробника (напр. алерт -> конфіг) не входить в обробник рекурсивно:
+        # повідомлення стають у чергу і обробляються по одному, як у мережевому циклі paho
+        self._queue.append(msg)
+        # Хто тримає lock, після звільнення перевіряє чергу ще раз - нічого не губиться
+        while self._queue and self._delivering.acquire(blocking=False):
+            try:
+                while self._queue:
+                    msg = self._queue.popleft()
+                    if self.on_message and self.connected:
+                        self.on_message(self, None, msg)
+                    if msg.qos and not self.manual_ack:
+                        self.broker.ack(self, msg.mid)
+            finally:
+                self._delivering.release()
+
+
+LOOPBACK_BROKER = LoopbackBroker()  # Спільний для всіх loopback-транспортів процесу
+
+
+class LoopbackTransport:
+    """Той самий інтерфейс, що й MqttTransport; брокер - LOOPBACK_BROKER або переданий"""
+
+    def __init__(self, settings, on_connect=None, on_message=None, on_disconnect=None,
+                 manual_ack=False, broker=None):
+        self.settings = settings
+        self.client = LoopbackClient(broker or LOOPBACK_BROKER, settings.client_id,
+                                     settings.clean_session, manual_ack)
+        self.client.on_connect = on_connect
+        self.client.on_message = on_message
+        self.client.on_disconnect = on_disconnect
+        self._stopped = threading.Event()
+        self.reconnects = 0
+
+    def start(self):
+        self.client.connect()
+        return self
+
+    def run_forever(self):
+        self.start()
+        self._stopped.wait()
+
+    def wait_connected(self, timeout=None):
+        return self.client.connected
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        return self.client.publish(topic, payload, qos=qos, retain=retain)
+
+    def stop(self):
+        self.client.disconnect()
+        self._stopped.set()
+
+
+def create_transport(settings, **callbacks):
+    """MQTT_HOST=loopback - брокер у пам'яті, інакше - paho"""
+    cls = LoopbackTransport if settings.loopback else MqttTransport
+    return cls(settings, **callbacks)
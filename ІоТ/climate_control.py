@@ -0,0 +1,135 @@
+# Альтернативний режим клімат-контролю: PID + часо-пропорційне керування реле
+# Вмикається в конфігу: "control_mode": "pid" (за замовчуванням - "hysteresis")
+#
+# PID дає потужність u у [-1, 1]: u > 0 - частка часу обігрівача, u < 0 - вентилятора.
+# Реле перемикається не частіше, ніж дозволяє вікно (relay_window_seconds) та
+# мінімальний час увімкнення / вимкнення (захист контактів від короткого циклування).
+
+
+class PID:
+    """PID з anti-windup (умовне інтегрування + обмеження інтеграла) і D по виміру"""
+
+    def __init__(self, kp, ki, kd, out_min=-1.0, out_max=1.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.out_min = out_min
+        self.out_max = out_max
+        self.integral = 0.0
+        self.last_measurement = None
+        self.output = 0.0
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_measurement = None
+        self.output = 0.0
+
+    def update(self, setpoint, measurement, dt):
+        error = setpoint - measurement
+        derivative = 0.0
+        if self.last_measurement is not None and dt > 0:
+            # D по виміру: зміна уставки не дає стрибка
+            derivative = -(measurement - self.last_measurement) / dt
+        self.last_measurement = measurement
+
+        unclamped = self.kp * error + self.integral + self.kd * derivative
+        # Інтегруємо, лише якщо вихід не в насиченні або помилка виводить з нього
+        if dt > 0 and ((self.out_min < unclamped < self.out_max)
+                       or (unclamped >= self.out_max and error < 0)
+                       or (unclamped <= self.out_min and error > 0)):
+            self.integral += self.ki * error * dt
+            self.integral = min(max(self.integral, self.out_min), self.out_max)
+
+        output = self.kp * error + self.integral + self.kd * derivative
+        self.output = min(max(output, self.out_min), self.out_max)
+        return self.output
+
+
+class TimeProportionalRelay:
+    """
+    Частка duty у [0, 1] -> увімкнення на duty * window на початку кожного вікна.
+    Імпульс коротший за min_on переноситься в наступні вікна (не губиться);
+    пауза коротша за min_off - реле лишається увімкненим до кінця вікна.
+    """
+
+    def __init__(self, window=60.0, min_on=10.0, min_off=10.0):
+        self.window = window
+        self.min_on = min_on
+        self.min_off = min_off
+        self.state = False
+        self.changed_at = None
+        self.window_start = None
+        self.on_until = None
+        self.carry = 0.0
+        self.cycles = 0
+
+    def update(self, duty, now):
+        duty = min(max(duty, 0.0), 1.0)
+        if self.window_start is None or now - self.window_start >= self.window:
+            self.window_start = now
+            on_time = duty * self.window + self.carry
+            self.carry = 0.0
+            if on_time < self.min_on:
+                self.carry = on_time if duty > 0 else 0.0
+                on_time = 0.0
+            elif self.window - on_time < self.min_off:
+                on_time = self.window
+            self.on_until = now + min(on_time, self.window)
+        elif duty <= 0:
+            self.on_until = now  # Потужність більше не потрібна - вимикаємо, не чекаючи вікна
+
+        want = now < self.on_until
+        if want != self.state:
+            held = None if self.changed_at is None else now - self.changed_at
+            if held is None or held >= (self.min_on if self.state else self.min_off):
+                self.state = want
+                self.changed_at = now
+                if want:
+                    self.cycles += 1
+        return self.state
+
+    def force_off(self, now):
+        if self.state:
+            self.state = False
+            self.changed_at = now
+        self.on_until = now
+
+
+class PidClimateController:
+    """Той самий контракт, що й LogicController.process_climate: (status, heater, fan)"""
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.pid = PID(cfg.get('pid_kp', 0.3), cfg.get('pid_ki', 0.001), cfg.get('pid_kd', 0.0))
+        window = cfg.get('relay_window_seconds', 60.0)
+        min_on = cfg.get('relay_min_on_seconds', 10.0)
+        min_off = cfg.get('relay_min_off_seconds', 10.0)
+        self.heater = TimeProportionalRelay(window, min_on, min_off)
+        self.fan = TimeProportionalRelay(window, min_on, min_off)
+        self.fan_deadband = cfg.get('pid_fan_deadband', 0.2)
+        self.last_time = None
+
+    def setpoint(self):
+        target = self.cfg.get('temp_target')
+        if target is None:
+            target = (self.cfg['temp_min'] + self.cfg['temp_max']) / 2.0
+        return target
+
+    def process(self, current_temp, now):
+        dt = 0.0 if self.last_time is None else now - self.last_time
+        self.last_time = now
+        u = self.pid.update(self.setpoint(), current_temp, dt)
+
+        # Мертва зона для вентилятора: шум навколо уставки не перемикає нагрів <-> охолодження
+        fan_duty = -u - self.fan_deadband if u < -self.fan_deadband else 0.0
+
+        # Безпека: не можна гріти і охолоджувати одночасно (охолодження - пріоритет)
+        fan_on = self.fan.update(fan_duty, now)
+        if fan_on:
+            self.heater.force_off(now)
+            heater_on = False
+        else:
+            heater_on = self.heater.update(u if u > 0 else 0.0, now)
+
+        status = "heating" if heater_on else "cooling" if fan_on else "stable"
+        return status, heater_on, fan_on
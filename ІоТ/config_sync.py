@@ -0,0 +1,142 @@
+# Синхронізація конфігурації контролера без доступу до БД
+# Джерела: retained MQTT (zoo/config/AV_XXX) та HTTP GET /api/business/config/{mac}?version=
+# Останній робочий конфіг зберігається на flash (config_cache.json) -> миттєвий старт без бекенду
+
+import json
+import os
+import time
+
+try:
+    import urequests  # MicroPython
+except ImportError:
+    urequests = None
+    import urllib.request
+    import urllib.error
+
+CACHE_PATH = "config_cache.json"
+CHECK_SECONDS = 300        # Як часто питати HTTP про нову версію
+RETRY_SECONDS = 60         # Після помилки (бекенд недоступний)
+HTTP_TIMEOUT = 3
+CONFIG_TOPIC_PREFIX = "zoo/config/"
+
+
+def device_mac(config):
+    """MAC з configuration.py, інакше - з Wi-Fi модуля (MicroPython)"""
+    if config.get("mac_address"):
+        return config["mac_address"]
+    try:
+        import network
+        raw = network.WLAN(network.STA_IF).config("mac")
+        return ":".join("{:02X}".format(b) for b in raw)
+    except Exception:
+        return None
+
+
+def http_get(url, timeout=HTTP_TIMEOUT):
+    """-> (status, text). 304 - не помилка"""
+    if urequests:
+        response = urequests.get(url, timeout=timeout)
+        try:
+            return response.status_code, response.text
+        finally:
+            response.close()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, ""
+
+
+class ConfigSync:
+    """Тримає config (той самий dict, що й у LogicController) в актуальному стані"""
+
+    def __init__(self, config, cache_path=CACHE_PATH):
+        self.config = config
+        self.cache_path = cache_path
+        self.interval = config.get("config_check_seconds", CHECK_SECONDS)
+        self.topic = CONFIG_TOPIC_PREFIX + str(config.get("aviary_id", "AV_001"))
+        self.mac = device_mac(config)
+        self.version = None
+        self._next_check = 0
+        self._pending = None  # Payload з MQTT-колбеку -> застосовується в poll()
+
+    def load_cache(self):
+        """Старт з останнього робочого конфігу (без мережі)"""
+        try:
+            with open(self.cache_path, "r") as f:
+                remote = json.load(f)
+        except (OSError, ValueError):
+            print("⚠️ No cached config, using configuration.py defaults")
+            return False
+        return self.apply(remote, "cache", save=False)
+
+    def save_cache(self, remote):
+        # Запис через тимчасовий файл: збій живлення не лишає битий кеш
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(remote, f)
+        os.rename(tmp, self.cache_path)
+
+    def apply(self, remote, source, save=True):
+        """Застосовує конфіг бекенду. True - якщо щось змінилось"""
+        version = remote.get("version")
+        if version is not None and version == self.version:
+            return False
+        cfg = self.config
+        if remote.get("target_temperature_min") is not None:
+            cfg["temp_min"] = float(remote["target_temperature_min"])
+        if remote.get("target_temperature_max") is not None:
+            cfg["temp_max"] = float(remote["target_temperature_max"])
+        if "feeding_schedule" in remote:
+            plan = remote["feeding_schedule"]
+            cfg["feeding_plan"] = plan
+            cfg["feeding_schedule"] = [item["time"] if isinstance(item, dict) else item for item in plan]
+        self.version = version
+        cfg["config_version"] = version
+        if save:
+            try:
+                self.save_cache(remote)
+            except OSError as e:
+                print("⚠️ Config cache write failed:", e)
+        print(f"✅ CONFIG {version} from {source}: {cfg['temp_min']}-{cfg['temp_max']}°C, "
+              f"{len(cfg.get('feeding_schedule', []))} feedings")
+        return True
+
+    def on_message(self, payload):
+        """MQTT-колбек (інший потік у paho) - лише запам'ятовуємо"""
+        self._pending = payload
+
+    def fetch(self):
+        """HTTP з версією кешу: None, якщо не змінилось"""
+        url = f"{self.config['api_url'].rstrip('/')}/api/business/config/{self.mac}"
+        if self.version:
+            url += f"?version={self.version}"
+        status, text = http_get(url)
+        if status == 304:
+            return None
+        if status != 200:
+            raise OSError(f"HTTP {status}")
+        return json.loads(text)
+
+    def poll(self, now=None):
+        """Викликається в головному циклі. True - якщо конфіг змінився"""
+        changed = False
+        payload, self._pending = self._pending, None
+        if payload:
+            try:
+                changed = self.apply(json.loads(payload), "mqtt")
+            except (ValueError, TypeError, KeyError) as e:
+                print("⚠️ Bad config message:", e)
+
+        now = time.time() if now is None else now
+        if now < self._next_check or not self.mac or not self.config.get("api_url"):
+            return changed
+        try:
+            remote = self.fetch()
+            if remote is not None:
+                changed = self.apply(remote, "http") or changed
+            self._next_check = now + self.interval
+        except Exception as e:
+            print(f"⚠️ Config check failed ({e}), keeping version {self.version}")
+            self._next_check = now + RETRY_SECONDS
+        return changed
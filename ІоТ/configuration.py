@@ -2,9 +2,40 @@
   "aviary_id": "AV_001",
   "wifi_ssid": "WIFI_NAME",
   "wifi_pass": "WIFI_PASSWORD",
-  "mqtt_server": "broker.hivemq.com",
+  "mqtt_server": "localhost",
+  "mqtt_port": 1883,
+  "mqtt_tls": false,
+  "mqtt_ca_certs": "",
+  "mqtt_user": "",
+  "mqtt_password": "",
+  "mqtt_keepalive": 60,
+  "mqtt_client_id": "",
+  "mqtt_reconnect_min_seconds": 1,
+  "mqtt_reconnect_max_seconds": 60,
+  "mqtt_qos": 1,
+  "mqtt_queue_size": 500,
+  "api_url": "http://127.0.0.1:8000",
+  "mac_address": "",
+  "config_check_seconds": 300,
+  "temp_min": 20.0,
+  "temp_max": 25.0,
   "hysteresis": 0.5,
+  "control_mode": "hysteresis",
+  "pid_kp": 0.3,
+  "pid_ki": 0.001,
+  "pid_kd": 0.0,
+  "pid_fan_deadband": 0.2,
+  "relay_window_seconds": 60,
+  "relay_min_on_seconds": 10,
+  "relay_min_off_seconds": 10,
+  "report_temp_deadband": 0.5,
+  "report_hum_deadband": 3.0,
+  "report_heartbeat_seconds": 120,
+  "report_alert_seconds": 5,
   "feeding_schedule": [],
+  "feeder_seconds_per_kg": 1.0,
+  "missed_feeding_policy": "report",
+  "catch_up_hours": 6,
   "servo_pin": 18,
   "dht_pin": 15,
   "relay_heat_pin": 4,
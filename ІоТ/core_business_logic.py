@@ -2,6 +2,9 @@ import machine
 import dht
 import time
 import math
+from array import array
+from signal_pipeline import build_pipelines
+from climate_control import PidClimateController
 
 class HardwareManager:
     """Клас для керування фізичними пристроями (HAL)"""
@@ -42,38 +45,132 @@ class HardwareManager:
         duty = int(((angle * 2000 / 180) + 500) / 20000 * 1023)
         self.servo.duty(duty)
 
+FEEDER_MIN_SECONDS = 0.2
+FEEDER_MAX_SECONDS = 15.0
+WEEK_MINUTES = 7 * 24 * 60
+
+_DAY_NAMES = {}
+for _day, _names in enumerate((("mon", "monday", "пн"), ("tue", "tuesday", "вт"), ("wed", "wednesday", "ср"),
+                               ("thu", "thursday", "чт"), ("fri", "friday", "пт"), ("sat", "saturday", "сб"),
+                               ("sun", "sunday", "нд"))):
+    for _name in _names:
+        _DAY_NAMES[_name] = _day
+
+
+def parse_days(value):
+    """'Mon,Wed,Fri' -> [0, 2, 4]; порожньо / 'Daily' / нерозпізнане -> всі дні (як на сервері)"""
+    days = set()
+    for token in str(value or "").lower().replace(";", ",").replace(" ", ",").split(","):
+        if token in _DAY_NAMES:
+            days.add(_DAY_NAMES[token])
+    return sorted(days) if days else list(range(7))
+
+
+def local_week_start(ts):
+    """Понеділок 00:00 місцевого часу (time.time()) для тижня, що містить ts"""
+    lt = time.localtime(ts)
+    midnight = time.mktime(lt[:3] + (0, 0, 0) + tuple(lt[6:]))
+    return midnight - lt[6] * 86400
+
+
+def _bisect_right(values, x):
+    lo, hi = 0, len(values)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if x < values[mid]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+class FeedingTimetable:
+    """
+    Розклад годувань, розгорнутий на тиждень: відсортовані хвилини тижня
+    (понеділок 00:00 = 0) і порції в array. Наступне годування - бінарним пошуком.
+    """
+
+    def __init__(self, plan, default_portion=1.0):
+        entries = []
+        for item in plan:
+            if not isinstance(item, dict):
+                item = {"time": item}
+            try:
+                hour, minute = [int(x) for x in str(item["time"]).split(":")[:2]]
+            except (KeyError, ValueError):
+                print("Bad feeding slot:", item)
+                continue
+            portion = item.get("portion") or default_portion
+            for day in parse_days(item.get("days_of_week")):
+                entries.append((day * 1440 + hour * 60 + minute, float(portion), item.get("food_type")))
+        entries.sort(key=lambda e: e[0])
+        self.minutes = array('H', [e[0] for e in entries])
+        self.portions = array('f', [e[1] for e in entries])
+        self.food_types = [e[2] for e in entries]
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def next_after(self, ts):
+        """(due, portion, food_type) - перше годування строго після ts"""
+        if not self.minutes:
+            return None
+        week_start = local_week_start(ts)
+        i = _bisect_right(self.minutes, int((ts - week_start) // 60))
+        if i == len(self.minutes):
+            i, week_start = 0, week_start + WEEK_MINUTES * 60
+        return week_start + self.minutes[i] * 60, self.portions[i], self.food_types[i]
+
+    def between(self, start, end):
+        """Годування з дедлайном у (start, end]"""
+        due = []
+        item = self.next_after(start)
+        while item is not None and item[0] <= end and len(due) < WEEK_MINUTES:
+            due.append(item)
+            item = self.next_after(item[0])
+        return due
+
+
 class LogicController:
     """Клас реалізації бізнес-логіки"""
     def __init__(self, config):
         self.cfg = config
-        self.temp_history = [] # Буфер для ковзного середнього
-        self.FILTER_SIZE = 5   # Розмір вікна вибірки
+        # Ланцюжки фільтрів по каналах (кільцеві буфери, O(1) на вимір)
+        self.pipelines = build_pipelines(config)
+        self._timetable = None
+        self._timetable_key = None
+        self._pid = None
 
     def filter_data(self, raw_temp):
         """
-        Фільтрація шумів методом ковзного середнього (SMA)
+        Фільтрація температури: правдоподібність -> медіана з 3 -> ковзне середнє (SMA)
         Розділ 1.1 бізнес-логіки
         """
-        if raw_temp is None:
-            return None
-            
-        self.temp_history.append(raw_temp)
-        if len(self.temp_history) > self.FILTER_SIZE:
-            self.temp_history.pop(0)
-            
-        # Розрахунок середнього
-        avg_temp = sum(self.temp_history) / len(self.temp_history)
-        return round(avg_temp, 2)
-
-    def process_climate(self, current_temp):
+        return self.pipelines["temp"].process(raw_temp)
+
+    def filter_sample(self, raw_temp, raw_hum, raw_light=None):
+        """Всі канали за один вимір. None - вимір відкинуто (або датчика немає)"""
+        return (
+            self.pipelines["temp"].process(raw_temp),
+            self.pipelines["hum"].process(raw_hum),
+            self.pipelines["light"].process(raw_light),
+        )
+
+    def process_climate(self, current_temp, now=None):
         """
-        Алгоритм терморегуляції з гістерезисом
+        Алгоритм терморегуляції: гістерезис (за замовчуванням) або PID ("control_mode": "pid")
         Розділ 1.2 бізнес-логіки
         Повертає статус: 'heating', 'cooling', 'stable'
         """
         if current_temp is None:
             return "error"
 
+        if self.cfg.get('control_mode') == "pid":
+            if self._pid is None:
+                self._pid = PidClimateController(self.cfg)
+            return self._pid.process(current_temp, time.time() if now is None else now)
+        self._pid = None  # Повернення до гістерезису - PID стартує з нуля наступного разу
+
         t_min = self.cfg['temp_min']
         t_max = self.cfg['temp_max']
         hyst = self.cfg['hysteresis']
@@ -99,17 +196,29 @@ class LogicController:
 
         return status, heater_state, fan_state
 
-    def check_feeding_schedule(self):
-        """Перевірка часу годування"""
-        # Отримуємо поточний час з RTC (локальний час)
-        now = time.localtime() # (year, month, mday, hour, minute, second, ...)
-        current_time_str = "{:02d}:{:02d}".format(now[3], now[4])
-        
-        # Перевіряємо, чи є цей час у розкладі
-        # Додатково можна додати перевірку, чи не годували ми вже в цю хвилину
-        if current_time_str in self.cfg['feeding_schedule']:
-            # Тут потрібна логіка "debounce", щоб не годувати 60 секунд поспіль
-            # Але для простоти повертаємо True, якщо секунди < 5
-            if now[5] < 5: 
-                return True
-        return False
\ No newline at end of file
+    def timetable(self):
+        """Розклад, скомпільований один раз на версію конфігу"""
+        key = (self.cfg.get('config_version'), id(self.cfg.get('feeding_plan')),
+               id(self.cfg.get('feeding_schedule')))
+        if self._timetable is None or self._timetable_key != key:
+            plan = self.cfg.get('feeding_plan') or self.cfg.get('feeding_schedule', [])
+            self._timetable = FeedingTimetable(plan, self.cfg.get('default_portion', 1.0))
+            self._timetable_key = key
+            print(f"🗓️ Feeding timetable: {len(self._timetable)} feedings/week")
+        return self._timetable
+
+    def next_feeding(self, after):
+        """(due, portion, food_type) найближчого годування строго після after, або None"""
+        return self.timetable().next_after(after)
+
+    def missed_feedings(self, last_done, now):
+        """Годування між останнім виконаним і now (не далі catch_up_hours) - після перезавантаження"""
+        if last_done is None:
+            return []
+        window_start = max(last_done, now - self.cfg.get('catch_up_hours', 6) * 3600)
+        return self.timetable().between(window_start, now)
+
+    def portion_to_seconds(self, portion):
+        """Порція (кг) -> час відкриття заслінки годівниці"""
+        seconds = (portion or 0) * self.cfg.get('feeder_seconds_per_kg', 1.0)
+        return min(max(seconds, FEEDER_MIN_SECONDS), FEEDER_MAX_SECONDS)
@@ -1,39 +1,54 @@
 import random
+import time
 # Імпортуємо стан із сусіднього файлу
 from machine import SIMULATION_STATE
 
+SIM_STEP_SECONDS = 5.0  # Прирости нижче задані на 5 с (період опитування) і масштабуються за часом
+
 class DHT22:
-    def __init__(self, pin):
+    def __init__(self, pin, clock=time.time, state=None):
         self.pin = pin
+        self.clock = clock  # Віртуальний годинник для офлайн-симуляцій
+        # Стан реле цього контролера (за замовчуванням - спільний SIMULATION_STATE)
+        self.state = SIMULATION_STATE if state is None else state
         self._temp = 20.0 # Початкова температура
         self._hum = 50.0
+        self._reading = self._temp
+        self._last = None
 
     def measure(self):
         # === ФІЗИКА СИМУЛЯЦІЇ ===
+        # Частка 5-секундного кроку з попереднього виміру: опитування частіше не прискорює фізику
+        now = self.clock()
+        k = 1.0 if self._last is None else min(max(now - self._last, 0.0) / SIM_STEP_SECONDS, 12.0)
+        self._last = now
+
         # Якщо увімкнено обігрівач (Pin 4)
-        if SIMULATION_STATE['heater_on']:
-            self._temp += 0.8  # Гріємося швидко
-            self._hum -= 0.2   # Повітря сушиться
+        if self.state['heater_on']:
+            self._temp += 0.8 * k  # Гріємося швидко
+            self._hum -= 0.2 * k   # Повітря сушиться
             
         # Якщо увімкнено вентилятор (Pin 5)
-        elif SIMULATION_STATE['fan_on']:
-            self._temp -= 0.6  # Охолоджуємося
+        elif self.state['fan_on']:
+            self._temp -= 0.6 * k  # Охолоджуємося
             
-        # Природній стан (повільне повернення до кімнатної 22°C)
+        # Природній стан (повільне повернення до кімнатної 20°C)
+        drift = min(0.1 * k, abs(self._temp - 20.0))
         if self._temp > 20.0:
-            self._temp -= 0.1
+            self._temp -= drift
         elif self._temp < 20.0:
-            self._temp += 0.1
-            
-            # Додаємо трохи випадкового шуму
-        self._temp += random.uniform(-1, 1)
+            self._temp += drift
+
+        # Шум: невеликі збурення повітря + похибка самого датчика (не накопичується)
+        self._temp += random.uniform(-0.2, 0.2) * k ** 0.5
+        self._reading = self._temp + random.uniform(-0.5, 0.5)
 
         # Обмежуємо вологість
-        self._hum += random.uniform(-0.5, 0.5)
+        self._hum += random.uniform(-0.5, 0.5) * k ** 0.5
         self._hum = max(0, min(100, self._hum))
 
     def temperature(self):
-        return round(self._temp, 1)
+        return round(self._reading, 1)
 
     def humidity(self):
         return round(self._hum, 1)
\ No newline at end of file
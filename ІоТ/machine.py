@@ -7,15 +7,21 @@ SIMULATION_STATE = {
     'fan_on': False
 }
 
+def new_simulation_state():
+    """Окремий стан для ще одного симульованого контролера в тому ж процесі"""
+    return {'heater_on': False, 'fan_on': False}
+
 class Pin:
     OUT = 1
     IN = 0
     PULL_UP = 2
     
-    def __init__(self, pin_id, mode=None, pull=None, value=0):
+    def __init__(self, pin_id, mode=None, pull=None, value=0, state=None):
         self.pin_id = pin_id
         self.mode = mode
         self._value = value
+        # Лише для симуляції: чий стан фізики змінює це реле (за замовчуванням - глобальний)
+        self.state = SIMULATION_STATE if state is None else state
         
         # Визначаємо назву на основі твого configuration.py
         # relay_heat_pin: 4, relay_fan_pin: 5
@@ -30,11 +36,11 @@ class Pin:
                 state = "ON" if val else "OFF"
                 print(f"   [HARDWARE] {self.name} -> {state}")
                 
-                # Оновлюємо глобальний стан симуляції
+                # Оновлюємо стан симуляції
                 if self.pin_id == 4: 
-                    SIMULATION_STATE['heater_on'] = bool(val)
+                    self.state['heater_on'] = bool(val)
                 elif self.pin_id == 5: 
-                    SIMULATION_STATE['fan_on'] = bool(val)
+                    self.state['fan_on'] = bool(val)
                     
             self._value = val
         return self._value
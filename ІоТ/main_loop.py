@@ -1,32 +1,16 @@
 import time
 import json
-import re
-import os
-import sys
-
-# Спробуємо імпортувати Paho MQTT (стандарт для ПК)
-try:
-    import paho.mqtt.client as mqtt
-    USING_PAHO = True
-except ImportError:
-    # Fallback для MicroPython
-    from umqtt.simple import MQTTClient
-    USING_PAHO = False
-# --- 1. ДОДАЄМО БАТЬКІВСЬКУ ДИРЕКТОРІЮ В PATH ---
-# Це дозволяє бачити 'dependencies.py' та 'models.py', які лежать на рівень вище
-current_dir = os.path.dirname(os.path.abspath(__file__)) # Папка: .../ZooSmartCare/IoT
-parent_dir = os.path.dirname(current_dir)                # Папка: .../ZooSmartCare
-
-# Додаємо батьківську папку в початок списку шляхів пошуку
-if parent_dir not in sys.path:
-    sys.path.insert(0, parent_dir)
 
 # Імпортуємо твої класи
 from core_business_logic import HardwareManager, LogicController
-from dependencies import SessionLocal
-
-# --- ВАЖЛИВО: Імпортуємо моделі для ORM запитів ---
-from models import Enclosure, Animal, Species, ClimateProfile
+# Конфіг - з бекенду через API / retained MQTT, з кешем на flash (без доступу до БД)
+from config_sync import ConfigSync
+# Кооперативні задачі зі своїми періодами (asyncio / uasyncio)
+from scheduler import Scheduler, asyncio, run_blocking, wait_event
+# Коли надсилати телеметрію (зміни / heartbeat / тривога)
+from reporting import ReportPolicy, MessageSequence
+# Брокер з конфігу, перепідключення з backoff (paho на ПК / umqtt на MicroPython)
+from mqtt_link import MqttLink
 
 # --- Функція для читання configuration.py ---
 def load_config_file():
@@ -43,162 +27,191 @@ def load_config_file():
         print(f"⚠️ Error reading configuration.py: {e}")
         return {
             "aviary_id": "AV_001",
-            "mqtt_server": "broker.hivemq.com",
+            "mqtt_server": "localhost", "mqtt_port": 1883,
             "temp_min": 20.0, "temp_max": 25.0, "hysteresis": 0.5,
             "dht_pin": 4, "relay_heat_pin": 5, "relay_fan_pin": 18, "servo_pin": 19,
+            "api_url": "http://127.0.0.1:8000", "config_check_seconds": 300,
             "feeding_schedule": []
         }
 
-# --- ОНОВЛЕНА ФУНКЦІЯ: ВИКОРИСТАННЯ ORM ---
-def update_climate_from_db(cfg):
-    """
-    Знаходить enclosure_id з рядка 'AV_001' -> 1,
-    і бере з БД налаштування температури через моделі SQLAlchemy.
-    """
-    print("📡 Connecting to Database (ORM Mode)...")
-    db = SessionLocal()
-    
-    try:
-        # 1. Витягуємо цифру з ID вольєру
-        aviary_str = str(cfg.get('aviary_id', '1'))
-        digits = re.findall(r'\d+', aviary_str)
-        enc_id = int(digits[0]) if digits else 1
-            
-        print(f"🔍 Searching configuration for Enclosure ID: {enc_id}...")
-
-        # 2. ORM ЗАПИТ
-        # Логіка: Знайти тварину в цьому вольєрі -> Отримати її вид -> Отримати профіль
-        
-        # Крок А: Шукаємо першу тварину в цьому вольєрі
-        animal = db.query(Animal).filter(Animal.enclosure_id == enc_id).first()
-        
-        if not animal:
-            print(f"⚠️ No animals found in Enclosure {enc_id}.")
-            return
-
-        print(f"   Found Animal: {animal.nickname} (Species ID: {animal.species_id})")
-
-        # Крок Б: Шукаємо кліматичний профіль для цього виду
-        # (Можна додати фільтр по сезону, якщо потрібно, тут беремо перший ліпший)
-        climate = db.query(ClimateProfile).filter(ClimateProfile.species_id == animal.species_id).first()
-        
-        if climate:
-            cfg['temp_min'] = float(climate.min_temperature)
-            cfg['temp_max'] = float(climate.max_temperature)
-            print(f"✅ CONFIG UPDATED: {animal.nickname} needs {climate.min_temperature}-{climate.max_temperature}°C")
-        else:
-            print(f"⚠️ No climate profile found for Species ID {animal.species_id}.")
-
-    except Exception as e:
-        print(f"❌ Database Error: {e}")
-    finally:
-        db.close()
-
 # --- ГОЛОВНА ПРОГРАМА ---
 print("Starting ZooSmartCare Client...")
 
 # 1. Завантажуємо конфіг
 config = load_config_file()
 
-# 2. Оновлюємо його даними з бази через ORM
-update_climate_from_db(config)
+# 2. Останній робочий конфіг з flash - старт не чекає на бекенд
+sync = ConfigSync(config)
+sync.load_cache()
 
 # 3. Ініціалізуємо залізо та логіку
 hw = HardwareManager(config)
 logic = LogicController(config)
 
-# 4. Підключення до MQTT
-mqtt_client = None
-client_id = f"ZooClient_{config.get('aviary_id', 'Unknown')}"
-
-try:
-    if USING_PAHO:
-        mqtt_client = mqtt.Client(client_id=client_id, callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
-        mqtt_client.connect(config['mqtt_server'], 1883, 60)
-        mqtt_client.loop_start()
+# 4. Підключення до MQTT (недоступний брокер - працюємо далі, перепідключення у config_task)
+mqtt_link = MqttLink(config, sync.on_message, topics=(sync.topic,))
+mqtt_link.connect()
+
+# --- Спільний стан задач ---
+state = {
+    "temp": None, "hum": None,
+    "status": "error", "heat_on": False, "fan_on": False,
+    "alert_sent": 0.0,
+}
+sequence = MessageSequence()      # seq кожного повідомлення (дедуплікація на бекенді)
+reporter = ReportPolicy(config)  # Report-by-exception замість повного payload кожні 5 с
+config_changed = asyncio.Event()  # Новий конфіг -> перерахувати дедлайни годувань
+FEEDING_GRACE_SECONDS = 60        # Дедлайн, прострочений більше (напр. пристрій спав) - пропуск
+FEEDING_STATE_PATH = "feeding_state.json"
+
+def publish(topic, payload):
+    """True - повідомлення передано клієнту MQTT (для QoS 1 paho - хоча б у черзі)"""
+    payload["seq"] = sequence.next()
+    return mqtt_link.publish(topic, payload)
+
+# --- ЗАДАЧІ ---
+def sample_task():
+    """A. Зчитування + фільтрація"""
+    raw_t, raw_h = hw.read_sensors()
+    state["temp"], state["hum"], _ = logic.filter_sample(raw_t, raw_h)
+
+def control_task():
+    """B. Клімат-контроль на останньому відфільтрованому значенні"""
+    filtered_t = state["temp"]
+    if filtered_t is None:
+        state["status"], state["heat_on"], state["fan_on"] = "error", False, False
     else:
-        mqtt_client = MQTTClient(client_id, config['mqtt_server'])
-        mqtt_client.connect()
-        
-    print(f"✅ MQTT Connected to {config['mqtt_server']}")
-except Exception as e:
-    print(f"❌ MQTT Failed: {e}. Running in OFFLINE mode.")
-
-# --- Допоміжна функція годування ---
-def feed_animal_routine():
-    print("🥕 Feeding started...")
+        state["status"], state["heat_on"], state["fan_on"] = logic.process_climate(filtered_t)
+    hw.set_heater(state["heat_on"])
+    hw.set_fan(state["fan_on"])
+
+def publish_task():
+    """E/F. Телеметрія за винятком (зміни / heartbeat) + алерт при критичному стані"""
+    filtered_t = state["temp"]
+    now = time.time()
+    sample = {
+        "temp": filtered_t,
+        "hum": state["hum"],
+        "heater": 1 if state["heat_on"] else 0,
+        "fan": 1 if state["fan_on"] else 0,
+        "status": state["status"],
+    }
+    # C. Критичні стани - частий режим звітів
+    alarm = (state["status"] != "stable" and filtered_t is not None
+             and (filtered_t < (config['temp_min'] - 2) or filtered_t > (config['temp_max'] + 2)))
+
+    reason = reporter.check(sample, now, alarm)
+    if reason:
+        limits_info = f"[{config['temp_min']}..{config['temp_max']}]"
+        print(f"T: {filtered_t} {limits_info}, H: {state['hum']}%, {state['status']} ({reason})")
+        payload = {"aviary_id": config['aviary_id'], **sample, "reason": reason, "timestamp": now}
+        # Обрив зв'язку - знімок не вважається надісланим, повтор на наступному такті
+        # (поки з'єднання немає зовсім, політика керує лише виводом у консоль)
+        if publish("zoo/telemetry", payload) or not mqtt_link.connected:
+            reporter.mark_sent(sample, now)
+
+    if alarm and now - state["alert_sent"] >= reporter.alert_interval:
+        if publish("zoo/alerts", {"aviary_id": config['aviary_id'], "level": "CRITICAL",
+                                  "msg": f"Temp warning: {filtered_t}", "timestamp": now}):
+            state["alert_sent"] = now
+
+async def config_task():
+    """0. Конфіг: retained MQTT / періодична перевірка версії по HTTP (HTTP - поза циклом подій)"""
+    mqtt_link.poll()
+    if await run_blocking(sync.poll):
+        config_changed.set()
+
+def load_last_feeding():
+    """Дедлайн останнього виконаного годування (переживає перезавантаження)"""
+    try:
+        with open(FEEDING_STATE_PATH, 'r') as f:
+            return json.load(f).get("last_due")
+    except (OSError, ValueError):
+        return None
+
+def save_last_feeding(due):
+    try:
+        with open(FEEDING_STATE_PATH, 'w') as f:
+            json.dump({"last_due": due}, f)
+    except OSError as e:
+        print(f"⚠️ Feeding state write failed: {e}")
+
+async def feed_animal_routine(portion):
+    """Серво не блокує інші задачі: поки відкрито, клімат-контроль працює"""
+    seconds = logic.portion_to_seconds(portion)
+    print(f"🥕 Feeding started ({portion} kg, {seconds:.1f}s)...")
     hw.move_servo(90)
-    time.sleep(1)
+    await asyncio.sleep(seconds)
     hw.move_servo(0)
     print("✅ Feeding done.")
 
-# --- MAIN LOOP ---
-last_feed_time = 0
+async def feed(due, portion, food_type, late=False):
+    await feed_animal_routine(portion)
+    save_last_feeding(due)
+    publish("zoo/events", {"aviary_id": config['aviary_id'], "event": "FEEDING_DONE",
+                           "portion": portion, "food_type": food_type, "scheduled": due,
+                           "late": late, "timestamp": time.time()})
 
-try:
+async def handle_missed_feedings(now):
+    """
+    Після перезавантаження: пропущені годування за політикою missed_feeding_policy
+      catch_up - видати останнє пропущене (одне, щоб не перегодувати), решту - у звіт
+      report   - лише подія FEEDING_MISSED (рішення за доглядачем)
+      skip     - нічого
+    """
+    last_done = load_last_feeding()
+    if last_done is None:
+        save_last_feeding(now)  # Перший запуск - точка відліку
+        return
+    missed = logic.missed_feedings(last_done, now)
+    policy = config.get("missed_feeding_policy", "report")
+    if not missed or policy == "skip":
+        return
+    if policy == "catch_up":
+        await feed(*missed[-1], late=True)
+        missed = missed[:-1]
+    for due, portion, food_type in missed:
+        print(f"⚠️ Feeding at {due} missed")
+        publish("zoo/events", {"aviary_id": config['aviary_id'], "event": "FEEDING_MISSED",
+                               "portion": portion, "food_type": food_type, "scheduled": due,
+                               "timestamp": time.time()})
+    save_last_feeding(now)
+
+async def feeding_task():
+    """D. Годування за точними дедлайнами (скомпільований тижневий розклад, бінарний пошук)"""
+    await handle_missed_feedings(time.time())
+    after = time.time()
     while True:
-        # A. Зчитування
-        raw_t, raw_h = hw.read_sensors()
-        filtered_t = logic.filter_data(raw_t)
-        
-        limits_info = f"[{config['temp_min']}..{config['temp_max']}]"
-        print(f"T: {filtered_t} {limits_info}, H: {raw_h}%")
-
-        # B. Клімат-контроль
-        status = "error"
-        heat_on = False
-        fan_on = False
-        
-        if filtered_t is not None:
-            status, heat_on, fan_on = logic.process_climate(filtered_t)
-            hw.set_heater(heat_on)
-            hw.set_fan(fan_on)
-
-        # C. Критичні стани
-        is_critical = False
-        if status != "stable" and filtered_t is not None:
-            if filtered_t < (config['temp_min'] - 2) or filtered_t > (config['temp_max'] + 2):
-                is_critical = True
-
-        # D. Годування
-        fed_now = False
-        if logic.check_feeding_schedule():
-            if time.time() - last_feed_time > 60:
-                feed_animal_routine()
-                fed_now = True
-                last_feed_time = time.time()
-
-        # E. Формування даних
-        payload = {
-            "aviary_id": config['aviary_id'],
-            "temp": filtered_t,
-            "hum": raw_h,
-            "heater": 1 if heat_on else 0,
-            "fan": 1 if fan_on else 0,
-            "status": status,
-            "timestamp": time.time()
-        }
-
-        # F. Відправка
-        if mqtt_client:
-            try:
-                msg_str = json.dumps(payload)
-                mqtt_client.publish("zoo/telemetry", msg_str)
-                
-                if is_critical:
-                    alert = {"level": "CRITICAL", "msg": f"Temp warning: {filtered_t}"}
-                    mqtt_client.publish("zoo/alerts", json.dumps(alert))
-                
-                if fed_now:
-                    feed_evt = {"event": "FEEDING_DONE", "time": time.time()}
-                    mqtt_client.publish("zoo/events", json.dumps(feed_evt))
-                    
-            except Exception as e:
-                print(f"MQTT Publish Error: {e}")
-
-        time.sleep(5)
+        config_changed.clear()
+        upcoming = logic.next_feeding(after)
+        # Без розкладу - просто чекаємо новий конфіг (перевірка раз на хвилину)
+        timeout = 60 if upcoming is None else min(upcoming[0] - time.time(), 60)
+        if await wait_event(config_changed, timeout):
+            continue  # Новий розклад - наступний дедлайн з нового
+        now = time.time()
+        if upcoming is None or upcoming[0] > now:
+            continue
+        due = upcoming[0]
+        if now - due <= FEEDING_GRACE_SECONDS:
+            await feed(*upcoming)
+        else:
+            print(f"⚠️ Feeding at {due} missed by {int(now - due)}s")
+        after = due
+
+# --- ПЛАНУВАЛЬНИК ---
+scheduler = Scheduler()
+scheduler.every("config", config.get("config_poll_seconds", 1.0), config_task)
+scheduler.every("sample", config.get("sample_seconds", 2.0), sample_task)
+scheduler.every("control", config.get("control_seconds", 1.0), control_task, delay=0.1)
+# Такт перевірки; скільки реально надсилається - вирішує ReportPolicy
+scheduler.every("publish", config.get("publish_seconds", 1.0), publish_task, delay=0.2)
+scheduler.spawn(feeding_task)
 
+try:
+    scheduler.run()
 except KeyboardInterrupt:
-    print("Stopped.")
-    if mqtt_client and USING_PAHO:
-        mqtt_client.loop_stop()
\ No newline at end of file
+    print("Stopped.", scheduler.stats(), f"telemetry sent {reporter.sent}, skipped {reporter.skipped}")
+    # Безпечний стан реле
+    hw.set_heater(False)
+    hw.set_fan(False)
+    mqtt_link.stop()
@@ -0,0 +1,161 @@
+# З'єднання контролера з брокером MQTT (paho на ПК / umqtt на MicroPython)
+# Брокер, порт, TLS, логін, keepalive, client_id - з конфігу (локальний брокер, не публічний).
+# Обрив -> перепідключення з експоненційною затримкою і jitter: парк контролерів
+# після перезапуску брокера не приходить до нього одночасно.
+
+import json
+import random
+import time
+
+try:
+    import paho.mqtt.client as mqtt
+    USING_PAHO = True
+except ImportError:
+    from umqtt.simple import MQTTClient  # MicroPython
+    USING_PAHO = False
+
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 60
+
+
+class Backoff:
+    """Затримка перед спробою n: випадкова в [d/2, d], d = min(max, min * 2^n)"""
+
+    def __init__(self, minimum=RECONNECT_MIN_SECONDS, maximum=RECONNECT_MAX_SECONDS):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.attempt = 0
+
+    def next_delay(self):
+        delay = min(self.maximum, self.minimum * (2 ** self.attempt))
+        self.attempt += 1
+        return delay / 2 + random.random() * delay / 2
+
+    def reset(self):
+        self.attempt = 0
+
+
+class MqttLink:
+    """
+    publish() не блокує при обриві: QoS 1 у paho чекає в черзі, umqtt - False.
+    poll() - з задачі планувальника: перепідключення, коли настав час, і вхідні для umqtt.
+    """
+
+    def __init__(self, cfg, on_message, topics=()):
+        self.cfg = cfg
+        self.on_message = on_message  # on_message(payload_bytes)
+        self.topics = topics          # Підписки (QoS 1), відновлюються після кожного підключення
+        self.server = cfg.get('mqtt_server', 'localhost')
+        self.port = cfg.get('mqtt_port') or (8883 if cfg.get('mqtt_tls') else 1883)
+        self.keepalive = cfg.get('mqtt_keepalive', 60)
+        self.qos = cfg.get('mqtt_qos', 1)
+        self.client_id = cfg.get('mqtt_client_id') or "ZooClient_" + str(cfg.get('aviary_id', 'Unknown'))
+        self.backoff = Backoff(cfg.get('mqtt_reconnect_min_seconds', RECONNECT_MIN_SECONDS),
+                               cfg.get('mqtt_reconnect_max_seconds', RECONNECT_MAX_SECONDS))
+        self.connected = False
+        self.stopped = False
+        self.next_attempt = 0
+        self.reconnects = 0
+        self.client = self._create_client()
+
+    def _create_client(self):
+        user = self.cfg.get('mqtt_user') or None
+        password = self.cfg.get('mqtt_password') or None
+        if USING_PAHO:
+            # Persistent session; обрив обробляє poll() (свій backoff з jitter замість вбудованого)
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id,
+                                 clean_session=False, reconnect_on_failure=False)
+            # Поки немає з'єднання, paho тримає QoS 1 в черзі (обмеженій - пам'ять)
+            client.max_queued_messages_set(self.cfg.get('mqtt_queue_size', 500))
+            if user:
+                client.username_pw_set(user, password)
+            if self.cfg.get('mqtt_tls'):
+                client.tls_set(ca_certs=self.cfg.get('mqtt_ca_certs') or None)
+            client.on_connect = self._on_connect
+            client.on_disconnect = self._on_disconnect
+            client.on_message = lambda c, u, msg: self.on_message(msg.payload)
+            return client
+        client = MQTTClient(self.client_id, self.server, port=self.port, user=user, password=password,
+                            keepalive=self.keepalive, ssl=bool(self.cfg.get('mqtt_tls')))
+        client.set_callback(lambda topic, msg: self.on_message(msg))
+        return client
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code == 0:
+            # Підписка тут - відновлюється після перепідключення; retained конфіг приходить одразу
+            for topic in self.topics:
+                client.subscribe(topic, qos=1)
+            self.connected = True
+            self.backoff.reset()
+            print(f"✅ MQTT Connected to {self.server}:{self.port}")
+        else:
+            print(f"❌ MQTT Refused: {reason_code}")
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        # Потік paho після цього завершується (reconnect_on_failure=False) - далі poll()
+        self._schedule_retry(reason_code)
+
+    def connect(self):
+        """Одна спроба. False - наступна через backoff (poll)"""
+        try:
+            if USING_PAHO:
+                self.client.loop_stop()  # Потік попереднього з'єднання вже завершився
+                self.client.connect(self.server, self.port, self.keepalive)
+                self.client.loop_start()  # connected - після CONNACK (_on_connect)
+            else:
+                self.client.connect(clean_session=False)
+                for topic in self.topics:
+                    self.client.subscribe(topic, qos=1)
+                self.connected = True
+                self.backoff.reset()
+                print(f"✅ MQTT Connected to {self.server}:{self.port}")
+            return True
+        except Exception as e:
+            self._schedule_retry(e)
+            return False
+
+    def _schedule_retry(self, error):
+        self.connected = False
+        if self.stopped:
+            return
+        delay = self.backoff.next_delay()
+        self.next_attempt = time.time() + delay
+        print(f"❌ MQTT {self.server}:{self.port} unavailable ({error}), retry in {delay:.1f}s")
+
+    def poll(self):
+        """Перепідключення, якщо пора; для umqtt - ще й вхідні повідомлення"""
+        if not USING_PAHO and self.connected:
+            try:
+                self.client.check_msg()
+            except Exception as e:
+                self._schedule_retry(e)
+            return
+        # next_attempt == 0 - підключені або спроба вже йде (чекаємо CONNACK)
+        if self.next_attempt and time.time() >= self.next_attempt:
+            self.next_attempt = 0
+            self.reconnects += 1
+            self.connect()
+
+    def publish(self, topic, payload):
+        """True - передано (для QoS 1 paho - хоча б у черзі до відновлення з'єднання)"""
+        try:
+            if USING_PAHO:
+                info = self.client.publish(topic, json.dumps(payload), qos=self.qos)
+                if info.rc == mqtt.MQTT_ERR_NO_CONN and self.qos:
+                    return True  # Відправиться після reconnect (persistent session)
+                return info.rc == mqtt.MQTT_ERR_SUCCESS  # Черга повна / інша помилка
+            if not self.connected:
+                return False
+            self.client.publish(topic, json.dumps(payload), qos=self.qos)
+            return True
+        except Exception as e:
+            print(f"MQTT Publish Error: {e}")
+            if not USING_PAHO:
+                self._schedule_retry(e)
+            return False
+
+    def stop(self):
+        self.stopped = True
+        if USING_PAHO:
+            self.client.disconnect()
+            self.client.loop_stop()
@@ -0,0 +1,106 @@
+# Report-by-exception: телеметрія лише тоді, коли контролеру є що сказати
+# Причини відправки: старт, зміна стану реле / статусу, зміна значення більше за
+# deadband, частий режим під час тривоги і heartbeat ("живий, нічого не змінилось").
+# Бекенд вважає показ чинним до наступного (LOCF), тож пропущені такти - не втрата даних.
+# Кожне повідомлення має seq: бекенд відкидає повторну доставку QoS 1 (ingest.py).
+
+import json
+import os
+
+TEMP_DEADBAND = 0.5       # Точність DHT22: +-0.5°C, менші зміни - шум
+HUM_DEADBAND = 3.0        # +-2..5% RH
+HEARTBEAT_SECONDS = 120   # Має бути менше за MAX_GAP_SECONDS бекенду (climate_analytics, 600 с)
+ALERT_SECONDS = 5         # Під час тривоги - як раніше, кожні 5 с
+MIN_SECONDS = 1           # Не частіше (шум на межі deadband)
+BOOT_STATE_PATH = "boot_state.json"
+
+
+def _moved(value, last, deadband):
+    if (value is None) != (last is None):
+        return True  # Датчик зник / відновився
+    return value is not None and abs(value - last) >= deadband
+
+
+class ReportPolicy:
+    """
+    Рішення "надсилати чи ні" для кожного такту publish-задачі.
+    Порівняння - з останнім НАДІСЛАНИМ знімком, тож повільний дрейф теж не губиться.
+    """
+
+    def __init__(self, cfg):
+        self.temp_deadband = cfg.get('report_temp_deadband', TEMP_DEADBAND)
+        self.hum_deadband = cfg.get('report_hum_deadband', HUM_DEADBAND)
+        self.heartbeat = cfg.get('report_heartbeat_seconds', HEARTBEAT_SECONDS)
+        self.alert_interval = cfg.get('report_alert_seconds', ALERT_SECONDS)
+        self.min_interval = cfg.get('report_min_seconds', MIN_SECONDS)
+        self.last = None
+        self.last_time = None
+        self.sent = 0
+        self.skipped = 0
+
+    def reason(self, sample, now, alarm=False):
+        """sample: dict з temp, hum, heater, fan, status. None - не надсилати"""
+        if self.last is None:
+            return "startup"
+        elapsed = now - self.last_time
+        if elapsed < self.min_interval:
+            return None
+        last = self.last
+        if (sample["status"] != last["status"] or sample["heater"] != last["heater"]
+                or sample["fan"] != last["fan"]):
+            return "state"
+        if (_moved(sample["temp"], last["temp"], self.temp_deadband)
+                or _moved(sample["hum"], last["hum"], self.hum_deadband)):
+            return "delta"
+        if alarm and elapsed >= self.alert_interval:
+            return "alert"
+        if elapsed >= self.heartbeat:
+            return "heartbeat"
+        return None
+
+    def mark_sent(self, sample, now):
+        self.last = dict(sample)
+        self.last_time = now
+        self.sent += 1
+
+    def check(self, sample, now, alarm=False):
+        """reason() + облік: причина, якщо треба надсилати"""
+        reason = self.reason(sample, now, alarm)
+        if reason is None:
+            self.skipped += 1
+        return reason
+
+
+class MessageSequence:
+    """
+    Номер повідомлення, унікальний для пристрою: boot << 32 | лічильник.
+    Лічильник boot на flash збільшується раз на старт (без запису на кожне повідомлення),
+    тож після перезавантаження номери не повторюються.
+    """
+
+    def __init__(self, path=BOOT_STATE_PATH):
+        self.path = path
+        self.boot = self._next_boot()
+        self.counter = 0
+
+    def _next_boot(self):
+        boot = 0
+        try:
+            with open(self.path, "r") as f:
+                boot = int(json.load(f).get("boot", 0))
+        except (OSError, ValueError, AttributeError):
+            pass
+        boot = (boot + 1) & 0x7FFFFFFF  # message_id на бекенді - знаковий BIGINT
+        try:
+            # Запис через тимчасовий файл: збій живлення не лишає битий стан
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"boot": boot}, f)
+            os.rename(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Boot counter not saved: {e}")
+        return boot
+
+    def next(self):
+        self.counter = (self.counter + 1) & 0xFFFFFFFF
+        return (self.boot << 32) | self.counter
@@ -0,0 +1,111 @@
+# Кооперативний планувальник задач контролера (asyncio на ПК / uasyncio на MicroPython)
+# Кожна задача - зі своїм періодом; довгі дії (серво, мережа) не блокують клімат-контроль
+
+import time
+
+try:
+    import uasyncio as asyncio  # MicroPython
+except ImportError:
+    import asyncio
+
+# Монотонний годинник для періодів (wall clock - лише для розкладу годувань)
+clock = getattr(time, "monotonic", time.time)
+
+
+async def call(fn):
+    """Викликає fn(); якщо це корутина - чекає її"""
+    result = fn()
+    if hasattr(result, "send"):  # Корутина (у MicroPython - генератор)
+        result = await result
+    return result
+
+
+async def run_blocking(fn):
+    """
+    Блокуючий виклик (HTTP) - у пулі потоків, якщо він є (ПК).
+    На MicroPython - напряму: мережеві виклики там з коротким таймаутом.
+    """
+    loop = asyncio.get_event_loop()
+    # Перевірка до виклику: AttributeError з самої fn не має запускати її вдруге
+    if not hasattr(loop, "run_in_executor"):
+        return fn()
+    return await loop.run_in_executor(None, fn)
+
+
+class PeriodicTask:
+    __slots__ = ("name", "interval", "fn", "delay", "runs", "overruns", "errors", "max_late")
+
+    def __init__(self, name, interval, fn, delay=0.0):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.delay = delay
+        self.runs = 0
+        self.overruns = 0   # Пропущені такти (задача не встигла)
+        self.errors = 0
+        self.max_late = 0.0
+
+
+class Scheduler:
+    """Періодичні задачі без дрейфу (next += interval) + довільні корутини"""
+
+    def __init__(self):
+        self.tasks = []
+        self._coros = []
+        self.running = False
+
+    def every(self, name, interval, fn, delay=0.0):
+        task = PeriodicTask(name, interval, fn, delay)
+        self.tasks.append(task)
+        return task
+
+    def spawn(self, coro_fn):
+        """Окрема корутина зі своєю логікою очікування (напр. годування за дедлайнами)"""
+        self._coros.append(coro_fn)
+
+    async def _periodic(self, task):
+        next_run = clock() + task.delay
+        while self.running:
+            delay = next_run - clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task.max_late = max(task.max_late, clock() - next_run)
+            try:
+                await call(task.fn)
+            except Exception as e:
+                task.errors += 1
+                print(f"⚠️ Task {task.name} error: {e}")
+            task.runs += 1
+            next_run += task.interval
+            now = clock()
+            if next_run < now:
+                # Не встигли - пропускаємо такти, а не запускаємо пачкою
+                task.overruns += 1
+                next_run = now + task.interval
+
+    async def _main(self):
+        self.running = True
+        runners = [asyncio.create_task(self._periodic(t)) for t in self.tasks]
+        runners += [asyncio.create_task(c()) for c in self._coros]
+        try:
+            await asyncio.gather(*runners)
+        finally:
+            self.running = False
+
+    def run(self):
+        asyncio.run(self._main())
+
+    def stats(self):
+        return {t.name: {"runs": t.runs, "overruns": t.overruns, "errors": t.errors,
+                         "max_late_ms": round(t.max_late * 1000, 1)} for t in self.tasks}
+
+
+async def wait_event(event, timeout):
+    """True - подія настала, False - таймаут"""
+    if timeout <= 0:
+        return event.is_set()
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
@@ -0,0 +1,187 @@
+# Обробка сигналів датчиків на контролері: пам'ять і CPU - сталі на кожен вимір
+# Ланцюжок для кожного каналу: перевірка правдоподібності -> медіана (викиди) -> згладжування
+
+try:
+    from array import array
+except ImportError:
+    array = None
+
+RESUM_EVERY = 1000  # Перерахунок суми з нуля: похибка float не накопичується
+
+
+class RingBuffer:
+    """
+    Кільцевий буфер фіксованого розміру з поточною сумою: push і mean за O(1).
+    typecode='f' - буфер на array (компактно для MicroPython), інакше - список.
+    """
+
+    def __init__(self, size, typecode=None):
+        self.size = size
+        if typecode and array is not None:
+            self._data = array(typecode, [0.0] * size)
+        else:
+            self._data = [0.0] * size
+        self._head = 0      # Куди писати наступне значення
+        self._count = 0
+        self._sum = 0.0
+        self._pushes = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def full(self):
+        return self._count == self.size
+
+    def push(self, value):
+        """Додає значення; повертає витіснене (або None)"""
+        evicted = None
+        if self._count == self.size:
+            evicted = self._data[self._head]
+            self._sum -= evicted
+        else:
+            self._count += 1
+        self._data[self._head] = value
+        self._sum += self._data[self._head]  # Те, що збережено (float32 для array 'f')
+        self._head = (self._head + 1) % self.size
+
+        self._pushes += 1
+        if self._pushes >= RESUM_EVERY:
+            self._pushes = 0
+            self._sum = sum(self.values())
+        return evicted
+
+    def values(self):
+        """Значення від найстарішого до найновішого"""
+        start = (self._head - self._count) % self.size
+        return [self._data[(start + i) % self.size] for i in range(self._count)]
+
+    def last(self):
+        return self._data[(self._head - 1) % self.size] if self._count else None
+
+    def sum(self):
+        return self._sum
+
+    def mean(self):
+        return self._sum / self._count if self._count else None
+
+    def clear(self):
+        self._head = self._count = self._pushes = 0
+        self._sum = 0.0
+
+
+# --- СТАДІЇ: stage(value) -> value або None (вимір відкинуто) ---
+
+class PlausibilityGate:
+    """
+    Відкидає None, значення поза фізичним діапазоном датчика і стрибки більші
+    за max_step від останнього прийнятого. Після max_rejects відкинутих поспіль
+    стрибок приймається (реальна зміна, а не викид).
+    """
+
+    def __init__(self, low, high, max_step=None, max_rejects=3):
+        self.low = low
+        self.high = high
+        self.max_step = max_step
+        self.max_rejects = max_rejects
+        self.last = None
+        self.rejects = 0
+        self.rejected_total = 0
+
+    def __call__(self, value):
+        if value is None or value != value or not (self.low <= value <= self.high):
+            self.rejected_total += 1
+            return None
+        if (self.max_step is not None and self.last is not None
+                and abs(value - self.last) > self.max_step and self.rejects < self.max_rejects):
+            self.rejects += 1
+            self.rejected_total += 1
+            return None
+        self.rejects = 0
+        self.last = value
+        return value
+
+
+class MedianFilter:
+    """Медіана останніх n (n - мале і непарне): прибирає поодинокі спайки"""
+
+    def __init__(self, n=3, typecode=None):
+        self.window = RingBuffer(n, typecode)
+
+    def __call__(self, value):
+        self.window.push(value)
+        ordered = sorted(self.window.values())
+        return ordered[len(ordered) // 2]
+
+
+class MovingAverage:
+    """Ковзне середнє (SMA) на кільцевому буфері - O(1) на вимір"""
+
+    def __init__(self, size=5, typecode=None):
+        self.window = RingBuffer(size, typecode)
+
+    def __call__(self, value):
+        self.window.push(value)
+        return self.window.mean()
+
+
+class Ema:
+    """Експоненційне згладжування: y += alpha * (x - y)"""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.value = None
+
+    def __call__(self, value):
+        self.value = value if self.value is None else self.value + self.alpha * (value - self.value)
+        return self.value
+
+
+class SignalPipeline:
+    """
+    Послідовність стадій одного каналу. Відкинутий викид замінюється останнім
+    добрим значенням (не довше max_hold вимірів поспіль); None від датчика - None.
+    """
+
+    def __init__(self, *stages, digits=2, max_hold=3):
+        self.stages = stages
+        self.digits = digits
+        self.max_hold = max_hold
+        self.value = None  # Останнє відфільтроване значення
+        self.held = 0
+
+    def process(self, value):
+        if value is None:
+            return None
+        for stage in self.stages:
+            value = stage(value)
+            if value is None:
+                self.held += 1
+                return self.value if self.held <= self.max_hold else None
+        self.held = 0
+        self.value = round(value, self.digits)
+        return self.value
+
+
+def build_pipelines(cfg=None, typecode="f"):
+    """Типові ланцюжки для DHT22 (температура, вологість) і датчика освітленості"""
+    cfg = cfg or {}
+    return {
+        "temp": SignalPipeline(
+            PlausibilityGate(-40.0, 80.0, max_step=cfg.get("temp_max_step", 5.0)),
+            MedianFilter(3, typecode),
+            MovingAverage(cfg.get("filter_size", 5), typecode),
+        ),
+        "hum": SignalPipeline(
+            PlausibilityGate(0.0, 100.0, max_step=cfg.get("hum_max_step", 20.0)),
+            MedianFilter(3, typecode),
+            Ema(cfg.get("hum_alpha", 0.3)),
+            digits=1,
+        ),
+        "light": SignalPipeline(
+            PlausibilityGate(0.0, 200000.0),
+            MedianFilter(3, typecode),
+            Ema(cfg.get("light_alpha", 0.3)),
+            digits=1,
+        ),
+    }